@@ -0,0 +1,90 @@
+"""
+Recall@k vs. latency of each approximate index type against the flat index.
+
+    python benchmarks/bench_ann.py                      # stored vectors (data/vectors.f32)
+    python benchmarks/bench_ann.py --synthetic 200000   # clustered random vectors
+
+Queries are held out of the base set; ground truth comes from IndexFlatL2.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from querycase.ann import make_index, needs_training, load_vectors
+from querycase.config import EMBEDDING_DIM
+
+SWEEPS = {
+    "flat": [None],
+    "sq8": [None],
+    "ivf_flat": [1, 4, 16, 64],
+    "ivf_pq": [1, 4, 16, 64],
+    "hnsw": [16, 32, 64, 128],
+}
+
+
+def synthetic_vectors(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 1000), dim)).astype(np.float32)
+    x = centers[rng.integers(len(centers), size=n)] + 0.3 * rng.normal(size=(n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+
+
+def timed_search(index, queries, k, params):
+    start = time.perf_counter()
+    _, found = index.search(queries, k, params=params)
+    return found, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    import faiss
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic vectors instead of stored ones")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--types", default=",".join(SWEEPS))
+    args = parser.parse_args()
+
+    data = synthetic_vectors(args.synthetic, EMBEDDING_DIM) if args.synthetic else np.asarray(load_vectors())
+    if len(data) <= args.queries:
+        raise SystemExit(f"Need more than {args.queries} vectors, have {len(data)}")
+
+    rng = np.random.default_rng(1)
+    perm = rng.permutation(len(data))
+    queries = np.ascontiguousarray(data[perm[:args.queries]])
+    base = np.ascontiguousarray(data[np.sort(perm[args.queries:])])
+    print(f"{len(base)} base vectors, {len(queries)} queries, k={args.k}\n")
+
+    flat = make_index("flat", base.shape[1])
+    flat.add(base)
+    truth, _ = timed_search(flat, queries, args.k, None)
+
+    print(f"{'type':<10}{'knob':>8}{'recall@k':>10}{'ms/query':>10}{'build s':>9}{'MB':>9}")
+    for kind in args.types.split(","):
+        start = time.perf_counter()
+        index = make_index(kind, base.shape[1], n_vectors=len(base))
+        if needs_training(kind):
+            index.train(base[rng.choice(len(base), size=min(len(base), 256 * 1024), replace=False)])
+        index.add(base)
+        build = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 2**20
+
+        for knob in SWEEPS[kind]:
+            if kind == "hnsw":
+                params = faiss.SearchParametersHNSW(efSearch=knob)
+            elif kind.startswith("ivf"):
+                params = faiss.SearchParametersIVF(nprobe=knob)
+            else:
+                params = None
+            found, ms = timed_search(index, queries, args.k, params)
+            print(f"{kind:<10}{str(knob or '-'):>8}{recall_at_k(found, truth):>10.3f}{ms:>10.3f}{build:>9.1f}{size_mb:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
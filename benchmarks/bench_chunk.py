@@ -0,0 +1,88 @@
+"""
+Chunking: legacy 200-word windows vs. token windows on paragraph/sentence
+boundaries.
+
+    python benchmarks/bench_chunk.py --cases 20 --words-per-case 60000
+    python benchmarks/bench_chunk.py --stored 200   # opinions from the case-text store
+
+Reports chunks/sec and chunks per case for each strategy, and how many
+tokens the embedding model would truncate (max_seq_length) per strategy.
+"""
+import argparse
+import random
+import time
+
+from querycase.chunking import chunk_texts, truncation_stats
+from querycase.models import get_embedder
+
+WORDS = (
+    "court appeal plaintiff defendant contract breach damages statute judgment "
+    "motion evidence jury trial circuit district opinion holding reverse affirm "
+    "remand liability negligence injunction license copyright patent employment "
+    "unconstitutional preemption interlocutory indemnification"
+).split()
+CITATIONS = ["See Smith v. Jones, 123 F.3d 456 (9th Cir. 1997).", "Id. at 12.", "42 U.S.C. § 1983."]
+HEADINGS = ["I. BACKGROUND", "II. DISCUSSION", "III. CONCLUSION"]
+
+
+def synthetic_opinion(rng, words):
+    """
+    Opinion-like text: headed sections of paragraphs of sentences, with
+    citations and the occasional very long sentence.
+    """
+    paragraphs, count = [], 0
+    while count < words:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            n = rng.randint(8, 40) if rng.random() > 0.05 else rng.randint(150, 400)
+            sentence = " ".join(rng.choice(WORDS) for _ in range(n))
+            sentences.append(sentence.capitalize() + ".")
+            if rng.random() < 0.3:
+                sentences.append(rng.choice(CITATIONS))
+            count += n
+        if rng.random() < 0.05:
+            paragraphs.append(rng.choice(HEADINGS))
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def stored_opinions(limit):
+    from querycase.casestore import CaseTextStore
+    store = CaseTextStore()
+    case_ids = list(store._positions)[:limit]
+    return [store.get(case_id) for case_id in case_ids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=20)
+    parser.add_argument("--words-per-case", type=int, default=60000, help="~200 pages")
+    parser.add_argument("--stored", type=int, default=0, help="Use this many stored case texts instead")
+    parser.add_argument("--overlap", type=int, default=None, help="Overlap tokens (default: config)")
+    args = parser.parse_args()
+
+    if args.stored:
+        texts = stored_opinions(args.stored)
+    else:
+        rng = random.Random(0)
+        texts = [synthetic_opinion(rng, args.words_per_case) for _ in range(args.cases)]
+    print(f"{len(texts)} opinions, {sum(len(t) for t in texts) / 1e6:.1f}M characters")
+
+    # Load the model/tokenizer up front so it isn't counted
+    get_embedder()
+    limit = get_embedder().max_seq_length
+
+    options = {} if args.overlap is None else {"overlap": args.overlap}
+    for strategy in ("words", "tokens"):
+        start = time.perf_counter()
+        chunks = [c for case_chunks in chunk_texts(texts, strategy=strategy, **options) for c in case_chunks]
+        elapsed = time.perf_counter() - start
+        tokens, truncated, truncated_chunks = truncation_stats(chunks)
+        print(f"{strategy:7s}: {len(chunks) / elapsed:10.1f} chunks/sec  ({elapsed:.2f}s, "
+              f"{len(chunks) / len(texts):.0f} chunks/case, {tokens / len(chunks):.0f} tokens/chunk)")
+        print(f"         truncated at {limit} tokens: {truncated / tokens:.1%} of tokens, "
+              f"{truncated_chunks / len(chunks):.1%} of chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Chunk embedding throughput: one model.encode() per chunk vs. batched encode.
+
+    python benchmarks/bench_embed.py --cases 50 --batch-size 128 --processes 0
+
+Reports chunks/sec for each mode and the peak RSS of the process.
+"""
+import argparse
+import random
+import resource
+import time
+
+from querycase.embed import chunk_text, encode_chunks, close_encode_pool
+from querycase.models import get_embedder
+
+WORDS = (
+    "court appeal plaintiff defendant contract breach damages statute judgment "
+    "motion evidence jury trial circuit district opinion holding reverse affirm "
+    "remand liability negligence injunction license copyright patent employment"
+).split()
+
+
+def synthetic_chunks(n_cases, words_per_case, seed=0):
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(n_cases):
+        text = " ".join(rng.choice(WORDS) for _ in range(words_per_case))
+        chunks.extend(chunk_text(text))
+    return chunks
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=50)
+    parser.add_argument("--words-per-case", type=int, default=8000)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--processes", type=int, default=0)
+    parser.add_argument("--skip-baseline", action="store_true", help="Don't time the per-chunk loop")
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.cases, args.words_per_case)
+    print(f"{len(chunks)} chunks from {args.cases} synthetic cases")
+
+    # Warm up so model load isn't counted
+    model = get_embedder()
+    model.encode(chunks[:2])
+
+    if not args.skip_baseline:
+        start = time.perf_counter()
+        for chunk in chunks:
+            model.encode(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"per-chunk : {len(chunks) / elapsed:10.1f} chunks/sec  ({elapsed:.2f}s)")
+
+    start = time.perf_counter()
+    encode_chunks(chunks, batch_size=args.batch_size, processes=args.processes)
+    elapsed = time.perf_counter() - start
+    print(f"batched   : {len(chunks) / elapsed:10.1f} chunks/sec  ({elapsed:.2f}s, "
+          f"batch_size={args.batch_size}, processes={args.processes})")
+
+    close_encode_pool()
+    print(f"peak RSS  : {peak_rss_mb():.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Fetch throughput of fetch_new_case_batches() against the local
+CourtListener stand-in (or any --api-url), into a throwaway data directory.
+
+    python benchmarks/bench_fetch.py --cases 2000 --pdf-latency-ms 150 --json results.jsonl
+    python benchmarks/bench_fetch.py --cases 500 --api-latency-ms 400 --rate 2   # with per-host rate limit
+
+Reports cases/sec, MB/sec, time to the first batch and the fetch.* span
+totals. PDF generation time on the stand-in is reported separately; it is
+part of every download.
+"""
+import argparse
+import time
+
+import harness
+from fake_courtlistener import FakeCourtListener
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--words-per-case", type=int, default=3000)
+    parser.add_argument("--api-latency-ms", type=float, default=0.0)
+    parser.add_argument("--pdf-latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of downloads that are error pages")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Requests/sec per host (0 = unlimited; the stand-in is a single host)")
+    parser.add_argument("--api-url", default=None, help="Use a running stand-in instead of starting one")
+    harness.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    api_url = args.api_url
+    if api_url is None:
+        server = FakeCourtListener(args.cases, api_latency_ms=args.api_latency_ms, pdf_latency_ms=args.pdf_latency_ms,
+                                   jitter=args.jitter, error_rate=args.error_rate, words=args.words_per_case).start()
+        api_url = server.api_url
+    data_dir = harness.configure(args.data_dir, api_url, args.keep)
+
+    from querycase.fetch import fetch_new_case_batches, FETCH_CASES, FETCH_BYTES
+
+    cases = batches = 0
+    first_batch = None
+    with harness.Timer() as total:
+        for batch in fetch_new_case_batches(batch_size=args.batch_size, rate_per_host=args.rate):
+            if first_batch is None:
+                first_batch = time.perf_counter() - total.start
+            cases += len(batch)
+            batches += 1
+    if server is not None:
+        server.stop()
+
+    downloaded = FETCH_BYTES.value()
+    results = {
+        "cases": cases,
+        "batches": batches,
+        "skipped": FETCH_CASES.value(status="skipped"),
+        "failed": FETCH_CASES.value(status="failed"),
+        "seconds": round(total.seconds, 3),
+        "first_batch_s": round(first_batch or 0.0, 3),
+        "cases_per_sec": round(cases / total.seconds, 2) if total.seconds else 0.0,
+        "mb_per_sec": round(downloaded / 2**20 / total.seconds, 2) if total.seconds else 0.0,
+        "spans": harness.span_seconds(["fetch.api_page", "fetch.download", "fetch.extract"]),
+        "peak_rss_mb": harness.peak_rss_mb(),
+    }
+    if server is not None:
+        results["server"] = dict(server.stats, pdf_generate_seconds=round(server.stats["pdf_generate_seconds"], 3))
+    params = {k: v for k, v in vars(args).items() if k not in ("json", "keep")}
+    params["data_dir"] = data_dir
+    harness.emit("fetch", params, results, args.json)
+
+
+if __name__ == "__main__":
+    main()
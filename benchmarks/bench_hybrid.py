@@ -0,0 +1,84 @@
+"""
+Per-query latency of keyword (BM25), vector and hybrid ranking on the
+current index.
+
+    python benchmarks/bench_hybrid.py --repeat 5 -k 10
+    python benchmarks/bench_hybrid.py --queries-file queries.txt
+
+Caches are cleared before every query, so vector/hybrid times include
+encoding the query. Also reports RSS before and after the keyword index is
+mapped (its postings are memory-mapped, not loaded).
+"""
+import argparse
+import resource
+import statistics
+import time
+
+from querycase.index import SearchEngine
+
+QUERIES = [
+    "qualified immunity police excessive force",
+    "42 U.S.C. § 1983",
+    "breach of contract damages",
+    "Fed. R. Civ. P. 12(b)(6) motion to dismiss",
+    "first amendment retaliation public employee",
+    "Miranda warnings custodial interrogation",
+    "copyright fair use transformative",
+    "Title VII hostile work environment",
+    "Chevron deference agency interpretation",
+    "ineffective assistance of counsel Strickland",
+]
+
+
+def rss_mb():
+    # Current RSS from /proc (Linux); falls back to peak RSS elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries-file", help="One query per line (default: built-in legal queries)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    queries = QUERIES
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    engine = SearchEngine()
+    before = rss_mb()
+    if not engine.refresh():
+        raise SystemExit("❌ Index is empty — ingest some cases first.")
+    print(f"{engine.index.ntotal} rows, keyword index {engine.keywords.rows} rows, "
+          f"{len(engine.keywords.manifest['segments'])} segment(s)")
+    print(f"RSS after loading indexes: {rss_mb():.1f} MB (+{rss_mb() - before:.1f} MB)")
+
+    # Warm up so model load isn't counted
+    engine.search_rows(queries[:1], args.k, mode="hybrid")
+
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    for mode in ("keyword", "vector", "hybrid"):
+        times = []
+        for _ in range(args.repeat):
+            for query in queries:
+                engine.embedding_cache.clear()
+                start = time.perf_counter()
+                engine.search_rows([query], args.k, mode=mode)
+                times.append((time.perf_counter() - start) * 1000)
+        print(f"{mode:<8} {percentile(times, 50):8.2f} {percentile(times, 95):8.2f} {statistics.mean(times):8.2f}")
+    print(f"RSS after searching: {rss_mb():.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
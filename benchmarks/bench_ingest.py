@@ -0,0 +1,79 @@
+"""
+Ingest throughput of embed_and_update_index() on synthetic opinions, into a
+throwaway data directory (or --data-dir to grow an existing one).
+
+    python benchmarks/bench_ingest.py --cases 200 --batch-size 50 --json results.jsonl
+    python benchmarks/bench_ingest.py --chunks 100000                   # size by index rows
+
+Model load is excluded. Reports cases/sec and chunks/sec (index rows
+added), the chunk / dedup / encode / index-write span totals, peak RSS and
+the size of the data directory afterwards.
+"""
+import argparse
+
+import harness
+from synthetic import iter_cases, cases_for_chunks
+
+SPANS = ["ingest.chunk", "ingest.dedup", "ingest.encode",
+         "index.vectors", "index.metadata", "index.keywords", "index.segment"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--cases", type=int, default=None)
+    size.add_argument("--chunks", type=int, default=None, help="Ingest about this many chunks' worth of cases")
+    parser.add_argument("--batch-size", type=int, default=50, help="Cases per embed_and_update_index() call")
+    parser.add_argument("--words-per-case", type=int, default=3000)
+    parser.add_argument("--start-id", type=int, default=1, help="First case id (continue a kept corpus)")
+    harness.add_arguments(parser)
+    args = parser.parse_args()
+    n_cases = args.cases or (cases_for_chunks(args.chunks, args.words_per_case) if args.chunks else 200)
+
+    data_dir = harness.configure(args.data_dir, keep=args.keep)
+
+    from querycase.embed import IndexWriter, embed_and_update_index, close_encode_pool, INGEST_CHUNKS
+    from querycase.models import get_embedder
+
+    # Warm up so model load isn't counted
+    with harness.Timer() as load:
+        get_embedder().encode(["warm up"])
+
+    writer = IndexWriter()
+    rows_before = writer.ntotal
+    cases = iter_cases(n_cases, args.start_id, args.words_per_case)
+    batch_seconds = []
+    with harness.Timer() as total:
+        done = 0
+        while done < n_cases:
+            batch = [next(cases) for _ in range(min(args.batch_size, n_cases - done))]
+            with harness.Timer() as t:
+                embed_and_update_index(batch, writer=writer)
+            batch_seconds.append(t.seconds)
+            done += len(batch)
+        writer.close()
+    close_encode_pool()
+    rows = writer.ntotal - rows_before
+
+    results = {
+        "cases": n_cases,
+        "index_rows": rows,
+        "chunks_encoded": INGEST_CHUNKS.value(outcome="encoded"),
+        "chunks_reused": INGEST_CHUNKS.value(outcome="reused"),
+        "chunks_skipped": INGEST_CHUNKS.value(outcome="skipped"),
+        "model_load_s": round(load.seconds, 3),
+        "seconds": round(total.seconds, 3),
+        "cases_per_sec": round(n_cases / total.seconds, 2),
+        "chunks_per_sec": round(rows / total.seconds, 2),
+        "batch": harness.latency_ms(batch_seconds),
+        "spans": harness.span_seconds(SPANS),
+        "peak_rss_mb": harness.peak_rss_mb(),
+        "data_dir_mb": harness.dir_size_mb(data_dir),
+    }
+    params = {k: v for k, v in vars(args).items() if k not in ("json", "keep")}
+    params.update(cases=n_cases, data_dir=data_dir)
+    harness.emit("ingest", params, results, args.json)
+
+
+if __name__ == "__main__":
+    main()
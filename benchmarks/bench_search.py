@@ -0,0 +1,153 @@
+"""
+Search latency on a synthetic corpus of --chunks index rows (10k to 10M).
+
+    python benchmarks/bench_search.py --chunks 100000 --json results.jsonl
+    python benchmarks/bench_search.py --chunks 10000000 --index-type ivf_pq --data-dir /data/qc-10m --keep
+    python benchmarks/bench_search.py --chunks 50000 --modes keyword      # no embedding model needed
+
+The corpus is built through IndexWriter.append() from clustered random
+vectors and Zipf-distributed chunk text (synthetic.chunk_rows), so large
+corpora don't need the encoder; --vectors model encodes the chunk text
+instead. A --data-dir that already holds enough rows is searched as is.
+Queries go through querycase.index.search(), the same path as the web
+app's search_cases(), with the result and query-embedding caches cleared
+before each one; a cached repeat and a batched search_many() are timed too.
+"""
+import argparse
+
+import numpy as np
+
+import harness
+from synthetic import chunk_rows, clustered_vectors, case_date
+
+QUERIES = [
+    "qualified immunity excessive force officer",
+    "summary judgment de novo review",
+    "42 U.S.C. § 1983 retaliation",
+    "ineffective assistance of counsel strickland",
+    "chevron deference agency regulation",
+    "breach of contract damages remedy",
+    "hostile environment harassment title",
+    "miranda custodial interrogation suppression",
+    "asylum withholding removal torture",
+    "securities fraud scienter disclosure",
+]
+SPANS = ["search.encode", "search.filter", "search.vector", "search.exact", "search.keyword",
+         "search.fusion", "search.results"]
+
+
+def build_corpus(n, vectors, batch_size, chunks_per_case, seed=0):
+    from querycase.config import EMBEDDING_DIM
+    from querycase.embed import IndexWriter, encode_chunks
+
+    writer = IndexWriter()
+    start = writer.ntotal
+    if start >= n:
+        writer.close()
+        return start, 0.0
+    print(f"🧮 Building a {n}-row synthetic corpus ({start} rows already there)")
+    rng = np.random.default_rng(seed + start)
+    with harness.Timer() as t:
+        for texts, metadata in chunk_rows(n - start, chunks_per_case=chunks_per_case, batch_size=batch_size,
+                                          seed=seed + start):
+            embeddings = encode_chunks(texts) if vectors == "model" else clustered_vectors(len(texts), EMBEDDING_DIM, rng)
+            for entry in metadata:
+                entry["case_id"] += start // chunks_per_case
+            writer.append(embeddings, metadata)
+        writer.close()
+    return writer.ntotal, t.seconds
+
+
+def time_queries(engine, queries, repeat, k, **options):
+    from querycase.index import search
+
+    times = []
+    for _ in range(repeat):
+        for query in queries:
+            engine.result_cache.clear()
+            engine.embedding_cache.clear()
+            with harness.Timer() as t:
+                search(query, k, **options)
+            times.append(t.seconds)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000, help="Index rows in the corpus")
+    parser.add_argument("--vectors", choices=("synthetic", "model"), default="synthetic")
+    parser.add_argument("--chunks-per-case", type=int, default=20)
+    parser.add_argument("--build-batch", type=int, default=50000, help="Rows per appended segment")
+    parser.add_argument("--index-type", default=None, help="Rebuild the corpus as this index type (querycase-reindex)")
+    parser.add_argument("--modes", default="keyword,vector,hybrid")
+    parser.add_argument("--queries-file", help="One query per line (default: built-in legal queries)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument("--ef-search", type=int, default=None)
+    harness.add_arguments(parser)
+    args = parser.parse_args()
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+
+    queries = QUERIES
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    data_dir = harness.configure(args.data_dir, keep=args.keep)
+
+    from querycase.index import get_engine, search, search_many
+    from querycase.reindex import rebuild_index
+
+    rows, build_seconds = build_corpus(args.chunks, args.vectors, args.build_batch, args.chunks_per_case)
+    engine = get_engine()
+    with harness.Timer() as load:
+        if not engine.refresh():
+            raise SystemExit("❌ Index is empty")
+    reindex_seconds = 0.0
+    if args.index_type and (build_seconds or engine.index_kind() != args.index_type):
+        with harness.Timer() as t:
+            rebuild_index(args.index_type)
+        reindex_seconds = t.seconds
+        engine.refresh()
+    options = {"nprobe": args.nprobe, "ef_search": args.ef_search}
+    date_from = case_date(rows // args.chunks_per_case // 2)
+
+    # First query per mode, before anything is warm (includes model load for vector/hybrid)
+    results = {"rows": rows, "segments": len(engine.index.manifest["segments"]), "index_kind": engine.index_kind(),
+               "build_s": round(build_seconds, 3), "reindex_s": round(reindex_seconds, 3),
+               "load_s": round(load.seconds, 3), "modes": {}}
+    for mode in modes:
+        with harness.Timer() as cold:
+            search(queries[0], args.k, mode=mode, **options)
+        times = time_queries(engine, queries, args.repeat, args.k, mode=mode, **options)
+        with harness.Timer() as cached:
+            search(queries[0], args.k, mode=mode, **options)
+        # Later half of the corpus, two of the 13 courts
+        filtered = time_queries(engine, queries, 1, args.k, mode=mode, date_from=date_from,
+                                courts=["ca9", "ca2"], **options)
+        grouped = time_queries(engine, queries, 1, args.k, mode=mode, group_by_case=True, **options)
+        engine.result_cache.clear()
+        engine.embedding_cache.clear()
+        with harness.Timer() as batch:
+            search_many(queries, args.k, mode=mode, **options)
+        results["modes"][mode] = dict(
+            harness.latency_ms(times),
+            first_query_ms=round(cold.seconds * 1000, 3),
+            cached_ms=round(cached.seconds * 1000, 3),
+            filtered=harness.latency_ms(filtered),
+            grouped=harness.latency_ms(grouped),
+            batch_queries_per_sec=round(len(queries) / batch.seconds, 2),
+            queries_per_sec=round(len(times) / sum(times), 2),
+        )
+    results["spans"] = harness.span_seconds(SPANS)
+    results["peak_rss_mb"] = harness.peak_rss_mb()
+    results["data_dir_mb"] = harness.dir_size_mb(data_dir)
+
+    params = {k: v for k, v in vars(args).items() if k not in ("json", "keep", "queries_file")}
+    params.update(queries=len(queries), data_dir=data_dir)
+    harness.emit("search", params, results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Cold-start cost of each entry point: import time and RSS in a fresh
+interpreter, optionally followed by loading the models on first use.
+
+    python benchmarks/bench_startup.py --repeat 3
+    python benchmarks/bench_startup.py --with-models
+
+Every measurement runs in a new subprocess so nothing is already imported.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+ENTRY_POINTS = [
+    "querycase.config",
+    "querycase.index",
+    "querycase.embed",
+    "querycase.summarizer",
+    "querycase.update",
+    "querycase.reindex",
+    "querycase.server",
+    "querycase.app",
+]
+
+CHILD = r"""
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+result = {"import_s": time.perf_counter() - start}
+if sys.argv[2] == "1":
+    from querycase.models import get_embedder, get_summarizer
+    start = time.perf_counter()
+    get_embedder()
+    result["embedder_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    get_summarizer()
+    result["summarizer_s"] = time.perf_counter() - start
+result["rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps(result))
+"""
+
+
+def measure(module, with_models):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, module, "1" if with_models else "0"],
+        capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        return {"error": (out.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per entry point (median reported)")
+    parser.add_argument("--with-models", action="store_true", help="Also time first-use model loads")
+    parser.add_argument("--modules", nargs="*", default=ENTRY_POINTS)
+    args = parser.parse_args()
+
+    print(f"{'entry point':<22} {'import':>9} {'peak RSS':>10}")
+    for module in args.modules:
+        runs = [measure(module, False) for _ in range(args.repeat)]
+        errors = [r["error"] for r in runs if "error" in r]
+        if errors:
+            print(f"{module:<22} ❌ {errors[0]}")
+            continue
+        seconds = statistics.median(r["import_s"] for r in runs)
+        rss = statistics.median(r["rss_mb"] for r in runs)
+        print(f"{module:<22} {seconds:8.3f}s {rss:8.1f} MB")
+
+    if args.with_models:
+        r = measure("querycase.models", True)
+        if "error" in r:
+            print(f"model load             ❌ {r['error']}")
+        else:
+            print(f"first embedder load    {r['embedder_s']:8.3f}s")
+            print(f"first summarizer load  {r['summarizer_s']:8.3f}s  (peak RSS {r['rss_mb']:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Summary latency of summarize_texts() on synthetic opinions, shaped like the
+web app's request (the first --max-chars of --cases-per-summary cases).
+
+    python benchmarks/bench_summarize.py --summaries 5 --json results.jsonl
+    python benchmarks/bench_summarize.py --summaries 3 --batch 8   # also time summarize_batch()
+    python benchmarks/bench_summarize.py --mode map_reduce --words-per-case 20000 --time-budget 30
+
+Model load is timed separately. Every timed call bypasses the summary
+cache; one cached repeat is timed on its own.
+"""
+import argparse
+
+import harness
+from synthetic import opinion_text
+
+QUERY = "summary judgment de novo review"
+
+SPANS = ["summary.load", "summary.tokenize", "summary.generate", "summary.segment", "summary.map", "summary.reduce"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--summaries", type=int, default=5, help="Timed summarize_texts() calls")
+    parser.add_argument("--cases-per-summary", type=int, default=3)
+    parser.add_argument("--max-chars", type=int, default=None,
+                        help="Characters of each case fed in (default: 3000, or SUMMARY_CASE_CHARS for map_reduce)")
+    parser.add_argument("--mode", choices=("truncate", "map_reduce"), default="truncate")
+    parser.add_argument("--words-per-case", type=int, default=3000)
+    parser.add_argument("--time-budget", type=float, default=None, help="Seconds per map_reduce summary")
+    parser.add_argument("--batch", type=int, default=0, help="Also summarize this many cases with summarize_batch()")
+    harness.add_arguments(parser)
+    args = parser.parse_args()
+
+    data_dir = harness.configure(args.data_dir, keep=args.keep)
+
+    from querycase.config import SUMMARY_CASE_CHARS, SUMMARY_TIME_BUDGET
+    from querycase.models import get_summarizer
+    from querycase.summarizer import summarize_texts, summarize_batch, summarize_hierarchical, SUMMARY_SEGMENTS
+
+    max_chars = args.max_chars or (SUMMARY_CASE_CHARS if args.mode == "map_reduce" else 3000)
+    time_budget = args.time_budget if args.time_budget is not None else SUMMARY_TIME_BUDGET
+
+    def summarize(texts, use_cache):
+        if args.mode == "map_reduce":
+            return summarize_hierarchical(QUERY, texts, time_budget=time_budget, use_cache=use_cache)
+        return summarize_texts(QUERY, texts, use_cache=use_cache, mode="truncate")
+
+    with harness.Timer() as load:
+        get_summarizer()
+
+    times = []
+    texts = None
+    for i in range(args.summaries):
+        first = 1 + i * args.cases_per_summary
+        texts = [opinion_text(case_id, args.words_per_case)[:max_chars]
+                 for case_id in range(first, first + args.cases_per_summary)]
+        with harness.Timer() as t:
+            summarize(texts, use_cache=False)
+        times.append(t.seconds)
+
+    results = {
+        "model_load_s": round(load.seconds, 3),
+        "summaries": args.summaries,
+        "summarize": harness.latency_ms(times),
+    }
+    if args.mode == "map_reduce":
+        results["segments"] = {outcome: SUMMARY_SEGMENTS.value(outcome=outcome)
+                               for outcome in ("summarized", "cached", "dropped")}
+    if texts:
+        summarize(texts, use_cache=True)
+        with harness.Timer() as cached:
+            summarize(texts, use_cache=True)
+        results["cached_ms"] = round(cached.seconds * 1000, 3)
+    if args.batch:
+        cases = [opinion_text(case_id, args.words_per_case) for case_id in range(1, args.batch + 1)]
+        with harness.Timer() as batch:
+            summarize_batch(cases)
+        results["batch_cases_per_sec"] = round(args.batch / batch.seconds, 3)
+    results["spans"] = harness.span_seconds(SPANS)
+    results["peak_rss_mb"] = harness.peak_rss_mb()
+
+    params = {k: v for k, v in vars(args).items() if k not in ("json", "keep")}
+    params.update(max_chars=max_chars, time_budget=time_budget, data_dir=data_dir)
+    harness.emit("summarize", params, results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare benchmark records (JSONL written with --json) against a baseline.
+
+    python benchmarks/compare.py baseline.jsonl results.jsonl --threshold 0.15
+
+The last record of each benchmark in either file is compared metric by
+metric: `*_per_sec` should not drop, `*_ms` / `*_s` should not grow, by
+more than --threshold (a fraction). Timings that moved by less than
+--min-ms are noise and never count. Exits 1 if anything regressed.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    latest = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                latest[record["benchmark"]] = record
+    return latest
+
+
+def flatten(results, prefix=""):
+    out = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            out.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+
+def direction(metric):
+    """
+    +1 if higher is better, -1 if lower is better, 0 if not compared.
+    """
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf.endswith("_per_sec"):
+        return 1
+    if leaf.endswith(("_ms", "_s")) and not leaf.startswith("total"):
+        return -1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--min-ms", type=float, default=5.0, help="Ignore timing changes smaller than this")
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    regressions = 0
+    for name in sorted(set(baseline) & set(current)):
+        old, new = flatten(baseline[name]["results"]), flatten(current[name]["results"])
+        print(f"📊 {name}")
+        for metric in sorted(set(old) & set(new)):
+            sign = direction(metric)
+            if not sign or not old[metric]:
+                continue
+            change = (new[metric] - old[metric]) / abs(old[metric])
+            worse = -sign * change > args.threshold
+            if sign < 0:
+                scale = 1 if metric.endswith("_ms") else 1000
+                worse = worse and abs(new[metric] - old[metric]) * scale >= args.min_ms
+            regressions += worse
+            print(f"  {'❌' if worse else '✅'} {metric:<40} {old[metric]:>12g} → {new[metric]:>12g} ({change:+.1%})")
+    if regressions:
+        print(f"❌ {regressions} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
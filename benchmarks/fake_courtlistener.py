@@ -0,0 +1,181 @@
+"""
+Local stand-in for the CourtListener opinions API and PDF downloads.
+
+Serves `/api/rest/v4/opinions/` with the query parameters and `next`-link
+pagination fetch_new_case_batches() uses, and `/pdf/<case_id>.pdf` with a
+synthetic opinion PDF (see synthetic.py). Latency is injectable per request
+type, so fetch throughput can be measured against a slow API or slow court
+websites without touching the real service.
+
+    python benchmarks/fake_courtlistener.py --cases 5000 --api-latency-ms 300 --pdf-latency-ms 150
+    QUERYCASE_API_URL=http://127.0.0.1:8901/api/rest/v4/opinions/ QUERYCASE_DATA_DIR=/tmp/qc querycase-update
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+from synthetic import case_record, case_date, pdf_bytes
+
+API_PATH = "/api/rest/v4/opinions/"
+MAX_PAGE_SIZE = 100
+
+
+class FakeCourtListener:
+    """
+    Threaded HTTP server over case ids 1..cases, filed CASES_PER_DAY a day
+    from 2015-01-01 (so ids are in date_filed order). Counts requests and
+    bytes served, and the time spent generating PDFs, which is included in
+    the client's download time.
+    """
+
+    def __init__(self, cases, host="127.0.0.1", port=0, api_latency_ms=0.0, pdf_latency_ms=0.0,
+                 jitter=0.0, error_rate=0.0, words=3000, seed=0):
+        self.cases = cases
+        self.api_latency = api_latency_ms / 1000
+        self.pdf_latency = pdf_latency_ms / 1000
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.words = words
+        self.seed = seed
+        self.stats = {"api_requests": 0, "pdf_requests": 0, "pdf_bytes": 0, "pdf_generate_seconds": 0.0}
+        self._lock = threading.Lock()
+        handler = type("BoundHandler", (_Handler,), {"server_state": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return self.base_url + API_PATH
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-courtlistener", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def sleep(self, seconds):
+        if seconds:
+            time.sleep(seconds * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def count(self, **amounts):
+        with self._lock:
+            for key, value in amounts.items():
+                self.stats[key] += value
+
+    def first_case(self, date_filed_min):
+        """
+        Smallest case id filed on or after `date_filed_min` (binary search over ids).
+        """
+        lo, hi = 1, self.cases + 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if case_date(mid) < date_filed_min:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def page(self, params):
+        date_min = params.get("date_filed_min", "")
+        court = params.get("court__contains", "")
+        page_size = min(int(params.get("page_size", 20)), MAX_PAGE_SIZE)
+        cursor = int(params["cursor"]) if "cursor" in params else self.first_case(date_min)
+
+        results, case_id = [], cursor
+        while case_id <= self.cases and len(results) < page_size:
+            record = case_record(case_id, self.base_url)
+            if court in record["court_id"]:
+                results.append(record)
+            case_id += 1
+        next_url = None
+        if case_id <= self.cases:
+            query = {k: v for k, v in params.items() if k != "cursor"}
+            query["cursor"] = case_id
+            next_url = f"{self.api_url}?{urlencode(query)}"
+        return {"count": self.cases, "next": next_url, "previous": None, "results": results}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_state = None
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real API behind pooled sessions
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.server_state
+        url = urlsplit(self.path)
+        if url.path == API_PATH:
+            state.sleep(state.api_latency)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            body = json.dumps(state.page(params)).encode("utf-8")
+            state.count(api_requests=1)
+            self._send(200, body, "application/json")
+        elif url.path.startswith("/pdf/") and url.path.endswith(".pdf"):
+            try:
+                case_id = int(url.path[len("/pdf/"):-len(".pdf")])
+            except ValueError:
+                self._send(404, b"not found", "text/plain")
+                return
+            start = time.perf_counter()
+            data = pdf_bytes(case_id, state.words, state.error_rate, state.seed)
+            generated = time.perf_counter() - start
+            state.sleep(state.pdf_latency)
+            state.count(pdf_requests=1, pdf_bytes=len(data), pdf_generate_seconds=generated)
+            self._send(200, data, "application/pdf")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="Added to every API page")
+    parser.add_argument("--pdf-latency-ms", type=float, default=0.0, help="Added to every PDF download")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency varies by ± this fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of downloads that are error pages")
+    parser.add_argument("--words-per-case", type=int, default=3000)
+    args = parser.parse_args()
+
+    server = FakeCourtListener(args.cases, args.host, args.port, args.api_latency_ms, args.pdf_latency_ms,
+                               args.jitter, args.error_rate, args.words_per_case)
+    print(f"✅ Serving {args.cases} synthetic cases at {server.api_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"📊 {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
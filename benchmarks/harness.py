@@ -0,0 +1,134 @@
+"""
+Shared plumbing for the scripted benchmarks (bench_fetch / bench_ingest /
+bench_search / bench_summarize): an isolated data directory, span timings
+from querycase.metrics, and one JSON record per run for compare.py.
+"""
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def add_arguments(parser):
+    parser.add_argument("--data-dir", default=None,
+                        help="QueryCase data directory to use (default: a fresh temporary one)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary data directory")
+    parser.add_argument("--json", default=None, metavar="PATH", help="Append the result record to this JSONL file")
+
+
+def configure(data_dir=None, api_url=None, keep=False):
+    """
+    Point querycase at `data_dir` (a new temporary directory by default,
+    removed at exit unless `keep`) and optionally at another API URL.
+    Must run before anything imports querycase, which reads both at import.
+    """
+    if "querycase.config" in sys.modules:
+        raise RuntimeError("harness.configure() must run before querycase is imported")
+    if data_dir is None:
+        data_dir = tempfile.mkdtemp(prefix="querycase-bench-")
+        if not keep:
+            import atexit
+            atexit.register(shutil.rmtree, data_dir, True)
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ["QUERYCASE_DATA_DIR"] = os.path.abspath(data_dir)
+    if api_url:
+        os.environ["QUERYCASE_API_URL"] = api_url
+    return data_dir
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def latency_ms(times):
+    """
+    p50 / p95 / mean of a list of durations in seconds, as milliseconds.
+    """
+    return {
+        "p50_ms": round(percentile(times, 50) * 1000, 3),
+        "p95_ms": round(percentile(times, 95) * 1000, 3),
+        "mean_ms": round(statistics.mean(times) * 1000, 3) if times else 0.0,
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def dir_size_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return round(total / 2**20, 2)
+
+
+def span_seconds(names):
+    """
+    {span: {"count", "total_s"}} from querycase_span_seconds for each span that ran.
+    """
+    from querycase.metrics import SPAN_SECONDS
+    out = {}
+    for name in names:
+        count, total = SPAN_SECONDS.stats(span=name)
+        if count:
+            out[name] = {"count": count, "total_s": round(total, 4)}
+    return out
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    from querycase import config
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "embed_backend": config.EMBED_BACKEND,
+        "index_type": config.INDEX_TYPE,
+        "dedup_mode": config.DEDUP_MODE,
+    }
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+
+
+def emit(benchmark, params, results, path=None):
+    """
+    Print the run's record as JSON and append it (one line) to `path`.
+    """
+    record = {
+        "benchmark": benchmark,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "params": params,
+        "results": results,
+    }
+    print(json.dumps(record, indent=2))
+    if path:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    return record
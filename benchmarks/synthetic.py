@@ -0,0 +1,310 @@
+"""
+Deterministic synthetic court opinions for the benchmarks.
+
+Case `i` always gets the same name, court, filing date and text, so the
+local CourtListener stand-in, the ingest benchmark and a pre-built search
+corpus all agree without storing anything. Words are drawn from a Zipf
+distribution over legal terms plus generated filler terms, which gives
+keyword postings a realistic shape; a few boilerplate paragraphs repeat
+across cases, as they do in real opinions (and exercise chunk dedup).
+
+    python benchmarks/synthetic.py --chunks 100000 --out /tmp/corpus/json
+    python benchmarks/synthetic.py --cases 500 --format pdf --out /tmp/corpus/pdfs --error-rate 0.05
+
+Nothing here imports querycase, so benchmarks can point QUERYCASE_DATA_DIR
+elsewhere before the package reads its config.
+"""
+import argparse
+import json
+import os
+import textwrap
+from datetime import date, timedelta
+
+import numpy as np
+
+LEGAL_TERMS = (
+    "court appeal plaintiff defendant appellant appellee contract breach damages statute judgment "
+    "motion evidence jury trial circuit district opinion holding reverse affirm remand liability "
+    "negligence injunction license copyright patent employment discrimination retaliation immunity "
+    "qualified excessive force officer arrest warrant search seizure suppression miranda custodial "
+    "interrogation counsel ineffective strickland sentence guideline enhancement conviction habeas "
+    "petition petitioner respondent agency deference chevron regulation rule arbitrary capricious "
+    "jurisdiction standing venue removal preemption federal state claim cause action summary dismiss "
+    "pleading complaint amendment discovery privilege sanction fee award interest remedy relief "
+    "equitable estoppel waiver forfeiture plain error harmless abuse discretion de novo review "
+    "standard burden proof preponderance reasonable doubt witness testimony hearsay exhibit expert "
+    "insurer coverage policy exclusion bankruptcy debtor creditor trustee discharge securities fraud "
+    "scienter disclosure antitrust merger tariff immigration removal asylum withholding torture "
+    "title hostile environment harassment speech religion establishment equal protection due process"
+).split()
+SYLLABLES = "ba be bi bo bu da de di do du ka ke ki ko ku la le li lo lu ma me mi mo mu na ne ni no nu " \
+            "pa pe pi po pu ra re ri ro ru sa se si so su ta te ti to tu va ve vi vo vu".split()
+VOCAB_SIZE = 20000
+ZIPF_EXPONENT = 1.07
+
+COURTS = ("ca1", "ca2", "ca3", "ca4", "ca5", "ca6", "ca7", "ca8", "ca9", "ca10", "ca11", "cadc", "cafc")
+PARTIES = ("Smith", "Jones", "Garcia", "United States", "Acme Corp.", "Doe", "Johnson", "Williams",
+           "Brown", "Miller", "Davis", "Rodriguez", "Martinez", "Wilson", "Anderson", "Taylor")
+CITATIONS = (
+    "See Smith v. Jones, 123 F.3d 456, 460 (9th Cir. 1997).",
+    "42 U.S.C. § 1983.",
+    "Fed. R. Civ. P. 12(b)(6).",
+    "Id. at 12.",
+    "Strickland v. Washington, 466 U.S. 668, 687 (1984).",
+    "Chevron U.S.A., Inc. v. NRDC, 467 U.S. 837, 842-43 (1984).",
+)
+HEADINGS = ("I. BACKGROUND", "II. STANDARD OF REVIEW", "III. DISCUSSION", "IV. CONCLUSION")
+BOILERPLATE = (
+    "We review a district court's grant of summary judgment de novo, viewing the evidence in the "
+    "light most favorable to the nonmoving party and drawing all reasonable inferences in its favor.",
+    "For the foregoing reasons, the judgment of the district court is AFFIRMED. IT IS SO ORDERED.",
+    "This disposition is not appropriate for publication and is not precedent except as provided "
+    "by Ninth Circuit Rule 36-3.",
+)
+
+FIRST_DATE = date(2015, 1, 1)
+CASES_PER_DAY = 20
+WORDS_PER_CHUNK = 170   # ~ one 256-token window with 32 tokens of overlap
+
+
+def _vocabulary():
+    words = list(LEGAL_TERMS)
+    n = len(SYLLABLES)
+    i = 0
+    while len(words) < VOCAB_SIZE:
+        a, b, c = i % n, (i // n) % n, (i // (n * n)) % n
+        words.append(SYLLABLES[a] + SYLLABLES[b] + SYLLABLES[c] + ("" if i < n ** 3 else str(i)))
+        i += 1
+    weights = 1.0 / np.arange(1, len(words) + 1) ** ZIPF_EXPONENT
+    return np.array(words, dtype=object), np.cumsum(weights / weights.sum())
+
+
+VOCAB, VOCAB_CDF = _vocabulary()
+
+
+def draw_words(rng, n):
+    """
+    `n` Zipf-distributed vocabulary words (inverse CDF, much faster than rng.choice with p=).
+    """
+    idx = np.minimum(np.searchsorted(VOCAB_CDF, rng.random(n)), len(VOCAB) - 1)
+    return VOCAB[idx].tolist()
+
+
+def case_date(case_id, per_day=CASES_PER_DAY):
+    return (FIRST_DATE + timedelta(days=int(case_id) // per_day)).isoformat()
+
+
+def case_court(case_id):
+    return COURTS[int(case_id) % len(COURTS)]
+
+
+def case_name(case_id):
+    rng = np.random.default_rng([int(case_id), 1])
+    a, b = rng.choice(len(PARTIES), size=2, replace=False)
+    return f"{PARTIES[a]} v. {PARTIES[b]}"
+
+
+def opinion_text(case_id, words=3000, seed=0):
+    """
+    Opinion-like text for one case: headed sections of paragraphs of
+    sentences with occasional citations and shared boilerplate.
+    """
+    rng = np.random.default_rng([int(case_id), seed])
+    pool = draw_words(rng, words)
+    lengths = rng.integers(8, 32, size=words // 8 + 1)
+    paragraphs, sentences, pos = [], [], 0
+    for length in lengths.tolist():
+        if pos >= words:
+            break
+        sentence = pool[pos:pos + length]
+        pos += length
+        sentences.append(" ".join(sentence).capitalize() + ".")
+        if rng.random() < 0.15:
+            sentences.append(CITATIONS[int(rng.integers(len(CITATIONS)))])
+        if len(sentences) >= rng.integers(3, 9):
+            paragraphs.append(" ".join(sentences))
+            sentences = []
+    if sentences:
+        paragraphs.append(" ".join(sentences))
+
+    # Section headings and boilerplate at fixed relative positions
+    step = max(1, len(paragraphs) // len(HEADINGS))
+    for i, heading in reversed(list(enumerate(HEADINGS))):
+        paragraphs.insert(min(i * step, len(paragraphs)), heading)
+    paragraphs.insert(min(step + 1, len(paragraphs)), BOILERPLATE[0])
+    paragraphs.append(BOILERPLATE[1])
+    if case_id % 3 == 0:
+        paragraphs.append(BOILERPLATE[2])
+    return "\n\n".join(paragraphs)
+
+
+def case_record(case_id, base_url=None):
+    """
+    API-style listing of a case (no text), with a download URL under `base_url`.
+    """
+    return {
+        "id": int(case_id),
+        "case_name": case_name(case_id),
+        "date_filed": case_date(case_id),
+        "court_id": case_court(case_id),
+        "download_url": f"{base_url.rstrip('/')}/pdf/{int(case_id)}.pdf" if base_url else None,
+    }
+
+
+def iter_cases(n, start_id=1, words=3000, seed=0):
+    """
+    Ingest-ready case dicts (as fetch.py writes them), ids start_id..start_id+n-1.
+    """
+    for case_id in range(start_id, start_id + n):
+        yield {
+            "id": case_id,
+            "case_name": case_name(case_id),
+            "date_filed": case_date(case_id),
+            "download_url": None,
+            "court": case_court(case_id),
+            "opinion_text": opinion_text(case_id, words, seed),
+        }
+
+
+def cases_for_chunks(chunks, words=3000):
+    """
+    Number of cases whose token-window chunking gives about `chunks` chunks.
+    """
+    return max(1, -(-chunks * WORDS_PER_CHUNK // words))
+
+
+def chunk_rows(n, words_per_chunk=60, chunks_per_case=20, batch_size=50000, seed=0):
+    """
+    Yields (texts, metadata entries) batches for `n` index rows without
+    building whole opinions, for search corpora of millions of chunks.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, n, batch_size):
+        end = min(start + batch_size, n)
+        idx = np.minimum(np.searchsorted(VOCAB_CDF, rng.random((end - start, words_per_chunk))), len(VOCAB) - 1)
+        texts = [" ".join(row) for row in VOCAB[idx].tolist()]
+        metadata, case = [], None
+        for row, text in zip(range(start, end), texts):
+            case_id = row // chunks_per_case + 1
+            if case is None or case["case_id"] != case_id:
+                case = {"case_id": case_id, "case_name": case_name(case_id), "date_filed": case_date(case_id),
+                        "download_url": None, "court": case_court(case_id)}
+            metadata.append(dict(case, chunk_text=text))
+        yield texts, metadata
+
+
+def clustered_vectors(n, dim, rng, n_centers=None):
+    """
+    Unit vectors around `n_centers` random centers (IVF/PQ behave as on real embeddings).
+    """
+    n_centers = n_centers or max(1, n // 1000)
+    centers = np.random.default_rng(1234).normal(size=(n_centers, dim)).astype(np.float32)
+    x = centers[rng.integers(n_centers, size=n)] + 0.3 * rng.normal(size=(n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _pdf_string(line):
+    out = []
+    for ch in line:
+        code = ord(ch)
+        if ch in "()\\":
+            out.append("\\" + ch)
+        elif code < 128:
+            out.append(ch)
+        elif code < 256:
+            out.append("\\%03o" % code)
+        else:
+            out.append("?")
+    return "(" + "".join(out) + ")"
+
+
+def make_pdf(text, width=95, lines_per_page=60):
+    """
+    Minimal text PDF (Helvetica, WinAnsi) that PyMuPDF extracts `text` from.
+    """
+    lines = []
+    for paragraph in text.split("\n\n"):
+        lines.extend(textwrap.wrap(paragraph, width) or [""])
+        lines.append("")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = []   # body of object i + 1
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{' '.join(f'{p} 0 R' for p in page_ids)}] /Count {len(pages)} >>")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    for page_id, page in zip(page_ids, pages):
+        stream = "BT /F1 10 Tf 12 TL 50 760 Td\n" + "".join(f"{_pdf_string(line)} Tj T*\n" for line in page) + "ET"
+        data = stream.encode("latin-1")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>")
+        objects.append((f"<< /Length {len(data)} >>\nstream\n", data, "\nendstream"))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode("latin-1")
+        if isinstance(body, tuple):
+            out += body[0].encode("latin-1") + body[1] + body[2].encode("latin-1")
+        else:
+            out += body.encode("latin-1")
+        out += b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+ERROR_PAGE = (b"<html><head><title>403 Forbidden</title></head>"
+              b"<body><h1>403 Forbidden</h1><p>Access Denied</p></body></html>")
+
+
+def is_error_case(case_id, error_rate, seed=0):
+    """
+    Whether the download of `case_id` is an HTML error page (deterministic).
+    """
+    if error_rate <= 0:
+        return False
+    return np.random.default_rng([int(case_id), seed, 7]).random() < error_rate
+
+
+def pdf_bytes(case_id, words=3000, error_rate=0.0, seed=0):
+    if is_error_case(case_id, error_rate, seed):
+        return ERROR_PAGE
+    return make_pdf(opinion_text(case_id, words, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument("--cases", type=int)
+    size.add_argument("--chunks", type=int, help="Generate about this many index chunks' worth of cases")
+    parser.add_argument("--words-per-case", type=int, default=3000)
+    parser.add_argument("--format", choices=("json", "pdf"), default="json")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of PDFs that are HTML error pages")
+    parser.add_argument("--start-id", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="Directory for <case_id>.json / <case_id>.pdf files")
+    args = parser.parse_args()
+
+    n = args.cases or cases_for_chunks(args.chunks, args.words_per_case)
+    os.makedirs(args.out, exist_ok=True)
+    total = 0
+    for case_id in range(args.start_id, args.start_id + n):
+        if args.format == "pdf":
+            data = pdf_bytes(case_id, args.words_per_case, args.error_rate, args.seed)
+            with open(os.path.join(args.out, f"{case_id}.pdf"), "wb") as f:
+                f.write(data)
+            total += len(data)
+        else:
+            case = next(iter_cases(1, case_id, args.words_per_case, args.seed))
+            with open(os.path.join(args.out, f"{case_id}.json"), "w", encoding="utf-8") as f:
+                json.dump(case, f)
+            total += len(case["opinion_text"])
+    print(f"✅ Wrote {n} synthetic cases to {args.out} ({total / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import math
+import numpy as np
+import faiss
+from .config import (
+    EMBEDDING_DIM, INDEX_TYPE, IVF_NLIST, PQ_M, HNSW_M, HNSW_EF_CONSTRUCTION,
+    VECTORS_PATH,
+)
+
+# faiss.index_factory specs for each INDEX_TYPE
+INDEX_SPECS = {
+    "flat": "Flat",
+    "ivf_flat": "IVF{nlist},Flat",
+    "ivf_pq": "IVF{nlist},PQ{pq_m}",
+    "hnsw": "HNSW{hnsw_m}",
+    "sq8": "SQ8",
+}
+
+
+def needs_training(kind):
+    return kind in ("ivf_flat", "ivf_pq", "sq8")
+
+
+def nlist_for(n_vectors, nlist=IVF_NLIST):
+    """
+    Cap the number of IVF lists so each centroid gets enough training points
+    (faiss wants ~39 per centroid); ~4*sqrt(N) is the usual starting point.
+    """
+    if not n_vectors:
+        return nlist
+    return max(1, min(nlist, int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def make_index(kind=INDEX_TYPE, dim=EMBEDDING_DIM, n_vectors=None, nlist=IVF_NLIST, pq_m=PQ_M, hnsw_m=HNSW_M):
+    """
+    Build an empty (untrained) index of the given type.
+    """
+    if kind not in INDEX_SPECS:
+        raise ValueError(f"Unknown index type {kind!r}, expected one of {sorted(INDEX_SPECS)}")
+    spec = INDEX_SPECS[kind].format(nlist=nlist_for(n_vectors, nlist), pq_m=pq_m, hnsw_m=hnsw_m)
+    index = faiss.index_factory(dim, spec)
+    if kind == "hnsw":
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    return index
+
+
+def new_index(kind=INDEX_TYPE, dim=EMBEDDING_DIM):
+    """
+    Index to start ingesting into when none exists yet. Types that need
+    training start out flat until `querycase-reindex` has enough vectors.
+    """
+    if needs_training(kind):
+        print(f"ℹ️ INDEX_TYPE={kind} needs training — starting with a flat index, run querycase-reindex later.")
+        kind = "flat"
+    return make_index(kind, dim)
+
+
+def index_kind(index):
+    """
+    Best-effort INDEX_TYPE name for a loaded index.
+    """
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8"
+    return "flat"
+
+
+def search_parameters(index, nprobe=None, ef_search=None, sel=None):
+    """
+    Per-call search knobs as a faiss.SearchParameters object (thread-safe,
+    unlike setting index.nprobe). `sel` is a faiss.IDSelector restricting
+    the search to matching ids. Returns None when nothing applies.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and (nprobe or sel is not None):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = int(nprobe or ivf.nprobe)
+    elif isinstance(index, faiss.IndexHNSW) and (ef_search or sel is not None):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = int(ef_search or index.hnsw.efSearch)
+    elif sel is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if sel is not None:
+        params.sel = sel
+    return params
+
+
+def bitmap_selector(mask):
+    """
+    faiss.IDSelectorBitmap for a boolean row mask. Returns (selector, bits);
+    keep `bits` alive for as long as the selector is used.
+    """
+    bits = np.packbits(np.asarray(mask, dtype=bool), bitorder="little")
+    return faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits)), bits
+
+
+# -----------------------------
+# RAW VECTOR STORE
+# -----------------------------
+# Every embedded vector is also appended to VECTORS_PATH (float32 rows in
+# FAISS row order) so compressed/ANN indexes can be retrained and rebuilt.
+
+def load_vectors(path=VECTORS_PATH, dim=EMBEDDING_DIM):
+    """
+    Memory-map the stored vectors. Returns an (n, dim) float32 array.
+    """
+    if not os.path.exists(path):
+        return np.empty((0, dim), dtype=np.float32)
+    n = os.path.getsize(path) // (4 * dim)
+    if not n:
+        return np.empty((0, dim), dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="r", shape=(n, dim))
+
+
+def count_vectors(path=VECTORS_PATH, dim=EMBEDDING_DIM):
+    if not os.path.exists(path):
+        return 0
+    return os.path.getsize(path) // (4 * dim)
+
+
+def append_vectors(vectors, path=VECTORS_PATH, dim=EMBEDDING_DIM):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    with open(path, "ab") as f:
+        # Drop a partial trailing row left by a crash
+        f.truncate(count_vectors(path, dim) * 4 * dim)
+        f.write(vectors.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def truncate_vectors(n, path=VECTORS_PATH, dim=EMBEDDING_DIM):
+    if count_vectors(path, dim) > n:
+        with open(path, "r+b") as f:
+            f.truncate(n * 4 * dim)
+
+
+def sync_vectors(index, path=VECTORS_PATH, dim=EMBEDDING_DIM):
+    """
+    Make the vector file line up with the index rows: drop rows the index
+    never got (crash), and backfill rows from indexes built before vectors
+    were stored (flat/HNSW indexes can reconstruct them exactly).
+    """
+    stored = count_vectors(path, dim)
+    if stored > index.ntotal:
+        truncate_vectors(index.ntotal, path, dim)
+    elif stored < index.ntotal:
+        print(f"ℹ️ Backfilling {index.ntotal - stored} stored vectors from the index...")
+        step = 65536
+        for start in range(stored, index.ntotal, step):
+            n = min(step, index.ntotal - start)
+            append_vectors(index.reconstruct_n(start, n), path, dim)
@@ -1,112 +1,109 @@
-import os
-import json
-import faiss
-import numpy as np
+from datetime import date
 import streamlit as st
-from sentence_transformers import SentenceTransformer
 
 # Adjust these imports based on how your package is structured
 # If this file lives inside the `querycase` package, keep as-is;
 # if it's outside, change to: from querycase.config import ...
-from querycase.summarizer import summarize_texts
-from querycase.config import JSON_DIR, INDEX_PATH, META_PATH
+from querycase.summarizer import summarize_texts, cache_stats
+from querycase.config import SEGMENTS_DIR, META_DIR, DEFAULT_NPROBE, DEFAULT_EF_SEARCH, SEARCH_MODE
+from querycase.index import open_engine
+from querycase.metrics import span, start_export
+from querycase.config import METRICS_FILE, METRICS_PORT, SUMMARY_MODE, SUMMARY_CASE_CHARS
 
 # -----------------------------
 # CACHED HELPERS
 # -----------------------------
 
 @st.cache_resource
-def load_model():
+def load_engine():
     """
-    Load the SentenceTransformer model once, and reuse it across reruns.
+    Create the shared SearchEngine once and reuse it across reruns.
+    It keeps the FAISS index and metadata loaded and reloads them only
+    when the files change on disk, and caches query embeddings and results
+    so reruns don't re-encode the same query. With SHARDS set it is the
+    coordinator that fans queries out to the shard workers.
     """
-    return SentenceTransformer("all-MiniLM-L6-v2")
+    return open_engine()
 
 
 @st.cache_resource
-def load_index_and_metadata():
+def start_metrics():
     """
-    Load the FAISS index and metadata JSON only once.
-    Returns (index, metadata) or (None, None) if unavailable.
+    Export Prometheus metrics once per Streamlit process (if configured).
     """
-    if not (os.path.exists(INDEX_PATH) and os.path.exists(META_PATH)):
-        return None, None
-
-    index = faiss.read_index(INDEX_PATH)
-    with open(META_PATH, "r", encoding="utf-8") as f:
-        metadata = json.load(f)
-
-    return index, metadata
+    start_export(METRICS_FILE, METRICS_PORT)
+    return True
 
 
 # -----------------------------
 # CORE SEARCH FUNCTION
 # -----------------------------
 
-def search_cases(query: str, top_k: int = 5):
+def search_cases(query: str, top_k: int = 5, nprobe: int = None, ef_search: int = None,
+                 mode: str = SEARCH_MODE, date_from=None, date_to=None, courts=None,
+                 group_by_case: bool = False, case_score: str = "max"):
     """
     Semantic search for the most relevant case snippets.
     Returns a list of dicts with case info.
+    `nprobe` / `ef_search` tune IVF / HNSW indexes (ignored for flat).
+    `mode` is "vector", "keyword" (BM25, good for citations and party
+    names) or "hybrid" (reciprocal rank fusion of both).
+    `date_from` / `date_to` / `courts` filter inside the search itself,
+    so top_k results all match.
+    `group_by_case` returns top_k distinct cases (scored by the max or sum
+    of their chunk scores) with their best snippets, instead of chunks.
     """
-    index, metadata = load_index_and_metadata()
-    if index is None or metadata is None:
-        return []
+    with span("app.search"):
+        return load_engine().search(query, top_k, nprobe=nprobe, ef_search=ef_search, mode=mode,
+                                    date_from=date_from, date_to=date_to, courts=courts,
+                                    group_by_case=group_by_case, case_score=case_score)
 
-    model = load_model()
-    # Encode query into embedding
-    query_embedding = model.encode([query])
-    distances, indices = index.search(np.array(query_embedding, dtype=np.float32), top_k)
 
-    results = []
-    for idx in indices[0]:
-        # Safety: ensure idx is within metadata bounds
-        if idx < 0 or idx >= len(metadata):
-            continue
-        match = metadata[idx]
-
-        # Include case_id if available in your metadata
-        case_id = match.get("case_id")
-
-        results.append({
-            "case_id": case_id,
-            "case_name": match.get("case_name") or "Unnamed Case",
-            "date_filed": match.get("date_filed") or "Unknown Date",
-            "snippet": (match.get("chunk_text") or "")[:500],
-            "link": match.get("download_url") or "",
-        })
-    return results
+def show_cache_stats(container, engine):
+    """
+    Query embedding / result cache counters for the sidebar.
+    """
+    stats = engine.cache_stats()
+    lines = []
+    for label, key in (("Query embeddings", "embeddings"), ("Results", "results")):
+        s = stats[key]
+        lines.append(f"{label}: {s['hits']} hits / {s['misses']} misses ({s['hit_rate']:.0%})")
+    container.caption("Search cache  \n" + "  \n".join(lines))
 
 
 def load_full_texts_for_summary(results, max_cases: int = 3, max_chars: int = 3000):
     """
-    Load full case texts from the JSON_DIR for the top results to feed into the summarizer.
+    Load the opening of the full case texts for the top results to feed
+    into the summarizer, from the compressed case-text store kept at ingest.
     We:
-    - Look at at most `max_cases` cases
-    - Trim each case to `max_chars` characters to keep summarization manageable
+    - Look at at most `max_cases` distinct cases
+    - Read only the first `max_chars` characters of each case
     """
-    full_texts = []
+    try:
+        return load_engine().case_texts(results, max_cases=max_cases, max_chars=max_chars)
+    except Exception as e:
+        # Show a small warning in the UI but continue
+        st.warning(f"Failed to load case texts: {e}")
+        return []
 
-    for result in results[:max_cases]:
-        case_id = result.get("case_id")
-        if not case_id:
-            continue
 
-        json_path = os.path.join(JSON_DIR, f"{case_id}.json")
-        if not os.path.exists(json_path):
+def precomputed_summaries(results, max_cases: int = 3):
+    """
+    (case_name, summary) pairs for the top distinct cases that already have
+    a summary generated at ingest time (`querycase-update --summaries`).
+    """
+    summaries = []
+    seen = set()
+    for result in results:
+        case_id = result.get("case_id")
+        if case_id in seen:
             continue
-
-        try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                case_data = json.load(f)
-                opinion_text = case_data.get("opinion_text", "")
-                # Only use reasonably long texts
-                if len(opinion_text) >= 300:
-                    full_texts.append(opinion_text[:max_chars])
-        except Exception as e:
-            # Show a small warning in the UI but continue
-            st.warning(f"Failed to load case {case_id}: {e}")
-
-    return full_texts
+        seen.add(case_id)
+        if len(seen) > max_cases:
+            break
+        if result.get("summary"):
+            summaries.append((result["case_name"], result["summary"]))
+    return summaries
 
 
 # -----------------------------
@@ -129,20 +126,60 @@ def main():
     with st.sidebar:
         st.header("Settings")
         top_k = st.slider("Number of results (top_k)", min_value=1, max_value=20, value=5)
+        ranking_modes = {"Hybrid": "hybrid", "Semantic": "vector", "Keyword (BM25)": "keyword"}
+        ranking = st.radio(
+            "Ranking", list(ranking_modes),
+            index=0,  # the app defaults to hybrid; search_cases() callers opt in with mode="hybrid"
+            help="Keyword matching finds exact citations, statute numbers and party names.",
+        )
+        group_by_case = st.checkbox("One result per case", value=False)
+        case_scores = {"Best passage": "max", "All matching passages": "sum"}
+        case_score = st.selectbox(
+            "Rank cases by", list(case_scores), disabled=not group_by_case,
+            help="Sum favours cases with many relevant passages.",
+        )
         summarize_toggle = st.checkbox("Summarize top cases", value=True)
         max_cases_for_summary = st.slider(
             "Max cases to summarize", min_value=1, max_value=5, value=3
         )
+        whole_opinions = st.checkbox(
+            "Summarize whole opinions", value=SUMMARY_MODE == "map_reduce",
+            help="Summarize every part of the opinions and merge the results (slower) "
+                 "instead of only their opening paragraphs.",
+        )
+
+    start_metrics()
 
     # Check that index & metadata exist
-    index, metadata = load_index_and_metadata()
-    if index is None or metadata is None:
+    engine = load_engine()
+    if not engine.refresh():
         st.error(
             "❌ FAISS index or metadata not found.\n\n"
-            f"Expected:\n- INDEX_PATH: `{INDEX_PATH}`\n- META_PATH: `{META_PATH}`"
+            f"Expected:\n- SEGMENTS_DIR: `{SEGMENTS_DIR}`\n- META_DIR: `{META_DIR}`"
         )
         st.stop()
 
+    # Approximate index knobs, only shown for index types they apply to
+    nprobe = ef_search = None
+    kind = engine.index_kind()
+    if kind in ("ivf_flat", "ivf_pq", "hnsw"):
+        with st.sidebar.expander(f"Index tuning ({kind})"):
+            if kind == "hnsw":
+                ef_search = st.slider("efSearch", min_value=16, max_value=512, value=DEFAULT_EF_SEARCH)
+            else:
+                nprobe = st.slider("nprobe", min_value=1, max_value=256, value=DEFAULT_NPROBE)
+
+    # Filters are applied inside the search, not to the top_k afterwards
+    date_from = date_to = None
+    with st.sidebar.expander("Filters"):
+        if st.checkbox("Filter by filing date"):
+            earliest, today = date(1750, 1, 1), date.today()
+            date_from = st.date_input("Filed on or after", value=date(2018, 1, 1), min_value=earliest, max_value=today)
+            date_to = st.date_input("Filed on or before", value=today, min_value=earliest, max_value=today)
+        courts = st.multiselect("Courts", options=engine.courts(), help="Leave empty for all courts.")
+
+    cache_box = st.sidebar.empty()
+
     # Query input
     query = st.text_area(
         "Enter your legal question or search query:",
@@ -153,11 +190,23 @@ def main():
     search_button = st.button("🔍 Search Cases")
 
     if search_button and query.strip():
+        # Remembered so later reruns (e.g. the summary button) keep the results
+        st.session_state["active_query"] = query
+    elif search_button:
+        st.warning("Please enter a query before searching.")
+        st.session_state.pop("active_query", None)
+
+    query = st.session_state.get("active_query")
+    if query:
         with st.spinner("Searching relevant cases..."):
-            results = search_cases(query, top_k=top_k)
+            results = search_cases(query, top_k=top_k, nprobe=nprobe, ef_search=ef_search,
+                                   mode=ranking_modes[ranking], date_from=date_from, date_to=date_to,
+                                   courts=courts, group_by_case=group_by_case,
+                                   case_score=case_scores[case_score])
 
+        show_cache_stats(cache_box, engine)
         if not results:
-            st.warning("No results found for this query.")
+            st.warning("No results found for this query (check the sidebar filters).")
             return
 
         st.subheader("🔎 Search Results")
@@ -168,31 +217,56 @@ def main():
             snippet = result["snippet"]
 
             with st.expander(f"Match {i}: {case_name} ({case_date})"):
+                if result.get("court"):
+                    st.caption(f"Court: {result['court']}")
                 if link:
                     st.markdown(f"[Open case PDF]({link})")
-                st.markdown("**Snippet:**")
-                st.write(snippet + "…")
+                if result.get("summary"):
+                    st.markdown("**Case summary:**")
+                    st.write(result["summary"])
+                if result.get("snippets"):
+                    st.markdown(f"**Matching passages** ({result['matched_chunks']} matched):")
+                    for passage in result["snippets"]:
+                        st.write(passage + "…")
+                else:
+                    st.markdown("**Snippet:**")
+                    st.write(snippet + "…")
 
         # Summarization
         if summarize_toggle:
             st.subheader("🧠 Summary of Relevant Cases")
+            case_summaries = precomputed_summaries(results, max_cases=max_cases_for_summary)
+            if case_summaries:
+                # Assembled from per-case summaries made at ingest, no model call
+                for case_name, case_summary in case_summaries:
+                    st.markdown(f"**{case_name}:** {case_summary}")
             if st.button("Generate summary from top cases"):
                 with st.spinner("Summarizing top cases..."):
                     full_texts = load_full_texts_for_summary(
-                        results, max_cases=max_cases_for_summary
+                        results, max_cases=max_cases_for_summary,
+                        max_chars=SUMMARY_CASE_CHARS if whole_opinions else 3000,
                     )
 
                     if full_texts:
-                        summary = summarize_texts(query, full_texts)
+                        with span("app.summarize"):
+                            summary = summarize_texts(
+                                query, full_texts, mode="map_reduce" if whole_opinions else "truncate"
+                            )
                         st.markdown("#### Summary")
                         st.write(summary)
+                        stats = cache_stats()
+                        st.caption(
+                            f"Summary cache: {stats['hits']} hits / {stats['misses']} misses "
+                            f"({stats['hit_rate']:.0%} hit rate)"
+                        )
                     else:
                         st.warning(
                             "No usable full texts found for summarization. "
-                            "Make sure JSON case files exist in JSON_DIR."
+                            "Texts are stored at ingest; run `python -m querycase.casestore` "
+                            "to import existing JSON case files."
                         )
-    elif search_button:
-        st.warning("Please enter a query before searching.")
+    else:
+        show_cache_stats(cache_box, engine)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,358 @@
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+from .config import BM25_DIR, BM25_K1, BM25_B
+from .segments import _fsync_dir
+
+MANIFEST = "manifest.json"
+ARRAYS = ("terms", "offsets", "docs", "tfs", "lens")
+
+# Keeps citations and section numbers together: "u.s.c", "1983", "12(b)(6)" -> "12", "b", "6", "§"
+TOKEN_RE = re.compile(r"§|\w+(?:[.\-:']\w+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have he her his i in is it its of on or "
+    "that the their there they this to was were which who will with".split()
+)
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+@lru_cache(maxsize=1 << 16)
+def term_hash(term):
+    # 64-bit term ids, so no vocabulary strings need to be stored or loaded
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _build_arrays(texts, start):
+    """
+    Postings for `texts` (rows start, start+1, ...), sorted by term hash then
+    row: terms[i] owns docs/tfs[offsets[i]:offsets[i + 1]].
+    """
+    hashes, docs, tfs = [], [], []
+    lens = np.zeros(len(texts), dtype=np.uint32)
+    for i, text in enumerate(texts):
+        tokens = tokenize(text or "")
+        lens[i] = len(tokens)
+        counts = Counter(tokens)
+        hashes.extend(term_hash(t) for t in counts)
+        tfs.extend(counts.values())
+        docs.extend([start + i] * len(counts))
+    return _sorted_arrays(
+        np.array(hashes, dtype=np.uint64),
+        np.array(docs, dtype=np.int64),
+        np.minimum(np.array(tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16),
+        lens,
+    )
+
+
+def _sorted_arrays(hashes, docs, tfs, lens):
+    order = np.lexsort((docs, hashes))
+    hashes = hashes[order]
+    terms, first = np.unique(hashes, return_index=True)
+    return {
+        "terms": terms,
+        "offsets": np.append(first, len(hashes)).astype(np.int64),
+        "docs": docs[order],
+        "tfs": tfs[order],
+        "lens": lens,
+    }
+
+
+class BM25Index:
+    """
+    Keyword (BM25) inverted index over chunk_text, row-aligned with the FAISS
+    index and the metadata store.
+
+    Like the FAISS index it is stored as immutable segments plus an atomically
+    replaced manifest: each ingest batch adds a segment holding the postings
+    of its rows as .npy arrays, which searches open memory-mapped, so the
+    postings live in the page cache rather than the process heap. Adjacent
+    segments are merged whenever the newest is at least as large as the one
+    before it, which keeps O(log n) segments.
+    """
+
+    def __init__(self, directory=BM25_DIR, k1=BM25_K1, b=BM25_B):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST)
+        self.k1 = k1
+        self.b = b
+        self.manifest = {"generation": 0, "next_id": 1, "rows": 0, "tokens": 0, "segments": []}
+        self._view = ([], {})  # (segments, arrays) swapped together for searches
+        self._stamp = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # -----------------------------
+    # Manifest / reading
+    # -----------------------------
+
+    def _manifest_stamp(self):
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _write_manifest(self, manifest):
+        manifest = dict(manifest, generation=manifest["generation"] + 1)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        _fsync_dir(self.directory)
+        self.manifest = manifest
+        self._stamp = self._manifest_stamp()
+
+    def _path(self, name, array):
+        return os.path.join(self.directory, f"{name}.{array}.npy")
+
+    def _open_segment(self, name):
+        return {a: np.load(self._path(name, a), mmap_mode="r") for a in ARRAYS}
+
+    def refresh(self):
+        """
+        Re-read the manifest if it changed and map any new segments.
+        Returns True if something changed.
+        """
+        for attempt in range(3):
+            stamp = self._manifest_stamp()
+            if stamp == self._stamp or stamp is None:
+                return False
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            _, arrays = self._view
+            try:
+                loaded = {s["name"]: arrays.get(s["name"]) or self._open_segment(s["name"])
+                          for s in manifest["segments"]}
+            except FileNotFoundError:
+                # A merge replaced segments between reading the manifest and opening them
+                time.sleep(0.05 * (attempt + 1))
+                continue
+            self.manifest = manifest
+            self._view = (manifest["segments"], loaded)
+            self._stamp = stamp
+            return True
+        raise RuntimeError(f"BM25 segments in {self.directory} kept changing while loading")
+
+    @property
+    def rows(self):
+        return self.manifest["rows"]
+
+    def generation(self):
+        return self.manifest["generation"]
+
+    # -----------------------------
+    # Searching
+    # -----------------------------
+
+    def term_stats(self, terms):
+        """
+        (documents, tokens, {term: document frequency}) for `terms`. Summed
+        over shards they are the statistics of the whole collection; see
+        search(stats=...).
+        """
+        segments, arrays = self._view
+        df = {}
+        for term in set(terms):
+            key = np.uint64(term_hash(term))
+            count = 0
+            for seg in segments:
+                a = arrays[seg["name"]]
+                pos = np.searchsorted(a["terms"], key)
+                if pos < len(a["terms"]) and a["terms"][pos] == key:
+                    count += int(a["offsets"][pos + 1] - a["offsets"][pos])
+            df[term] = count
+        return sum(s["rows"] for s in segments), sum(s["tokens"] for s in segments), df
+
+    def search(self, query, top_k=5, mask=None, stats=None):
+        """
+        BM25 top-k for one query. Returns (scores, rows), best first.
+        `mask` is a boolean array over rows; rows outside it are skipped.
+        `stats` (documents, tokens, ((term, df), ...)) replace this index's
+        own collection statistics, so a shard scores like the full index.
+        """
+        segments, arrays = self._view
+        if not sum(s["rows"] for s in segments):
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        if stats is None:
+            n_docs, tokens, global_df = self.term_stats(())
+        else:
+            n_docs, tokens, global_df = stats[0], stats[1], dict(stats[2])
+        avgdl = max(tokens / n_docs, 1.0)
+
+        all_docs, all_scores = [], []
+        for term in set(tokenize(query)):
+            docs, tfs, lens = [], [], []
+            key = np.uint64(term_hash(term))
+            for seg in segments:
+                a = arrays[seg["name"]]
+                pos = np.searchsorted(a["terms"], key)
+                if pos == len(a["terms"]) or a["terms"][pos] != key:
+                    continue
+                lo, hi = a["offsets"][pos], a["offsets"][pos + 1]
+                seg_docs = np.asarray(a["docs"][lo:hi])
+                docs.append(seg_docs)
+                tfs.append(np.asarray(a["tfs"][lo:hi], dtype=np.float32))
+                lens.append(a["lens"][seg_docs - seg["start"]].astype(np.float32))
+            if not docs:
+                continue
+            docs, tfs, lens = np.concatenate(docs), np.concatenate(tfs), np.concatenate(lens)
+            df = global_df.get(term, len(docs))
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            if mask is not None:
+                keep = docs < len(mask)
+                keep[keep] = mask[docs[keep]]
+                docs, tfs, lens = docs[keep], tfs[keep], lens[keep]
+                if not len(docs):
+                    continue
+            norm = self.k1 * (1.0 - self.b + self.b * lens / avgdl)
+            all_docs.append(docs)
+            all_scores.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+
+        if not all_docs:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        rows, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+        if len(rows) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return scores[order], rows[order]
+
+    # -----------------------------
+    # Writing (single writer, under the segment writer lock)
+    # -----------------------------
+
+    def _write_segment(self, arrays):
+        # Names are never reused, so a reader's cached mapping can't go stale
+        name = f"bm25-{self.manifest['next_id']:06d}"
+        self.manifest = dict(self.manifest, next_id=self.manifest["next_id"] + 1)
+        for a in ARRAYS:
+            path = self._path(name, a)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, arrays[a])
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+        return name
+
+    def _publish(self, segments, removed=()):
+        manifest = dict(self.manifest)
+        manifest["segments"] = segments
+        manifest["rows"] = sum(s["rows"] for s in segments)
+        manifest["tokens"] = sum(s["tokens"] for s in segments)
+        self._write_manifest(manifest)
+        for name in removed:
+            for a in ARRAYS:
+                try:
+                    os.remove(self._path(name, a))
+                except FileNotFoundError:
+                    pass
+        self._view = (segments, {s["name"]: self._open_segment(s["name"]) for s in segments})
+
+    def add(self, texts):
+        """
+        Index `texts` as the next rows and publish them as a new segment.
+        """
+        if not texts:
+            return self.rows
+        with self._lock:
+            arrays = _build_arrays(texts, self.rows)
+            name = self._write_segment(arrays)
+            segment = {"name": name, "start": self.rows, "rows": len(texts), "tokens": int(arrays["lens"].sum())}
+            self._publish(self.manifest["segments"] + [segment])
+            self._merge_tail()
+            return self.rows
+
+    def _merge_tail(self):
+        # Binary-counter policy: merge while the newest segment has caught up with the previous one
+        segments = self.manifest["segments"]
+        while len(segments) >= 2 and segments[-1]["rows"] >= segments[-2]["rows"]:
+            prev, last = segments[-2], segments[-1]
+            a, b = self._open_segment(prev["name"]), self._open_segment(last["name"])
+            merged = _sorted_arrays(
+                np.concatenate([np.repeat(a["terms"], np.diff(a["offsets"])), np.repeat(b["terms"], np.diff(b["offsets"]))]),
+                np.concatenate([a["docs"], b["docs"]]),
+                np.concatenate([a["tfs"], b["tfs"]]),
+                np.concatenate([a["lens"], b["lens"]]),
+            )
+            name = self._write_segment(merged)
+            segment = {"name": name, "start": prev["start"], "rows": prev["rows"] + last["rows"],
+                       "tokens": prev["tokens"] + last["tokens"]}
+            segments = segments[:-2] + [segment]
+            self._publish(segments, removed=(prev["name"], last["name"]))
+
+    def truncate(self, n):
+        """
+        Drop rows past `n` (rows indexed before a crash kept the FAISS segment
+        from being published).
+        """
+        if n >= self.rows:
+            return
+        with self._lock:
+            keep, removed = [], []
+            for seg in self.manifest["segments"]:
+                if seg["start"] + seg["rows"] <= n:
+                    keep.append(seg)
+                    continue
+                removed.append(seg["name"])
+                if seg["start"] < n:
+                    a = self._open_segment(seg["name"])
+                    terms = np.repeat(a["terms"], np.diff(a["offsets"]))
+                    mask = np.asarray(a["docs"]) < n
+                    lens = np.asarray(a["lens"])[:n - seg["start"]]
+                    arrays = _sorted_arrays(terms[mask], np.asarray(a["docs"])[mask], np.asarray(a["tfs"])[mask], lens)
+                    keep.append({"name": self._write_segment(arrays), "start": seg["start"],
+                                 "rows": n - seg["start"], "tokens": int(lens.sum())})
+            self._publish(keep, removed=removed)
+
+    def remove_orphans(self):
+        """
+        Delete segment files not referenced by the manifest (crash between
+        writing a segment and publishing it).
+        """
+        live = {s["name"] for s in self.manifest["segments"]}
+        for entry in os.scandir(self.directory):
+            name = entry.name.split(".", 1)[0]
+            if entry.name.startswith("bm25-") and name not in live:
+                os.remove(entry.path)
+
+    def open_for_writing(self):
+        """
+        Load the manifest and clean up after a crash. Writer-side only.
+        """
+        self.refresh()
+        self.remove_orphans()
+        return self
+
+
+def rebuild_from_metadata(index, metadata, target=None, batch_size=10000):
+    """
+    Index chunk_text of metadata rows [index.rows, target) — builds the
+    keyword index for an existing install or catches up after a crash.
+    """
+    target = len(metadata) if target is None else target
+    if index.rows >= target:
+        return
+    print(f"ℹ️ Building keyword index for rows {index.rows}..{target}")
+    while index.rows < target:
+        start = index.rows
+        end = min(start + batch_size, target)
+        index.add([metadata.chunk_text(row) for row in range(start, end)])
+
+
+if __name__ == "__main__":
+    from .metastore import open_store
+
+    rebuild_from_metadata(BM25Index().open_for_writing(), open_store())
@@ -0,0 +1,183 @@
+import os
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def content_key(*parts):
+    """
+    Stable sha256 key for JSON-serialisable parts (text, parameters, ...).
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU with hit/miss counters.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class DiskCache:
+    """
+    Persistent text cache: one file per key under `directory`, evicting the
+    least recently used files (by mtime, bumped on read) once the total size
+    passes `max_bytes`. Nothing touches the disk until the first put(), so
+    a module-level cache doesn't create its directory on import.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None  # bytes on disk, counted on first use
+
+    def _size_on_disk(self):
+        if self._size is None:
+            try:
+                self._size = sum(e.stat().st_size for e in os.scandir(self.directory) if e.is_file())
+            except FileNotFoundError:
+                self._size = 0
+        return self._size
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        data = value.encode("utf-8")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            self._size_on_disk()  # counted before the temp file exists
+        os.makedirs(self.directory, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            old = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._size += len(data) - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop oldest files until we're back under 90% of the budget
+        entries = sorted(
+            (e for e in os.scandir(self.directory) if e.is_file() and e.name.endswith(".txt")),
+            key=lambda e: e.stat().st_mtime,
+        )
+        target = self.max_bytes * 0.9
+        self._size = sum(e.stat().st_size for e in entries)
+        for e in entries:
+            if self._size <= target:
+                break
+            try:
+                size = e.stat().st_size
+                os.remove(e.path)
+                self._size -= size
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "bytes": self._size_on_disk(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class TieredCache:
+    """
+    LRU in front of a DiskCache; disk hits are promoted into memory.
+    `stats()` reports overall and per-layer hit rates.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory": self.memory.stats(),
+        }
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
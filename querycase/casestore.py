@@ -0,0 +1,245 @@
+import os
+import glob
+import json
+import mmap
+import zlib
+import threading
+import numpy as np
+from .config import (
+    JSON_DIR, SUMMARIES_DIR, CASE_TEXT_DIR, CASE_TEXT_CODEC, CASE_TEXT_LEVEL, CASE_TEXT_FRAME_CHARS,
+)
+
+try:
+    import zstandard
+except ImportError:  # optional; texts are zlib-compressed without it
+    zstandard = None
+
+# One record per stored value; later records for the same case win.
+INDEX_DTYPE = np.dtype([
+    ("case_id", "<i8"),
+    ("offset", "<u8"),
+    ("length", "<u4"),
+])
+
+
+class KeyedBlobStore:
+    """
+    Append-only values keyed by case_id: `<name>.bin` holds the bytes and
+    `<name>.idx` one fixed-width (case_id, offset, length) record per value.
+    Both are memory-mapped; a case_id -> record dict is built incrementally
+    as new records appear, so lookups are O(1).
+    """
+
+    def __init__(self, path, name):
+        self.path = path
+        self.idx_path = os.path.join(path, f"{name}.idx")
+        self.bin_path = os.path.join(path, f"{name}.bin")
+        os.makedirs(path, exist_ok=True)
+        for p in (self.idx_path, self.bin_path):
+            if not os.path.exists(p):
+                open(p, "ab").close()
+        self._records = np.empty(0, dtype=INDEX_DTYPE)
+        self._positions = {}
+        self._blob = None
+        self._blob_size = 0
+        self._generation = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def generation(self):
+        st = os.stat(self.idx_path)
+        return st.st_size, st.st_mtime_ns
+
+    def refresh(self):
+        """
+        Pick up records appended since the last refresh (by any process).
+        """
+        generation = self.generation()
+        if generation == self._generation:
+            return False
+        n = generation[0] // INDEX_DTYPE.itemsize
+        seen = len(self._records)
+        self._records = (
+            np.memmap(self.idx_path, dtype=INDEX_DTYPE, mode="r", shape=(n,))
+            if n else np.empty(0, dtype=INDEX_DTYPE)
+        )
+        if n < seen:
+            self._positions = {}
+            seen = 0
+        for i, case_id in enumerate(self._records["case_id"][seen:].tolist(), start=seen):
+            self._positions[case_id] = i
+        self._generation = generation
+        return True
+
+    def _bytes(self, offset, length):
+        end = offset + length
+        if self._blob is None or end > self._blob_size:
+            # The old map is left to the GC, a concurrent reader may still be slicing it
+            with open(self.bin_path, "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._blob_size = len(self._blob)
+        return self._blob[offset:end]
+
+    def __contains__(self, case_id):
+        return int(case_id) in self._positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _location(self, case_id):
+        pos = self._positions.get(int(case_id))
+        if pos is None:
+            return None
+        record = self._records[pos]
+        return int(record["offset"]), int(record["length"])
+
+    def get_bytes(self, case_id):
+        location = self._location(case_id)
+        return self._bytes(*location) if location is not None else None
+
+    def put_many_bytes(self, items):
+        """
+        Append {case_id: bytes}. Data is flushed before the index records
+        that point at it, so a crash never leaves a dangling record.
+        """
+        if not items:
+            return
+        with self._lock:
+            records = np.zeros(len(items), dtype=INDEX_DTYPE)
+            with open(self.bin_path, "ab") as f:
+                offset = f.tell()
+                for i, (case_id, data) in enumerate(items.items()):
+                    f.write(data)
+                    records[i] = (int(case_id), offset, len(data))
+                    offset += len(data)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.idx_path, "r+b") as f:
+                # Overwrite any partial trailing record left by a crash
+                f.seek((os.fstat(f.fileno()).st_size // INDEX_DTYPE.itemsize) * INDEX_DTYPE.itemsize)
+                f.write(records.tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            self.refresh()
+
+
+class CaseSummaryStore(KeyedBlobStore):
+    """
+    Per-case summaries generated at ingest time, keyed by case_id.
+    """
+
+    def __init__(self, path=SUMMARIES_DIR):
+        super().__init__(path, "summaries")
+
+    def get(self, case_id):
+        data = self.get_bytes(case_id)
+        return data.decode("utf-8") if data is not None else None
+
+    def put_many(self, summaries):
+        self.put_many_bytes({case_id: text.encode("utf-8") for case_id, text in summaries.items()})
+
+
+# Case text record: codec byte, frame count, then (compressed bytes, chars)
+# per frame, then the independently compressed frames.
+FRAME_DTYPE = np.dtype([("size", "<u4"), ("chars", "<u4")])
+
+
+def _codec(name):
+    if name == "zstd" and zstandard is not None:
+        return b"s", zstandard.ZstdCompressor(level=CASE_TEXT_LEVEL).compress
+    if name not in ("zstd", "zlib"):
+        raise ValueError(f"Unknown case text codec {name!r} (expected 'zstd' or 'zlib')")
+    return b"z", lambda data: zlib.compress(data, CASE_TEXT_LEVEL)
+
+
+def _decompress(tag, data):
+    if tag == b"z":
+        return zlib.decompress(data)
+    if tag == b"s":
+        if zstandard is None:
+            raise ImportError("This case text is zstd-compressed; `pip install zstandard` to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown case text codec tag {tag!r}")
+
+
+class CaseTextStore(KeyedBlobStore):
+    """
+    Full opinion texts keyed by case_id, written at ingest so summaries
+    still have input after the JSON files are deleted. Each text is split
+    into CASE_TEXT_FRAME_CHARS-character frames that are compressed on
+    their own, so `get(case_id, max_chars)` only maps and decompresses the
+    frames covering the prefix it returns.
+    """
+
+    def __init__(self, path=CASE_TEXT_DIR, codec=CASE_TEXT_CODEC, frame_chars=CASE_TEXT_FRAME_CHARS):
+        super().__init__(path, "texts")
+        self.codec = codec
+        self.frame_chars = frame_chars
+
+    def encode(self, text):
+        tag, compress = _codec(self.codec)
+        pieces = [text[i:i + self.frame_chars] for i in range(0, len(text), self.frame_chars)]
+        frames = [compress(piece.encode("utf-8")) for piece in pieces]
+        table = np.array([(len(f), len(p)) for f, p in zip(frames, pieces)], dtype=FRAME_DTYPE)
+        header = tag + np.uint32(len(frames)).tobytes() + table.tobytes()
+        return header + b"".join(frames)
+
+    def get(self, case_id, max_chars=None):
+        """
+        The case text, or only its first `max_chars` characters. None if
+        the case was never stored.
+        """
+        location = self._location(case_id)
+        if location is None:
+            return None
+        offset, length = location
+        head = self._bytes(offset, min(length, 5))
+        tag, n = head[:1], int(np.frombuffer(head[1:5], dtype="<u4")[0])
+        table = np.frombuffer(self._bytes(offset + 5, n * FRAME_DTYPE.itemsize), dtype=FRAME_DTYPE)
+        position = offset + 5 + n * FRAME_DTYPE.itemsize
+        parts, chars = [], 0
+        for size, frame_chars in table.tolist():
+            if max_chars is not None and chars >= max_chars:
+                break
+            parts.append(_decompress(tag, self._bytes(position, size)).decode("utf-8"))
+            position += size
+            chars += frame_chars
+        text = "".join(parts)
+        return text[:max_chars] if max_chars is not None else text
+
+    def put_many(self, texts):
+        self.put_many_bytes({case_id: self.encode(text) for case_id, text in texts.items()})
+
+    def put_cases(self, cases):
+        """
+        Store the opinion text of any case not stored yet.
+        """
+        self.put_many({
+            case["id"]: case["opinion_text"] for case in cases
+            if case.get("opinion_text") and case["id"] not in self
+        })
+
+
+def import_json_texts(json_dir=JSON_DIR, store=None):
+    """
+    Copy opinion texts from existing JSON case files into the text store.
+    """
+    store = store or CaseTextStore()
+    texts = {}
+    for path in sorted(glob.glob(os.path.join(json_dir, "*.json"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                case = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping {path}: {e}")
+            continue
+        if case.get("id") is not None and case.get("opinion_text") and case["id"] not in store:
+            texts[case["id"]] = case["opinion_text"]
+    store.put_many(texts)
+    print(f"✅ Imported {len(texts)} case texts into {store.path} ({len(store)} stored)")
+    return len(texts)
+
+
+if __name__ == "__main__":
+    import_json_texts()
@@ -0,0 +1,149 @@
+import re
+import numpy as np
+from .config import CHUNK_STRATEGY, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_TOKENIZE_BATCH
+from .models import get_embedder
+
+# Paragraph breaks (blank lines) and section headings ("II.", "DISCUSSION")
+# are the preferred chunk boundaries, then sentence ends, then word starts.
+PARAGRAPH_RE = re.compile(r"\n[ \t]*\n\s*|\n[ \t]*(?=(?:[IVXL]+|[A-Z])\.[ \t]|[A-Z][A-Z ,&]{3,}\n)")
+# Sentence ends (punctuation first so the scan is fast), skipping "v.", "No.", "Id.", "Cf." and initials / "U.S."
+SENTENCE_RE = re.compile(
+    r"[.?!](?<!\bv.)(?<!\bNo.)(?<!\bId.)(?<!\bCf.)(?<!\b[A-Z].)[\"')\]”’]*\s+(?=[\"'(\[“‘]?[A-Z])"
+)
+
+STRATEGIES = ("tokens", "words")
+
+
+def chunk_words(text, max_words=200):
+    """
+    Legacy fixed windows of `max_words` whitespace-separated words.
+    """
+    words = text.split()
+    return [" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
+
+
+def token_budget(max_tokens=CHUNK_MAX_TOKENS):
+    """
+    Content tokens per chunk: the model's sequence limit (or `max_tokens`)
+    minus the special tokens the tokenizer adds.
+    """
+    model = get_embedder()
+    limit = max_tokens or model.max_seq_length
+    return limit - model.tokenizer.num_special_tokens_to_add()
+
+
+def _breaks(pattern, text, starts):
+    # Token index at which each match of `pattern` ends (the next unit starts)
+    positions = [m.end() for m in pattern.finditer(text)]
+    return np.unique(np.searchsorted(starts, positions))
+
+
+def _windows(n, levels, max_tokens, overlap):
+    """
+    (start, end) token spans of at most `max_tokens`. Each span ends at the
+    last break of the strongest level that still fills half the window,
+    and the next one starts about `overlap` tokens earlier, at a sentence
+    start (the one just before, if none falls inside the overlap and the
+    overlap stays under half a window) or else a word start.
+    """
+    spans = []
+    start = 0
+    min_fill = max_tokens // 2
+    while start < n:
+        limit = start + max_tokens
+        if limit >= n:
+            spans.append((start, n))
+            break
+        end = limit
+        for breaks in levels:
+            i = np.searchsorted(breaks, limit, side="right") - 1
+            if i >= 0 and breaks[i] >= start + min_fill:
+                end = int(breaks[i])
+                break
+        spans.append((start, end))
+        following = end - overlap
+        if overlap:
+            earliest = max(end - max_tokens // 2, start + 1)
+            for breaks in levels[1:]:
+                j = np.searchsorted(breaks, following)
+                if j < len(breaks) and breaks[j] < end:
+                    following = int(breaks[j])
+                    break
+                # No break inside the overlap (e.g. the window ends on one): take the one before
+                if j > 0 and breaks[j - 1] >= earliest:
+                    following = int(breaks[j - 1])
+                    break
+        start = max(following, start + 1)
+    return spans
+
+
+def _chunk_tokens(text, offsets, max_tokens, overlap):
+    if not len(offsets):
+        return []
+    starts, ends = offsets[:, 0], offsets[:, 1]
+    # A gap between two tokens means whitespace, i.e. the start of a word
+    words = np.flatnonzero(np.r_[False, starts[1:] > ends[:-1]])
+    levels = [_breaks(PARAGRAPH_RE, text, starts), _breaks(SENTENCE_RE, text, starts), words]
+    chunks = []
+    for start, end in _windows(len(offsets), levels, max_tokens, overlap):
+        chunk = " ".join(text[starts[start]:ends[end - 1]].split())
+        if chunk:
+            chunks.append(chunk)
+    return chunks
+
+
+def chunk_texts(texts, strategy=CHUNK_STRATEGY, max_tokens=CHUNK_MAX_TOKENS,
+                overlap=CHUNK_OVERLAP_TOKENS, batch_size=CHUNK_TOKENIZE_BATCH):
+    """
+    Split each text into chunks; returns one list of chunk strings per text.
+
+    "tokens" windows hold at most the embedding model's sequence length in
+    tokens (so nothing is truncated at encode time), end on paragraph or
+    sentence boundaries where possible and overlap by `overlap` tokens.
+    Texts are tokenized `batch_size` at a time by the fast tokenizer.
+    "words" is the legacy 200-word split.
+    """
+    if strategy == "words":
+        return [chunk_words(text) for text in texts]
+    if strategy != "tokens":
+        raise ValueError(f"Unknown chunk strategy {strategy!r} (expected one of {STRATEGIES})")
+
+    budget = token_budget(max_tokens)
+    if not 0 <= overlap < budget // 2:
+        raise ValueError(f"Chunk overlap must be between 0 and {budget // 2 - 1} tokens")
+    return token_windows(texts, get_embedder().tokenizer, budget, overlap, batch_size)
+
+
+def token_windows(texts, tokenizer, max_tokens, overlap=0, batch_size=CHUNK_TOKENIZE_BATCH):
+    """
+    Split each text into spans of at most `max_tokens` content tokens of
+    `tokenizer` (a fast tokenizer), on paragraph / sentence / word
+    boundaries. Shared by the chunker and the summarizer's segmenting.
+    """
+    results = []
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        encoded = tokenizer(
+            batch, add_special_tokens=False, return_offsets_mapping=True,
+            return_attention_mask=False, return_token_type_ids=False, verbose=False,
+        )
+        for text, offsets in zip(batch, encoded["offset_mapping"]):
+            offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+            results.append(_chunk_tokens(text, offsets, max_tokens, overlap))
+    return results
+
+
+def truncation_stats(chunks, max_tokens=CHUNK_MAX_TOKENS):
+    """
+    How much of `chunks` the embedding model would cut off: returns
+    (total tokens, truncated tokens, truncated chunks).
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return 0, 0, 0
+    model = get_embedder()
+    limit = max_tokens or model.max_seq_length
+    lengths = np.array([len(ids) for ids in model.tokenizer(chunks, verbose=False)["input_ids"]],
+                       dtype=np.int64)
+    over = np.maximum(lengths - limit, 0)
+    return int(lengths.sum()), int(over.sum()), int((over > 0).sum())
@@ -7,13 +7,142 @@ HEADERS = {
     "Accept": "application/json"
 }
 
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../data"))
+# QUERYCASE_DATA_DIR points everything at another data directory (e.g. a benchmark corpus)
+BASE_DIR = os.path.abspath(os.environ.get("QUERYCASE_DATA_DIR") or os.path.join(os.path.dirname(__file__), "../data"))
 PDF_DIR = os.path.join(BASE_DIR, "pdfs")
 JSON_DIR = os.path.join(BASE_DIR, "json")
-INDEX_PATH = os.path.join(BASE_DIR, "faiss_index.index")
-META_PATH = os.path.join(BASE_DIR, "metadata.json")
-LAST_FETCH_PATH = os.path.join(BASE_DIR, "checkpoint.json")  # <-- JSON, not TXT!
+INDEX_PATH = os.path.join(BASE_DIR, "faiss_index.index")  # legacy single-file index, adopted as a segment
+SEGMENTS_DIR = os.path.join(BASE_DIR, "segments")      # immutable index segments + manifest.json
+BM25_DIR = os.path.join(BASE_DIR, "bm25")              # keyword index segments (memory-mapped postings)
+META_PATH = os.path.join(BASE_DIR, "metadata.json")  # legacy, migrated into META_DIR
+META_DIR = os.path.join(BASE_DIR, "metadata")
+VECTORS_PATH = os.path.join(BASE_DIR, "vectors.f32")  # raw embeddings, used to rebuild the index
+CHUNK_HASHES_PATH = os.path.join(BASE_DIR, "chunk_hashes.i8")  # content hash per index row (dedup)
+LAST_FETCH_PATH = os.path.join(BASE_DIR, "checkpoint.json")  # legacy, migrated into LEDGER_PATH
+LEDGER_PATH = os.path.join(BASE_DIR, "ledger.sqlite3")  # per-case fetched/indexed state (SQLite, WAL)
+DEFAULT_FETCH_START = "2015-01-01"   # first filing date fetched on a fresh install
+FETCH_MAX_ATTEMPTS = 5      # failed downloads are retried on later runs, then recorded as skipped
 
 # Create folders if they don't exist
 os.makedirs(PDF_DIR, exist_ok=True)
 os.makedirs(JSON_DIR, exist_ok=True)
+
+# Models (loaded lazily on first use, see models.py)
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBED_BACKEND = "torch"      # "torch", "onnx" or "onnx-int8" (needs sentence-transformers>=3.2 + onnxruntime)
+EMBED_ONNX_FILE = "onnx/model_quint8_avx2.onnx"   # quantized export used by "onnx-int8"
+SUMMARY_MODEL_NAME = "facebook/bart-large-cnn"
+SUMMARY_BACKEND = "torch"    # "torch", "int8" (dynamic quantization) or "onnx" (needs optimum[onnxruntime])
+
+# Embedding
+EMBEDDING_DIM = 384      # all-MiniLM-L6-v2
+EMBED_BATCH_SIZE = 128   # chunks per model.encode() forward pass
+EMBED_PROCESSES = 0      # >1 starts a multi-process CPU encode pool (0/1 = in-process)
+
+# Chunking (see chunking.py)
+CHUNK_STRATEGY = "tokens"    # "tokens" (tokenizer windows on paragraph/sentence boundaries) or "words" (legacy 200 words)
+CHUNK_MAX_TOKENS = None      # tokens per chunk incl. special tokens; None = the model's max_seq_length (256)
+CHUNK_OVERLAP_TOKENS = 32    # tokens repeated at the start of the next chunk
+CHUNK_TOKENIZE_BATCH = 32    # opinions per fast-tokenizer call
+DEDUP_MODE = "reuse"         # duplicate chunk text: "reuse" its stored vector, "skip" it (smaller index) or "off"
+
+# Search
+SEARCH_MMAP = False      # memory-map the FAISS index (faiss.IO_FLAG_MMAP) instead of reading it into RAM
+
+# Index type: "flat" (exact), "ivf_flat", "ivf_pq", "hnsw" or "sq8".
+# Types that need training are built by `querycase-reindex`.
+INDEX_TYPE = "flat"
+IVF_NLIST = 4096         # upper bound; scaled down to ~4*sqrt(N) for small corpora
+PQ_M = 48                # PQ sub-quantizers (384 / 48 = 8 dims each, 48 bytes per vector)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+DEFAULT_NPROBE = 16      # IVF lists probed per query
+DEFAULT_EF_SEARCH = 64   # HNSW candidate list size per query
+SEARCH_BATCH_SIZE = 64   # queries per model.encode() call in search_many
+QUERY_EMBED_CACHE_ENTRIES = 1024   # normalized query -> embedding (LRU)
+RESULT_CACHE_ENTRIES = 256         # (query, top_k, knobs, index generation) -> results (LRU)
+MAX_SEGMENTS = 16        # compact in the background once an ingest leaves more segments than this
+
+# Keyword / hybrid ranking
+SEARCH_MODE = "vector"   # "vector" (embeddings), "keyword" (BM25) or "hybrid" (reciprocal rank fusion)
+BM25_K1 = 1.2
+BM25_B = 0.75
+HYBRID_CANDIDATES = 4    # each ranker contributes top_k * this candidates to the fusion
+FILTER_EXACT_ROWS = 50000   # filters matching at most this many rows are scored exactly from vectors.f32
+FILTER_MASK_CACHE_ENTRIES = 32
+CASE_OVERFETCH = 8       # case-level search ranks top_k * this chunks before grouping by case
+SNIPPETS_PER_CASE = 3    # best-matching chunks returned per case
+RRF_K = 60               # reciprocal rank fusion constant: score = sum 1 / (RRF_K + rank)
+
+# Fetching
+COURTLISTENER_API_URL = os.environ.get(
+    "QUERYCASE_API_URL", "https://www.courtlistener.com/api/rest/v4/opinions/")  # override for a local stand-in
+FETCH_WORKERS = 8            # concurrent PDF downloads (pooled HTTP session)
+FETCH_MAX_INFLIGHT = 32      # cases downloading/extracting at once
+FETCH_RATE_PER_HOST = 2.0    # max requests per second to any single host
+EXTRACT_PROCESSES = os.cpu_count() or 1  # PyMuPDF text extraction workers (0 = in-thread)
+PDF_ARCHIVE = False          # keep downloaded PDFs in PDF_DIR (extraction never needs them on disk)
+
+# Bulk PDF/HTML -> JSON conversion of an archive (querycase-convert / pdftjson.py)
+CONVERT_MANIFEST_PATH = os.path.join(BASE_DIR, "convert_manifest.jsonl")  # one line per converted file
+CONVERT_PROCESSES = os.cpu_count() or 1
+CONVERT_CHUNKSIZE = 16       # files handed to a worker at a time
+CONVERT_SNIFF_BYTES = 1024   # leading bytes checked for the PDF / HTML signature
+CONVERT_ERROR_SCAN_CHARS = 4096  # error pages are recognised from this much leading text
+
+# Summaries
+SUMMARY_CACHE_DIR = os.path.join(BASE_DIR, "summary_cache")
+SUMMARY_CACHE_MAX_BYTES = 64 * 2**20   # on-disk summary cache budget (LRU eviction)
+SUMMARY_CACHE_ENTRIES = 256            # in-process LRU entries
+SUMMARIES_DIR = os.path.join(BASE_DIR, "summaries")   # per-case summaries made at ingest
+INGEST_SUMMARIES = False     # summarize every case once during ingest (slow on CPU)
+SUMMARY_WORKERS = 1          # background summarization threads during ingest
+SUMMARY_BATCH_SIZE = 4       # cases per padded BART generate() call
+SUMMARY_INPUT_CHARS = 6000   # opinion prefix fed to BART (then truncated to 1024 tokens)
+
+# Query summaries (summarize_texts): "truncate" feeds the first 3000 characters of the top
+# cases to one generate() call; "map_reduce" summarizes token-bounded segments of the whole
+# opinions in batches, then reduces those into one summary (see summarizer.summarize_hierarchical)
+SUMMARY_MODE = "truncate"
+SUMMARY_CASE_CHARS = 120000      # characters of each case read for "map_reduce" (~30k tokens)
+SUMMARY_SEGMENT_TOKENS = 900     # BART input tokens per segment (limit 1024 incl. special tokens)
+SUMMARY_MAX_SEGMENTS = 32        # most query-relevant segments summarized per request
+SUMMARY_MAP_WORKERS = 1          # threads running segment batches concurrently
+SUMMARY_MAP_LENGTH = (30, 120)   # (min, max) generated tokens per segment summary
+SUMMARY_REDUCE_LENGTH = (80, 300)  # (min, max) generated tokens of the final summary
+SUMMARY_NUM_BEAMS = 2            # beams for segment summaries (the model default is 4); final uses the default
+SUMMARY_TIME_BUDGET = 60.0       # seconds per map-reduce summary; None = no limit
+
+# Case texts, kept compressed after the JSON files are cleaned up
+CASE_TEXT_DIR = os.path.join(BASE_DIR, "texts")
+CASE_TEXT_CODEC = "zstd"      # "zstd" (needs `pip install zstandard`, else falls back) or "zlib"
+CASE_TEXT_LEVEL = 3           # compression level
+CASE_TEXT_FRAME_CHARS = 4096  # texts are compressed in frames so a prefix only decompresses what it needs
+
+# HTTP search service (querycase-serve)
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8765
+SERVE_BATCH_WINDOW_MS = 5    # wait this long for concurrent requests to join a batch
+SERVE_MAX_BATCH = 64         # queries per batched search
+
+# Instrumentation (metrics.py): timing spans, counters and histograms in Prometheus format
+METRICS_ENABLED = True       # False turns span() timing into a no-op
+METRICS_FILE = None          # e.g. os.path.join(BASE_DIR, "metrics.prom"); rewritten periodically and at exit
+METRICS_PORT = None          # serve GET /metrics on this port (the search service also exposes /metrics)
+METRICS_WRITE_INTERVAL = 15.0
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Sharded search (querycase-shards / shards.py): the index, BM25 postings and metadata are
+# partitioned into SHARDS shards under SHARDS_DIR, each searched by its own worker process;
+# search_cases() then fans out to the workers and merges their top-k. 0 = one local index.
+SHARDS = 0
+SHARD_BY = "case_hash"       # "case_hash" (even spread) or "date" (date_filed ranges, see SHARD_DATE_BOUNDS)
+SHARD_DATE_BOUNDS = ()       # ISO dates splitting shards for SHARD_BY = "date"; SHARDS = len + 1
+SHARDS_DIR = os.path.join(BASE_DIR, "shards")
+SHARD_HOST = "127.0.0.1"
+SHARD_BASE_PORT = 8780       # shard i's worker listens on SHARD_BASE_PORT + i
+SHARD_URLS = None            # explicit worker URLs (e.g. on other hosts) instead of SHARD_HOST ports
+SHARD_TIMEOUT = 10.0         # seconds to wait for a shard's answer
+SHARD_PARTIAL_RESULTS = True  # answer from the shards that responded when one is down (else raise)
+SHARD_TERM_CACHE_ENTRIES = 65536  # term -> document frequency over all shards, until a shard changes
+SHARD_HEALTH_INTERVAL = 1.0  # seconds between worker /health checks (sooner once a search sees a shard change)
@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import time
+import argparse
+from multiprocessing import Pool
+from tqdm import tqdm
+from .config import (
+    PDF_DIR, JSON_DIR, CONVERT_MANIFEST_PATH, CONVERT_PROCESSES, CONVERT_CHUNKSIZE,
+    CONVERT_SNIFF_BYTES, CONVERT_ERROR_SCAN_CHARS,
+)
+
+# Bodies of failed downloads (block pages, gateway errors) saved as .pdf
+ERROR_SIGNATURES = [
+    "403 Forbidden",
+    "404 Not Found",
+    "Access Denied",
+    "Microsoft-Azure-Application-Gateway",
+    "Cloudflare",
+    "Nginx",
+    "Bad Gateway",
+    "Site can’t be reached",
+]
+ERROR_RE = re.compile("|".join(re.escape(sig) for sig in ERROR_SIGNATURES), re.IGNORECASE)
+HTML_RE = re.compile(rb"<(?:!doctype\s+html|html|head|body|title)\b", re.IGNORECASE)
+
+# Manifest statuses; converted and skipped files aren't looked at again
+CONVERTED, SKIPPED, FAILED = "converted", "skipped", "failed"
+
+
+def sniff_type(head):
+    """
+    "pdf", "html" or None from a file's leading bytes (replaces libmagic).
+    """
+    if b"%PDF-" in head:
+        return "pdf"
+    if HTML_RE.search(head):
+        return "html"
+    return None
+
+
+def is_error_text(text, scan_chars=CONVERT_ERROR_SCAN_CHARS):
+    # One precompiled, case-insensitive pattern over the start of the text
+    return ERROR_RE.search(text, 0, scan_chars) is not None
+
+
+def extract_text_from_pdf(data):
+    import fitz  # PyMuPDF
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return "".join(page.get_text() for page in doc).strip()
+
+
+def extract_text_from_html(data):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(data, "html.parser").get_text(separator="\n", strip=True)
+
+
+def convert_file(task):
+    """
+    Runs in a worker: read one file, extract its text and write
+    `<json_dir>/<case_id>.json`. Returns a manifest entry.
+    """
+    path, size, mtime, json_dir, min_text_length = task
+    file = os.path.basename(path)
+    entry = {"file": file, "size": size, "mtime": mtime, "status": SKIPPED}
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        source_type = sniff_type(data[:CONVERT_SNIFF_BYTES])
+        if source_type is None:
+            entry["reason"] = "unrecognized type"
+            return entry
+        try:
+            text = extract_text_from_pdf(data) if source_type == "pdf" else extract_text_from_html(data)
+        except ImportError:
+            raise
+        except Exception as e:
+            # Corrupt files stay skipped; failures (I/O, missing packages) are retried
+            entry["reason"] = f"extraction failed: {e}"
+            return entry
+        if len(text) < min_text_length or is_error_text(text):
+            entry["reason"] = "likely error page or too short"
+            return entry
+
+        case_id = os.path.splitext(file)[0]
+        json_path = os.path.join(json_dir, f"{case_id}.json")
+        tmp_path = json_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"id": case_id, "filename": file, "source_type": source_type, "text": text},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, json_path)
+        entry.update(status=CONVERTED, source_type=source_type, chars=len(text))
+    except Exception as e:
+        entry.update(status=FAILED, reason=f"{type(e).__name__}: {e}")
+    return entry
+
+
+def load_manifest(path):
+    """
+    file -> last manifest entry. A torn last line from a crash is ignored.
+    """
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            done[entry["file"]] = entry
+    return done
+
+
+def pending_files(pdf_dir, manifest, retry_skipped=False):
+    """
+    (path, size, mtime) of files not converted yet, or changed since.
+    Failed files are always retried, skipped ones with `retry_skipped`.
+    """
+    finished = (CONVERTED,) if retry_skipped else (CONVERTED, SKIPPED)
+    files = []
+    with os.scandir(pdf_dir) as entries:
+        for entry in entries:
+            if not entry.name.lower().endswith(".pdf") or not entry.is_file():
+                continue
+            st = entry.stat()
+            known = manifest.get(entry.name)
+            if (known and known["status"] in finished
+                    and known["size"] == st.st_size and known["mtime"] == st.st_mtime_ns):
+                continue
+            files.append((entry.path, st.st_size, st.st_mtime_ns))
+    return files
+
+
+def convert(pdf_dir=PDF_DIR, json_dir=JSON_DIR, manifest_path=CONVERT_MANIFEST_PATH,
+            processes=CONVERT_PROCESSES, chunksize=CONVERT_CHUNKSIZE, min_text_length=50,
+            retry_skipped=False, limit=None):
+    """
+    Convert every new or changed PDF/HTML file in `pdf_dir` to JSON across a
+    process pool. Results are appended to the manifest as they arrive, so an
+    interrupted run resumes where it stopped. Returns per-status counts.
+    """
+    os.makedirs(json_dir, exist_ok=True)
+    files = pending_files(pdf_dir, load_manifest(manifest_path), retry_skipped)
+    if limit:
+        files = files[:limit]
+    print(f"📄 {len(files)} files to convert in {pdf_dir} ({processes} processes, chunksize {chunksize})")
+
+    tasks = [(path, size, mtime, json_dir, min_text_length) for path, size, mtime in files]
+    counts = {CONVERTED: 0, SKIPPED: 0, FAILED: 0}
+    total_bytes = 0
+    start = time.perf_counter()
+    with open(manifest_path, "a", encoding="utf-8") as manifest, \
+            tqdm(total=len(tasks), desc="Converting files", unit="files") as pbar:
+        if processes > 1:
+            pool = Pool(processes)
+            results = pool.imap_unordered(convert_file, tasks, chunksize=chunksize)
+        else:
+            pool = None
+            results = map(convert_file, tasks)
+        try:
+            for entry in results:
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                counts[entry["status"]] += 1
+                total_bytes += entry["size"]
+                if entry["status"] == FAILED:
+                    tqdm.write(f"❌ {entry['file']}: {entry['reason']}")
+                pbar.update(1)
+                if pbar.n % 1000 == 0:
+                    manifest.flush()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    elapsed = time.perf_counter() - start
+    done = sum(counts.values())
+    print(f"✅ {counts[CONVERTED]} converted, {counts[SKIPPED]} skipped, {counts[FAILED]} failed "
+          f"in {elapsed:.1f}s")
+    if elapsed > 0 and done:
+        print(f"📊 {done / elapsed:.1f} files/sec, {total_bytes / 2**20 / elapsed:.1f} MB/sec")
+    return counts
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Convert an archive of downloaded PDFs (and HTML error/opinion "
+                                                 "pages saved as .pdf) to JSON text files.")
+    parser.add_argument("--pdf-dir", default=PDF_DIR)
+    parser.add_argument("--json-dir", default=JSON_DIR)
+    parser.add_argument("--manifest", default=CONVERT_MANIFEST_PATH, help="JSONL record of processed files")
+    parser.add_argument("--processes", type=int, default=CONVERT_PROCESSES)
+    parser.add_argument("--chunksize", type=int, default=CONVERT_CHUNKSIZE, help="Files per worker task")
+    parser.add_argument("--min-chars", type=int, default=50, help="Shorter texts are skipped")
+    parser.add_argument("--retry-skipped", action="store_true", help="Look at previously skipped files again")
+    parser.add_argument("--limit", type=int, default=None, help="Convert at most this many files")
+    args = parser.parse_args()
+    convert(args.pdf_dir, args.json_dir, args.manifest, args.processes, args.chunksize,
+            args.min_chars, args.retry_skipped, args.limit)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,187 @@
+import os
+import threading
+from hashlib import blake2b
+import numpy as np
+from .config import CHUNK_HASHES_PATH, DEDUP_MODE, VECTORS_PATH
+from .ann import load_vectors
+
+DEDUP_MODES = ("reuse", "skip", "off")
+HASH_DTYPE = np.dtype("<i8")
+
+
+def normalize_chunk(text):
+    return " ".join(text.lower().split())
+
+
+def chunk_hash(text):
+    """
+    64-bit content hash of a chunk, ignoring case and whitespace.
+    """
+    digest = blake2b(normalize_chunk(text).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class ChunkHashIndex:
+    """
+    Content hash of every index row, in a row-aligned append-only file
+    (`chunk_hashes.i8`, like vectors.f32). Lookups go to sorted arrays
+    built from the file plus a dict of hashes appended since; the arrays
+    are rebuilt once the dict grows past an eighth of them.
+
+    Hashes of chunks planned for encoding by a batch that isn't appended
+    yet are tracked as pending, so a streaming ingest with several batches
+    in flight doesn't encode or index the same chunk twice.
+    """
+
+    def __init__(self, path=CHUNK_HASHES_PATH):
+        self.path = path
+        if not os.path.exists(path):
+            open(path, "ab").close()
+        self._lock = threading.Lock()
+        self._pending = set()  # hashes an in-flight batch will append
+        self._rebuild()
+
+    def __len__(self):
+        return os.path.getsize(self.path) // HASH_DTYPE.itemsize
+
+    def _rebuild(self):
+        n = len(self)
+        hashes = np.fromfile(self.path, dtype=HASH_DTYPE, count=n)
+        # return_index gives the first row holding each hash
+        self._hashes, self._rows = np.unique(hashes, return_index=True)
+        self._recent = {}
+
+    def sync(self, metadata, n):
+        """
+        Line the file up with `n` index rows: drop rows the index never got,
+        and hash rows indexed before hashes were stored from their metadata.
+        """
+        stored = len(self)
+        if stored > n:
+            with open(self.path, "r+b") as f:
+                f.truncate(n * HASH_DTYPE.itemsize)
+        elif stored < n:
+            print(f"ℹ️ Hashing {n - stored} existing chunks for deduplication...")
+            step = 65536
+            for start in range(stored, n, step):
+                end = min(start + step, n)
+                self._write([chunk_hash(metadata.chunk_text(row)) for row in range(start, end)])
+        self._rebuild()
+
+    def lookup(self, hashes, pending=False):
+        """
+        Row of the first chunk with each hash, or -1 if it isn't indexed.
+        With pending=True, hashes reserved by an in-flight batch give -2.
+        """
+        hashes = np.asarray(hashes, dtype=HASH_DTYPE)
+        rows = np.full(len(hashes), -1, dtype=np.int64)
+        with self._lock:
+            if len(self._hashes):
+                pos = np.minimum(np.searchsorted(self._hashes, hashes), len(self._hashes) - 1)
+                found = self._hashes[pos] == hashes
+                rows[found] = self._rows[pos[found]]
+            for i in np.flatnonzero(rows < 0).tolist():
+                h = int(hashes[i])
+                rows[i] = self._recent.get(h, -2 if pending and h in self._pending else -1)
+        return rows
+
+    def reserve(self, hashes):
+        """
+        Mark hashes a batch will append as pending until append() writes them.
+        """
+        with self._lock:
+            self._pending.update(np.asarray(hashes, dtype=HASH_DTYPE).tolist())
+
+    def _write(self, hashes):
+        with open(self.path, "ab") as f:
+            # Drop a partial trailing value left by a crash
+            f.truncate(len(self) * HASH_DTYPE.itemsize)
+            f.write(np.asarray(hashes, dtype=HASH_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, hashes):
+        with self._lock:
+            start = len(self)
+            self._write(hashes)
+            for row, h in enumerate(np.asarray(hashes, dtype=HASH_DTYPE).tolist(), start=start):
+                self._recent.setdefault(h, row)
+                self._pending.discard(h)
+            if len(self._recent) > max(65536, len(self._hashes) // 8):
+                self._rebuild()
+
+
+class BatchDedup:
+    """
+    Which chunks of an ingest batch actually need encoding. A chunk whose
+    normalized text is already indexed, appears earlier in the batch or is
+    being encoded by an earlier in-flight batch reuses that vector in
+    "reuse" mode or is dropped in "skip" mode; a chunk repeated within the
+    same case is always dropped. "off" encodes everything.
+    """
+
+    def __init__(self, chunks, metadata, index, mode=DEDUP_MODE, vectors_path=VECTORS_PATH):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode {mode!r} (expected one of {DEDUP_MODES})")
+        hashes = [chunk_hash(chunk) for chunk in chunks]
+        indexed = index.lookup(hashes, pending=True).tolist()
+
+        self.index = index
+        self.vectors_path = vectors_path
+        self.total = len(chunks)
+        self.reused = self.skipped = 0
+        self.chunks, self.metadata, self.hashes = [], [], []
+        # Per kept chunk: position in self.chunks (encoded), or -(row + 1) for a stored vector
+        self._sources = []
+        # (kept chunk, hash) of reused chunks whose row an earlier batch hasn't appended yet
+        self._pending = []
+        first = {}
+        seen = set()
+        for chunk, entry, h, row in zip(chunks, metadata, hashes, indexed):
+            if mode != "off":
+                if (entry["case_id"], h) in seen:
+                    self.skipped += 1
+                    continue
+                seen.add((entry["case_id"], h))
+            if mode != "off" and (row != -1 or h in first):
+                if mode == "skip":
+                    self.skipped += 1
+                    continue
+                self.reused += 1
+                if row == -2:
+                    self._pending.append((len(self._sources), h))
+                self._sources.append(-(row + 1) if row >= 0 else first.get(h, -1))
+            else:
+                first.setdefault(h, len(self.chunks))
+                self._sources.append(len(self.chunks))
+                self.chunks.append(chunk)
+            self.metadata.append(entry)
+            self.hashes.append(h)
+        if mode != "off":
+            index.reserve(list(first))
+
+    def embeddings(self, encoded, vectors=None):
+        """
+        Vectors for every kept chunk, from `encoded` (the vectors of
+        self.chunks) and the stored vectors of reused rows. Chunks shared
+        with an earlier in-flight batch need that batch appended first.
+        """
+        encoded = np.asarray(encoded, dtype=np.float32)
+        sources = np.asarray(self._sources, dtype=np.int64)
+        if self._pending:
+            positions, hashes = zip(*self._pending)
+            rows = self.index.lookup(hashes)
+            if (rows < 0).any():
+                raise RuntimeError("Chunks shared with an earlier batch that hasn't been appended yet")
+            sources[list(positions)] = -(rows + 1)
+        out = np.empty((len(sources), encoded.shape[1]), dtype=np.float32)
+        new = sources >= 0
+        out[new] = encoded[sources[new]]
+        if not new.all():
+            stored = load_vectors(self.vectors_path) if vectors is None else vectors
+            out[~new] = stored[-sources[~new] - 1]
+        return out
+
+    def summary(self):
+        return (f"{self.total} chunks: {len(self.chunks)} to encode, "
+                f"{self.reused} duplicates reused, {self.skipped} skipped")
@@ -1,48 +1,101 @@
 import os
-import json
+import atexit
 import numpy as np
-import faiss
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
-from .config import JSON_DIR, INDEX_PATH, META_PATH, PDF_DIR
+from .config import (
+    JSON_DIR, SEGMENTS_DIR, BM25_DIR, PDF_DIR, PDF_ARCHIVE, EMBED_BATCH_SIZE, EMBED_PROCESSES, CHUNK_TOKENIZE_BATCH,
+    META_DIR, META_PATH, INDEX_PATH, VECTORS_PATH, CHUNK_HASHES_PATH, SHARDS,
+)
+from .metastore import open_store
+from .ann import sync_vectors, append_vectors
+from .segments import SegmentedIndex, Compactor
+from .models import get_embedder
+from .bm25 import BM25Index, rebuild_from_metadata
+from .casestore import CaseTextStore
+from .ledger import get_ledger
+from .metrics import span, timed, counter
+from .dedup import ChunkHashIndex, BatchDedup, chunk_hash
+from .chunking import chunk_texts, chunk_words as chunk_text  # chunk_text: legacy word windows
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+_encode_pool = None
 
-def chunk_text(text, max_words=200):
-    words = text.split()
-    return [" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
+INGEST_CHUNKS = counter("querycase_ingest_chunks_total", "Chunks per ingest outcome", ("outcome",))
 
-def embed_and_update_index(new_cases):
-    # Load or initialize
-    if os.path.exists(INDEX_PATH):
-        index = faiss.read_index(INDEX_PATH)
-        with open(META_PATH, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
-    else:
-        index = faiss.IndexFlatL2(384)  # 384 for MiniLM
-        metadata = []
+def get_encode_pool(processes=EMBED_PROCESSES):
+    """
+    Start the multi-process CPU encode pool once and keep it for later batches.
+    Returns None when multi-process encoding is disabled.
+    """
+    global _encode_pool
+    if not processes or processes <= 1:
+        return None
+    if _encode_pool is None:
+        _encode_pool = get_embedder().start_multi_process_pool(target_devices=["cpu"] * processes)
+        atexit.register(close_encode_pool)
+    return _encode_pool
+
+def close_encode_pool():
+    global _encode_pool
+    if _encode_pool is not None:
+        get_embedder().stop_multi_process_pool(_encode_pool)
+        _encode_pool = None
+
+def encode_chunks(chunks, batch_size=EMBED_BATCH_SIZE, processes=EMBED_PROCESSES):
+    """
+    Encode a list of chunk strings in large batches.
+    Returns a float32 array of shape (len(chunks), dim).
+    """
+    model = get_embedder()
+    if not chunks:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
 
-    all_embeddings = []
+    pool = get_encode_pool(processes)
+    with span("ingest.encode"):
+        if pool is not None:
+            vectors = model.encode_multi_process(chunks, pool, batch_size=batch_size)
+        else:
+            vectors = model.encode(
+                chunks,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=len(chunks) > batch_size,
+            )
+    return np.asarray(vectors, dtype=np.float32)
+
+@timed("ingest.chunk")
+def chunk_cases(new_cases, show_progress=True):
+    """
+    Split a batch of cases into chunks. Returns (chunks, metadata entries),
+    one entry per chunk, so the whole batch can be encoded together.
+    """
+    all_chunks = []
     new_metadata = []
+    cases = [case for case in new_cases if len(case.get("opinion_text", "").strip()) >= 100]
+
+    progress = tqdm(total=len(cases), desc="Chunking cases", disable=not show_progress)
+    for i in range(0, len(cases), CHUNK_TOKENIZE_BATCH):
+        batch = cases[i:i + CHUNK_TOKENIZE_BATCH]
+        for case, chunks in zip(batch, chunk_texts([case["opinion_text"] for case in batch])):
+            for chunk in chunks:
+                all_chunks.append(chunk)
+                new_metadata.append({
+                    "case_id": case["id"],
+                    "case_name": case.get("case_name") or "Unknown Case",
+                    "date_filed": case.get("date_filed") or "Unknown Date",
+                    "download_url": case.get("download_url"),
+                    "court": case.get("court"),
+                    "chunk_text": chunk
+                })
+        progress.update(len(batch))
+    progress.close()
+
+    return all_chunks, new_metadata
 
-    for case in tqdm(new_cases, desc="Embedding cases"):
-        text = case.get("opinion_text", "")
-        if len(text.strip()) < 100:
-            continue
-
-        chunks = chunk_text(text)
-        for chunk in chunks:
-            vec = model.encode(chunk)
-            all_embeddings.append(vec)
-            new_metadata.append({
-                "case_id": case["id"],
-                "case_name": case.get("case_name") or "Unknown Case",
-                "date_filed": case.get("date_filed") or "Unknown Date",
-                "download_url": case.get("download_url"),
-                "chunk_text": chunk
-            })
-
-        # 🧹 Clean up JSON and PDF for this case
+def cleanup_case_files(cases):
+    """
+    🧹 Remove the JSON (and any leftover PDF) of cases that are now indexed.
+    """
+    for case in cases:
         try:
             case_id = str(case["id"])
             json_path = os.path.join(JSON_DIR, f"{case_id}.json")
@@ -52,24 +105,130 @@ def embed_and_update_index(new_cases):
                 os.remove(json_path)
                 print(f"🗑️ Deleted {json_path}")
 
-            if os.path.exists(pdf_path):
+            # PDFs are only on disk when archiving (or left over from older runs)
+            if not PDF_ARCHIVE and os.path.exists(pdf_path):
                 os.remove(pdf_path)
                 print(f"🗑️ Deleted {pdf_path}")
-            else:
-                print(f"⚠️ PDF not found: {pdf_path}")
 
         except Exception as e:
             print(f"⚠️ Could not delete files for case {case.get('id', 'unknown')}: {e}")
 
-    if all_embeddings:
-        index.add(np.vstack(all_embeddings))
-        metadata.extend(new_metadata)
 
-        # ✅ Save model and metadata
-        faiss.write_index(index, INDEX_PATH)
-        with open(META_PATH, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=2)
+class IndexWriter:
+    """
+    Appends ingest batches as new immutable index segments. Only the segment
+    manifest is read — existing segments are never loaded or rewritten, and
+    compaction runs in the background once too many segments pile up.
+    The paths default to the single index; shards.py points them at a shard.
+    With wait_for_lock=True, a writer lock held elsewhere is waited for
+    instead of failing.
+    """
+
+    def __init__(self, segments_dir=SEGMENTS_DIR, bm25_dir=BM25_DIR, meta_dir=META_DIR,
+                 vectors_path=VECTORS_PATH, hashes_path=CHUNK_HASHES_PATH, wait_for_lock=False):
+        default = segments_dir == SEGMENTS_DIR
+        self.vectors_path = vectors_path
+        self.segments = SegmentedIndex(segments_dir, legacy_index_path=INDEX_PATH if default else None)
+        self.segments.lock_for_writing(wait=wait_for_lock)
+        self.segments.refresh(load=False)
+        self.segments.remove_orphans()
+        self.metadata = open_store(meta_dir, META_PATH if default else None)
+        sync_vectors(self.segments, vectors_path)
+
+        # Rows appended before a crash that kept the segment from being published
+        if len(self.metadata) > self.segments.ntotal:
+            print(f"⚠️ Dropping {len(self.metadata) - self.segments.ntotal} metadata rows not present in the index")
+            self.metadata.truncate(self.segments.ntotal)
+
+        # Keyword index rows line up with the same row ids; build/catch up from metadata
+        self.keywords = BM25Index(bm25_dir).open_for_writing()
+        self.keywords.truncate(self.segments.ntotal)
+        rebuild_from_metadata(self.keywords, self.metadata, self.segments.ntotal)
+
+        # Content hash per row, to skip re-encoding duplicate chunk text
+        self.hashes = ChunkHashIndex(hashes_path)
+        self.hashes.sync(self.metadata, self.segments.ntotal)
+
+        self.compactor = Compactor(self.segments, vectors_path=vectors_path)
 
-        print(f"✅ Embedded and indexed {len(all_embeddings)} chunks.")
+    @property
+    def ntotal(self):
+        return self.segments.ntotal
+
+    def dedup(self, chunks, new_metadata):
+        """
+        Plan which chunks of a batch need encoding (see dedup.BatchDedup).
+        """
+        with span("ingest.dedup"):
+            batch = BatchDedup(chunks, new_metadata, self.hashes, vectors_path=self.vectors_path)
+        INGEST_CHUNKS.inc(len(batch.chunks), outcome="encoded")
+        INGEST_CHUNKS.inc(batch.reused, outcome="reused")
+        INGEST_CHUNKS.inc(batch.skipped, outcome="skipped")
+        return batch
+
+    def append(self, embeddings, new_metadata, hashes=None):
+        if not len(embeddings):
+            return
+        if hashes is None:
+            hashes = [chunk_hash(entry["chunk_text"]) for entry in new_metadata]
+        # ✅ Vectors, metadata, keyword postings and hashes first, then publish the segment:
+        # rows past the manifest's row count are dropped on the next run, so nothing drifts apart
+        with span("index.vectors"):
+            append_vectors(embeddings, self.vectors_path)
+        with span("index.metadata"):
+            self.metadata.append(new_metadata)
+        with span("index.keywords"):
+            self.keywords.add([entry["chunk_text"] for entry in new_metadata])
+        self.hashes.append(hashes)
+        # FAISS add + write_index of the new segment + manifest publish
+        with span("index.segment"):
+            self.segments.add_segment(embeddings)
+        self.compactor.maybe_compact()
+
+    def close(self):
+        """
+        Wait for a running background compaction to finish, then release
+        the writer lock.
+        """
+        try:
+            self.compactor.wait()
+        finally:
+            self.segments.unlock()
+
+
+def open_writer():
+    """
+    An IndexWriter for the single index, or with SHARDS set, a
+    ShardedIndexWriter that routes each case's chunks to its shard.
+    """
+    if SHARDS:
+        from .shards import ShardedIndexWriter
+        return ShardedIndexWriter()
+    return IndexWriter()
+
+
+def embed_and_update_index(new_cases, writer=None):
+    all_chunks, new_metadata = chunk_cases(new_cases)
+
+    if all_chunks:
+        own_writer = writer is None
+        if own_writer:
+            writer = open_writer()
+        try:
+            batch = writer.dedup(all_chunks, new_metadata)
+            print(f"🧮 Encoding {len(batch.chunks)} chunks (batch_size={EMBED_BATCH_SIZE}), {batch.summary()}")
+            embeddings = batch.embeddings(encode_chunks(batch.chunks))
+            writer.append(embeddings, batch.metadata, batch.hashes)
+        finally:
+            # A failed batch must not leave the writer lock held
+            if own_writer:
+                writer.close()
+        print(f"✅ Embedded and indexed {len(embeddings)} chunks.")
     else:
         print("⚠️ No valid chunks to embed.")
+
+    # Keep the opinion texts for summaries, then record the batch as indexed
+    # (one ledger transaction) before the JSON files go
+    CaseTextStore().put_cases(new_cases)
+    get_ledger().mark_indexed(new_cases)
+    cleanup_case_files(new_cases)
@@ -1,51 +1,137 @@
 import os
 import json
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
 import fitz  # PyMuPDF
 from tqdm import tqdm
-from .config import HEADERS, PDF_DIR, JSON_DIR, LAST_FETCH_PATH
+from .config import (
+    HEADERS, PDF_DIR, JSON_DIR, COURTLISTENER_API_URL,
+    FETCH_WORKERS, FETCH_MAX_INFLIGHT, FETCH_RATE_PER_HOST, EXTRACT_PROCESSES, PDF_ARCHIVE,
+)
 from datetime import datetime
 import time
+from .ledger import get_ledger, load_unindexed
+from .metrics import span, counter
 
-BASE_URL = "https://www.courtlistener.com/api/rest/v4/opinions/"
-
-# Load checkpoint (date_filed + last_case_id)
-def get_checkpoint():
-    try:
-        with open(LAST_FETCH_PATH, "r") as f:
-            content = f.read()
-            print("📄 RAW checkpoint content from disk:")
-            print(repr(content))  # see all hidden characters
-            return json.loads(content)
-    except Exception as e:
-        print(f"❌ JSON read error: {e}")
-        return {"date_filed": "2015-01-01", "last_case_id": 0}
+FETCH_CASES = counter("querycase_fetch_cases_total", "Cases handled by the fetcher", ("status",))
+FETCH_BYTES = counter("querycase_fetch_bytes_total", "Bytes of opinion PDFs downloaded")
 
-
-# Save checkpoint after each successful case
-def update_checkpoint(date_filed, case_id):
-    with open(LAST_FETCH_PATH, "w") as f:
-        json.dump({"date_filed": date_filed, "last_case_id": case_id}, f)
+BASE_URL = COURTLISTENER_API_URL
 
 # Extract text from a single PDF
 def extract_text_from_pdf(pdf_path):
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return text.strip()
+        with fitz.open(pdf_path) as doc:
+            return "".join(page.get_text() for page in doc).strip()
     except Exception as e:
         print(f"❌ Failed to extract text from {pdf_path}: {e}")
         return ""
 
-# Fetch new cases in batches, resuming from last checkpoint
-def fetch_new_case_batches(batch_size=50, court_filter="ca"):
-    checkpoint = get_checkpoint()
-    min_date = checkpoint["date_filed"]
-    min_case_id = checkpoint["last_case_id"]
+# Extract text from a downloaded PDF without touching the disk
+def extract_text_from_pdf_bytes(data, label="PDF"):
+    try:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            return "".join(page.get_text() for page in doc).strip()
+    except Exception as e:
+        print(f"❌ Failed to extract text from {label}: {e}")
+        return ""
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to the same host by at least 1/rate seconds,
+    shared by all download threads (replaces the fixed per-case sleep).
+    """
+
+    def __init__(self, rate=FETCH_RATE_PER_HOST):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
 
-    print(f"📡 Connecting to CourtListener (since {min_date} / ID > {min_case_id})")
+def make_session(pool_size=FETCH_WORKERS):
+    """
+    One pooled HTTP session shared by the API pager and all download threads.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download_and_extract(session, limiter, extract_pool, case_id, url):
+    """
+    Runs on a download thread: fetch the PDF and hand the bytes straight to
+    the extraction process pool. The PDF only hits the disk with PDF_ARCHIVE.
+    Raises on a non-2xx response (rate limit, block page, server error), so
+    the case is retried later instead of skipped for having no text.
+    """
+    limiter.wait(url)
+    with span("fetch.download"):
+        response = session.get(url, timeout=30)
+        response.raise_for_status()
+        data = response.content
+    FETCH_BYTES.inc(len(data))
+
+    if PDF_ARCHIVE:
+        with open(os.path.join(PDF_DIR, f"{case_id}.pdf"), "wb") as f:
+            f.write(data)
+
+    label = f"case {case_id}"
+    # Includes waiting for a free extraction process
+    with span("fetch.extract"):
+        if extract_pool is not None:
+            return extract_pool.submit(extract_text_from_pdf_bytes, data, label).result()
+        return extract_text_from_pdf_bytes(data, label)
+
+
+def court_code(case):
+    """
+    CourtListener court id ("ca9", "cadc", ...) for an opinion result: the
+    court field when the API includes one, otherwise the court's own
+    uscourts.gov host in download_url (e.g. www.ca9.uscourts.gov).
+    """
+    court = case.get("court_id") or case.get("court")
+    if isinstance(court, str) and court:
+        return court.rstrip("/").rsplit("/", 1)[-1].lower()
+    host = urlsplit(case.get("download_url") or "").hostname or ""
+    if host.endswith(".uscourts.gov"):
+        labels = [label for label in host.split(".")[:-2] if label not in ("www", "media", "cdn")]
+        if labels:
+            return labels[-1]
+    return None
+
+
+# Fetch new cases in batches, resuming from the ingest ledger
+def fetch_new_case_batches(batch_size=50, court_filter="ca", rate_per_host=FETCH_RATE_PER_HOST):
+    ledger = get_ledger()
+
+    # Cases fetched before a crash but never indexed come first
+    recovered = load_unindexed(ledger)
+    if recovered:
+        print(f"♻️ Resuming {len(recovered)} fetched but unindexed cases")
+    for i in range(0, len(recovered), batch_size):
+        yield recovered[i:i + batch_size]
+
+    min_date = ledger.resume_date()
+    print(f"📡 Connecting to CourtListener (since {min_date})")
 
     params = {
         "date_filed_min": min_date,
@@ -58,88 +144,130 @@ def fetch_new_case_batches(batch_size=50, court_filter="ca"):
     total_fetched = 0
     batch = []
 
-    with tqdm(desc="Fetching cases") as pbar:
-        while next_url:
-            try:
-                res = requests.get(next_url, headers=HEADERS, params=params if next_url == BASE_URL else None, timeout=30)
-                if res.status_code != 200:
-                    print(f"❌ API error {res.status_code}: {res.text}")
-                    break
-
-                data = res.json()
-                for case in data["results"]:
-                    case_id = case["id"]
-                    case_date = case.get("date_filed")
-                    url = case.get("download_url")
-
-                    if not url or not case_date:
-                        continue
-
-                    # Skip already processed cases
-                    if case_date < min_date:
-                        continue
-                    if case_date == min_date and case_id <= min_case_id:
-                        continue
+    session = make_session()
+    limiter = HostRateLimiter(rate_per_host)
+    download_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+    # Workers start on the first submit, from a download thread; a fork of this threaded process
+    # can deadlock on an inherited lock, so they come from a forkserver (spawn where there is none)
+    extract_pool = None
+    if EXTRACT_PROCESSES:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_PROCESSES, mp_context=context)
 
-                    pdf_path = os.path.join(PDF_DIR, f"{case_id}.pdf")
-                    json_path = os.path.join(JSON_DIR, f"{case_id}.json")
+    # Cases in API order with their download+extract future, consumed from the left
+    pending = deque()
+    skipped = []
+    failed = []
 
-                    if os.path.exists(json_path):
-                        continue
+    def commit(cases):
+        # One ledger transaction per batch, after its JSON files are written
+        ledger.mark_fetched(cases)
+        ledger.mark_skipped(skipped)
+        # Failed downloads are fetched again on a later run
+        ledger.mark_retry(failed)
+        skipped.clear()
+        failed.clear()
+        return cases
 
-                    try:
-                        response = requests.get(url, timeout=30)
-                        with open(pdf_path, "wb") as f:
-                            f.write(response.content)
+    def finish_oldest():
+        nonlocal total_fetched
+        case_id, case_date, case, future = pending.popleft()
+        try:
+            text = future.result()
+        except Exception as e:
+            print(f"❌ Error processing case {case_id}, will retry: {e}")
+            failed.append({"id": case_id, "date_filed": case_date})
+            FETCH_CASES.inc(status="failed")
+            return None
 
-                        text = extract_text_from_pdf(pdf_path)
+        if len(text) < 200:
+            print(f"⚠️ Skipping case {case_id}: text too short")
+            skipped.append({"id": case_id, "date_filed": case_date})
+            FETCH_CASES.inc(status="skipped")
+            return None
 
-                        # Always delete the PDF (regardless of outcome)
-                        if os.path.exists(pdf_path):
-                            try:
-                                os.remove(pdf_path)
-                                print(f"🗑️ Deleted PDF for case {case_id}")
-                            except Exception as e:
-                                print(f"⚠️ Could not delete PDF for case {case_id}: {e}")
+        case_data = {
+            "id": case_id,
+            "case_name": case.get("case_name"),
+            "date_filed": case_date,
+            "download_url": case.get("download_url"),
+            "court": court_code(case),
+            "opinion_text": text
+        }
 
-                        if len(text) < 200:
-                            print(f"⚠️ Skipping case {case_id}: text too short")
-                            continue
+        json_path = os.path.join(JSON_DIR, f"{case_id}.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(case_data, f, indent=2)
 
-                        case_data = {
-                            "id": case_id,
-                            "case_name": case.get("case_name"),
-                            "date_filed": case_date,
-                            "download_url": url,
-                            "opinion_text": text
-                        }
+        total_fetched += 1
+        FETCH_CASES.inc(status="fetched")
+        pbar.update(1)
+        return case_data
 
-                        with open(json_path, "w", encoding="utf-8") as f:
-                            json.dump(case_data, f, indent=2)
+    try:
+        with tqdm(desc="Fetching cases") as pbar:
+            while next_url:
+                try:
+                    limiter.wait(next_url)
+                    with span("fetch.api_page"):
+                        res = session.get(next_url, headers=HEADERS, params=params if next_url == BASE_URL else None, timeout=30)
+                    if res.status_code != 200:
+                        print(f"❌ API error {res.status_code}: {res.text}")
+                        break
+                    data = res.json()
+                except Exception as e:
+                    print(f"❌ Network error: {e}")
+                    time.sleep(10)  # wait and retry
+                    continue
 
-                        batch.append(case_data)
-                        total_fetched += 1
-                        pbar.update(1)
+                # Already fetched, indexed or skipped (one indexed lookup per page)
+                known = ledger.seen(case["id"] for case in data["results"])
+                for case in data["results"]:
+                    case_id = case["id"]
+                    case_date = case.get("date_filed")
+                    url = case.get("download_url")
 
-                        # ✅ Update checkpoint
-                        update_checkpoint(case_date, case_id)
+                    if not url or not case_date:
+                        continue
 
-                        if len(batch) >= batch_size:
-                            yield batch
-                            batch = []
+                    # Skip already processed cases
+                    if case_date < min_date or case_id in known:
+                        continue
 
-                        time.sleep(0.5)  # polite delay
+                    future = download_pool.submit(download_and_extract, session, limiter, extract_pool, case_id, url)
+                    pending.append((case_id, case_date, case, future))
 
-                    except Exception as e:
-                        print(f"❌ Error processing case {case_id}: {e}")
-                        continue
+                    # Bounded window: block on the oldest case once it's full
+                    while len(pending) >= FETCH_MAX_INFLIGHT:
+                        case_data = finish_oldest()
+                        if case_data:
+                            batch.append(case_data)
+                            if len(batch) >= batch_size:
+                                yield commit(batch)
+                                batch = []
 
                 next_url = data.get("next")
-            except Exception as e:
-                print(f"❌ Network error: {e}")
-                time.sleep(10)  # wait and retry
+
+            while pending:
+                case_data = finish_oldest()
+                if case_data:
+                    batch.append(case_data)
+                    if len(batch) >= batch_size:
+                        yield commit(batch)
+                        batch = []
+    finally:
+        # Consumer may stop early (max_batches): drop queued work
+        for _, _, _, future in pending:
+            future.cancel()
+        download_pool.shutdown(wait=True)
+        if extract_pool is not None:
+            extract_pool.shutdown(wait=True)
+        session.close()
 
     if batch:
-        yield batch
+        yield commit(batch)
+    elif skipped or failed:
+        commit([])
 
     print(f"✅ Done. Total valid cases fetched: {total_fetched}")
@@ -1,44 +1,550 @@
-import faiss
-from querycase.summarizer import summarize_texts
-from .config import JSON_DIR
-import json
 import numpy as np
-import os
-from sentence_transformers import SentenceTransformer
-from .config import INDEX_PATH, META_PATH
-import re
-# match = re.match(...)  # This would overwrite your variable if re was imported
+import threading
+from .config import (
+    SEGMENTS_DIR, META_DIR, BM25_DIR, SEARCH_MMAP, DEFAULT_NPROBE, DEFAULT_EF_SEARCH, SEARCH_BATCH_SIZE,
+    QUERY_EMBED_CACHE_ENTRIES, RESULT_CACHE_ENTRIES, SEARCH_MODE, HYBRID_CANDIDATES, RRF_K,
+    VECTORS_PATH, FILTER_EXACT_ROWS, FILTER_MASK_CACHE_ENTRIES, CASE_OVERFETCH, SNIPPETS_PER_CASE,
+    META_PATH, INDEX_PATH, SHARDS,
+)
+from .metastore import open_store, date_to_days, UNKNOWN_DATE
+from .ann import load_vectors
+from .segments import SegmentedIndex
+from .casestore import CaseSummaryStore, CaseTextStore
+from .models import get_embedder
+from .cache import LRUCache
+from .bm25 import BM25Index
+from .metrics import span, counter
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+CACHE_LOOKUPS = counter("querycase_search_cache_total", "Search cache lookups", ("cache", "outcome"))
+SEARCH_QUERIES = counter("querycase_search_queries_total", "Queries searched", ("mode",))
 
-def search(query, top_k=5):
+class SearchEngine:
     """
-    Semantic search for the most relevant case snippets.
+    Keeps the index segments and metadata store loaded between queries.
+
+    Every search does a cheap stat() of the segment manifest and metadata
+    files and only loads what changed on disk (new segments are opened,
+    unchanged ones are kept), so query latency doesn't include the index
+    load. Shared by `search()` below and the Streamlit app.
+
+    Query embeddings and result lists are kept in LRU caches; result keys
+    include the index generation, so an index update invalidates them.
+
+    `mode` picks the ranking: "vector" (FAISS), "keyword" (BM25 over the
+    same rows) or "hybrid" (reciprocal rank fusion of both).
+
+    Filters (see `make_filter`) become a boolean row mask computed from the
+    metadata columns. FAISS skips non-matching rows during the scan via an
+    IDSelectorBitmap; very selective filters are instead scored exactly
+    against just their rows from the stored vectors.
     """
-    if not (os.path.exists(INDEX_PATH) and os.path.exists(META_PATH)):
-        print("❌ FAISS index or metadata not found.")
-        return []
 
-    index = faiss.read_index(INDEX_PATH)
-    with open(META_PATH, "r", encoding="utf-8") as f:
-        metadata = json.load(f)
+    def __init__(self, segments_dir=SEGMENTS_DIR, meta_dir=META_DIR, model=None, mmap=SEARCH_MMAP,
+                 bm25_dir=BM25_DIR, vectors_path=VECTORS_PATH):
+        self.segments_dir = segments_dir
+        self.meta_dir = meta_dir
+        self.model = model
+        # Only the default directory adopts a legacy single-file index (not shard directories)
+        self.index = SegmentedIndex(segments_dir, mmap=mmap,
+                                    legacy_index_path=INDEX_PATH if segments_dir == SEGMENTS_DIR else None)
+        self.keywords = BM25Index(bm25_dir)
+        self.vectors_path = vectors_path
+        self.vectors = None
+        self.metadata = None
+        self.summaries = None
+        self.texts = None
+        self.embedding_cache = LRUCache(QUERY_EMBED_CACHE_ENTRIES)
+        self.result_cache = LRUCache(RESULT_CACHE_ENTRIES)
+        self.mask_cache = LRUCache(FILTER_MASK_CACHE_ENTRIES)
+        self._result_generation = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Load the index/metadata on first use and reload them if the files
+        changed. Returns False if there is nothing to search yet.
+        """
+        with self._lock:
+            self.index.refresh()
+            self.keywords.refresh()
+            if not self.index.ntotal:
+                return False
+
+            if self.metadata is None:
+                self.metadata = open_store(self.meta_dir, META_PATH if self.meta_dir == META_DIR else None)
+                self.summaries = CaseSummaryStore()
+                self.texts = CaseTextStore()
+            else:
+                self.metadata.refresh()
+                self.summaries.refresh()
+                self.texts.refresh()
+            return len(self.metadata) > 0
+
+    def generation(self):
+        """
+        Identifies the loaded index + keyword index + metadata (+ case
+        summaries) version; changes after a reload.
+        """
+        if self.metadata is None:
+            return self.index.generation(), self.keywords.generation(), None, None
+        return (self.index.generation(), self.keywords.generation(),
+                self.metadata.generation(), self.summaries.generation())
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal
+
+    def cache_stats(self):
+        """
+        Hit/miss counters of the query embedding and result caches.
+        """
+        return {"embeddings": self.embedding_cache.stats(), "results": self.result_cache.stats()}
+
+    def embed_queries(self, queries, batch_size=SEARCH_BATCH_SIZE):
+        """
+        Embeddings for `queries`; only cache misses go through the model,
+        together in one encode() call.
+        """
+        return embed_queries(queries, self.embedding_cache, self.model, batch_size)
+
+    def index_kind(self):
+        return self.index.kind()
+
+    def courts(self):
+        """
+        Court codes present in the metadata (for filter choices).
+        """
+        if self.metadata is None:
+            return []
+        return sorted(code for code in self.metadata.court_codes if code)
+
+    def term_stats(self, terms):
+        """
+        BM25 documents, tokens and document frequencies of `terms`, which
+        the shard coordinator sums over shards.
+        """
+        return self.keywords.term_stats(terms)
+
+    def case_texts(self, results, max_cases=3, max_chars=3000, min_chars=300):
+        """
+        Opening `max_chars` characters of the full text of the top
+        `max_cases` distinct cases in `results`, for the summarizer.
+        """
+        if self.texts is None:
+            return []
+        return case_texts(self.texts, results, max_cases, max_chars, min_chars)
+
+    def filter_mask(self, filters):
+        """
+        Boolean mask over index rows for a `make_filter()` tuple, or None for
+        no filter. Masks are cached per filter and index generation.
+        """
+        if filters is None:
+            return None
+        key = (filters, self.generation())
+        mask = self.mask_cache.get(key)
+        if mask is not None:
+            return mask
+
+        date_from, date_to, courts, case_ids = filters
+        metadata = self.metadata
+        mask = np.ones(len(metadata), dtype=bool)
+        days = metadata.date_days
+        if date_from is not None:
+            mask &= days >= date_from
+        if date_to is not None:
+            mask &= (days <= date_to) & (days != UNKNOWN_DATE)
+        if courts:
+            court_ids = [i for i in (metadata.court_id(c) for c in courts) if i is not None]
+            mask &= np.isin(metadata.court_ids, court_ids)
+        if case_ids:
+            mask &= np.isin(metadata.case_ids, np.array(case_ids, dtype=np.int64))
+
+        # Line the mask up with the index (metadata can briefly run ahead of it)
+        n = self.index.ntotal
+        mask = mask[:n] if len(mask) >= n else np.concatenate([mask, np.zeros(n - len(mask), dtype=bool)])
+        self.mask_cache.put(key, mask)
+        return mask
+
+    def _exact_search(self, query_vectors, rows, top_k):
+        # Brute-force L2 over just the allowed rows: cheaper than a filtered
+        # index scan when the filter keeps few rows
+        if self.vectors is None or len(self.vectors) < self.index.ntotal:
+            self.vectors = load_vectors(self.vectors_path)
+        if len(self.vectors) < self.index.ntotal:
+            return None
+        candidates = np.asarray(self.vectors[rows], dtype=np.float32)
+        q = np.asarray(query_vectors, dtype=np.float32)
+        distances = (q ** 2).sum(1)[:, None] - 2 * q @ candidates.T + (candidates ** 2).sum(1)[None, :]
+        k = min(top_k, len(rows))
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        top_d = np.take_along_axis(distances, top, axis=1)
+        order = np.argsort(top_d, axis=1, kind="stable")
+        out_d = np.full((len(q), top_k), np.inf, dtype=np.float32)
+        out_i = np.full((len(q), top_k), -1, dtype=np.int64)
+        out_d[:, :k] = np.take_along_axis(top_d, order, axis=1)
+        out_i[:, :k] = rows[np.take_along_axis(top, order, axis=1)]
+        return out_d, out_i
+
+    def search_vectors(self, query_vectors, top_k=5, nprobe=None, ef_search=None, mask=None):
+        """
+        Search pre-computed query embeddings. Returns (distances, indices).
+        `nprobe` (IVF) and `ef_search` (HNSW) trade recall for latency and
+        are ignored by index types they don't apply to. `mask` restricts
+        the search to rows where it is True.
+        """
+        if not self.refresh():
+            return None, None
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            if not len(rows):
+                n = len(query_vectors)
+                return np.full((n, top_k), np.inf, dtype=np.float32), np.full((n, top_k), -1, dtype=np.int64)
+            if len(rows) <= FILTER_EXACT_ROWS:
+                with span("search.exact"):
+                    exact = self._exact_search(query_vectors, rows, top_k)
+                if exact is not None:
+                    return exact
+        with span("search.vector"):
+            return self.index.search(query_vectors, top_k, nprobe or DEFAULT_NPROBE,
+                                     ef_search or DEFAULT_EF_SEARCH, mask=mask)
+
+    def search_scored(self, queries, top_k=5, nprobe=None, ef_search=None, mode=SEARCH_MODE,
+                      batch_size=SEARCH_BATCH_SIZE, filters=None, query_vectors=None, bm25_stats=None):
+        """
+        (rows, scores) of the best chunks for each query, best first. Scores
+        are positive and higher is better: 1 / (1 + L2 distance) for vector,
+        BM25 for keyword and the fused RRF score for hybrid. `query_vectors`
+        are the queries' embeddings when the caller already has them;
+        `bm25_stats` are collection statistics to score BM25 with (see
+        BM25Index.search).
+        """
+        if mode not in ("vector", "keyword", "hybrid"):
+            raise ValueError(f"Unknown search mode {mode!r} (expected 'vector', 'keyword' or 'hybrid')")
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        candidates = top_k * HYBRID_CANDIDATES if mode == "hybrid" else top_k
+        if not self.refresh():
+            return [empty for _ in queries]
+        with span("search.filter"):
+            mask = self.filter_mask(filters)
+
+        if mode != "keyword":
+            if query_vectors is not None:
+                query_embeddings = np.asarray(query_vectors, dtype=np.float32)
+            else:
+                query_embeddings = self.embed_queries(queries, batch_size=batch_size)
+            distances, indices = self.search_vectors(query_embeddings, candidates, nprobe=nprobe,
+                                                     ef_search=ef_search, mask=mask)
+            if indices is None:
+                return [empty for _ in queries]
+            vector_hits = [(i[i >= 0], 1.0 / (1.0 + np.maximum(d[i >= 0], 0))) for d, i in zip(distances, indices)]
+            if mode == "vector":
+                return vector_hits
+
+        # Postings are written just before their FAISS segment is published; skip rows not searchable yet
+        ntotal = self.index.ntotal
+        keyword_hits = []
+        with span("search.keyword"):
+            for query in queries:
+                scores, rows = self.keywords.search(query, candidates, mask=mask, stats=bm25_stats)
+                keyword_hits.append((rows[rows < ntotal], scores[rows < ntotal]))
+        if mode == "keyword":
+            return keyword_hits
+        with span("search.fusion"):
+            return [reciprocal_rank_fusion([v[0], k[0]], top_k) for v, k in zip(vector_hits, keyword_hits)]
+
+    def search_rows(self, queries, top_k=5, nprobe=None, ef_search=None, mode=SEARCH_MODE,
+                    batch_size=SEARCH_BATCH_SIZE, filters=None):
+        """
+        Row ids of the best chunks for each query, best first.
+        """
+        hits = self.search_scored(queries, top_k, nprobe=nprobe, ef_search=ef_search, mode=mode,
+                                  batch_size=batch_size, filters=filters)
+        return [rows for rows, _ in hits]
+
+    def _result(self, row, score=None):
+        match = self.metadata[row]
+        summaries = self.summaries
+        return {
+            "row": row,
+            "case_id": match.get("case_id"),
+            "case_name": match.get("case_name") or "Unnamed Case",
+            "date_filed": match.get("date_filed") or "Unknown Date",
+            "snippet": (match.get("chunk_text") or "")[:500],
+            "link": match.get("download_url") or "",
+            "court": match.get("court"),
+            "summary": summaries.get(match["case_id"]) if summaries is not None else None,
+            "score": float(score) if score is not None else None,
+        }
+
+    def results_for(self, indices, scores=None):
+        """
+        Turn one query's row ids (and scores) into result dicts.
+        """
+        results = []
+        for i, idx in enumerate(indices):
+            # Safety: ensure idx is within metadata bounds
+            if idx < 0 or idx >= len(self.metadata):
+                continue
+            results.append(self._result(int(idx), scores[i] if scores is not None else None))
+        return results
+
+    def case_results_for(self, rows, scores, top_k, case_score="max", snippets=SNIPPETS_PER_CASE):
+        """
+        Group one query's chunk hits by case_id and return the top_k cases.
+        A case scores the max (or sum) of its chunk scores; each result
+        carries its best `snippets` chunks under "snippets".
+        """
+        keep = rows < len(self.metadata)
+        rows, scores = rows[keep], np.asarray(scores, dtype=np.float64)[keep]
+        if not len(rows):
+            return []
+        case_ids = np.asarray(self.metadata.case_ids[rows])
+        cases, inverse = np.unique(case_ids, return_inverse=True)
+        if case_score == "sum":
+            totals = np.bincount(inverse, weights=scores, minlength=len(cases))
+        elif case_score == "max":
+            totals = np.full(len(cases), -np.inf)
+            np.maximum.at(totals, inverse, scores)
+        else:
+            raise ValueError(f"Unknown case_score {case_score!r} (expected 'max' or 'sum')")
+
+        best_cases = np.argsort(-totals, kind="stable")[:top_k]
+        # Chunks ordered by case, then best score first
+        order = np.lexsort((-scores, inverse))
+        starts = np.searchsorted(inverse[order], np.arange(len(cases)))
+        counts = np.bincount(inverse, minlength=len(cases))
+
+        results = []
+        for c in best_cases.tolist():
+            chunk_rows = rows[order[starts[c]:starts[c] + min(counts[c], snippets)]]
+            result = self._result(int(chunk_rows[0]), totals[c])
+            result["snippets"] = [(self.metadata.chunk_text(int(r)) or "")[:500] for r in chunk_rows]
+            result["matched_chunks"] = int(counts[c])
+            results.append(result)
+        return results
+
+    def _backfill_cases(self, queries, hits, top_k, fetch_k, vectors, options):
+        """
+        Queries whose fetch_k chunks hold fewer than top_k distinct cases (a
+        few long opinions filling the list) are searched again with twice
+        as many chunks, until they have top_k cases or run out of chunks.
+        """
+        case_ids = self.metadata.case_ids
+        while fetch_k < self.ntotal:
+            short = [n for n, (rows, _) in enumerate(hits) if len(rows) >= fetch_k and
+                     len(np.unique(case_ids[rows[rows < len(case_ids)]])) < top_k]
+            if not short:
+                break
+            fetch_k = min(fetch_k * 2, self.ntotal)
+            more = self.search_scored([queries[n] for n in short], fetch_k,
+                                      query_vectors=None if vectors is None else vectors[short], **options)
+            for n, rows_scores in zip(short, more):
+                hits[n] = rows_scores
+        return hits
+
+    def search(self, query, top_k=5, nprobe=None, ef_search=None, mode=SEARCH_MODE,
+               date_from=None, date_to=None, courts=None, case_ids=None, group_by_case=False, case_score="max"):
+        """
+        Semantic search for the most relevant case snippets.
+        Returns a list of dicts with case info.
+        """
+        return self.search_many([query], top_k, nprobe=nprobe, ef_search=ef_search, mode=mode,
+                                date_from=date_from, date_to=date_to, courts=courts, case_ids=case_ids,
+                                group_by_case=group_by_case, case_score=case_score)[0]
+
+    def search_many(self, queries, top_k=5, nprobe=None, ef_search=None, mode=SEARCH_MODE,
+                    date_from=None, date_to=None, courts=None, case_ids=None, group_by_case=False,
+                    case_score="max", batch_size=SEARCH_BATCH_SIZE, query_vectors=None, bm25_stats=None):
+        """
+        Search several queries at once: one batched model.encode() call and
+        one FAISS search over all query rows. Returns one result list per query.
+        `date_from` / `date_to` (ISO dates, inclusive), `courts` (court codes
+        such as "ca9") and `case_ids` restrict which chunks are searched.
+        With `group_by_case`, top_k * CASE_OVERFETCH chunks (more if they
+        hold fewer than top_k cases) are ranked and grouped so each result is
+        a distinct case (scored by `case_score`).
+        `query_vectors` (one embedding per query) skip encoding the queries.
+        `bm25_stats` (from the shard coordinator) replace the index's own BM25
+        collection statistics.
+        """
+        filters = make_filter(date_from, date_to, courts, case_ids)
+        if not queries:
+            return []
+        if not self.refresh():
+            return [[] for _ in queries]
+
+        generation = self.generation()
+        if generation != self._result_generation:
+            # Index changed: cached results are stale
+            self.result_cache.clear()
+            self._result_generation = generation
+        grouping = (case_score,) if group_by_case else None
+        keys = [(normalize_query(q), top_k, nprobe, ef_search, mode, filters, grouping, generation, bm25_stats)
+                for q in queries]
+        results = [self.result_cache.get(k) for k in keys]
+        todo = [i for i, r in enumerate(results) if r is None]
+        SEARCH_QUERIES.inc(len(queries), mode=mode)
+        CACHE_LOOKUPS.inc(len(keys) - len(todo), cache="results", outcome="hit")
+        CACHE_LOOKUPS.inc(len(todo), cache="results", outcome="miss")
+        if todo:
+            fetch_k = top_k * CASE_OVERFETCH if group_by_case else top_k
+            vectors = None if query_vectors is None else np.asarray(query_vectors, dtype=np.float32)[todo]
+            todo_queries = [queries[i] for i in todo]
+            options = {"nprobe": nprobe, "ef_search": ef_search, "mode": mode, "batch_size": batch_size,
+                       "filters": filters, "bm25_stats": bm25_stats}
+            hits = self.search_scored(todo_queries, fetch_k, query_vectors=vectors, **options)
+            if group_by_case:
+                hits = self._backfill_cases(todo_queries, hits, top_k, fetch_k, vectors, options)
+            # Metadata lookups (and grouping) that turn row ids into results
+            with span("search.results"):
+                for i, (rows, scores) in zip(todo, hits):
+                    if group_by_case:
+                        results[i] = self.case_results_for(rows, scores, top_k, case_score=case_score)
+                    else:
+                        results[i] = self.results_for(rows, scores)
+                    self.result_cache.put(keys[i], results[i])
+        return [list(r) for r in results]
+
+
+def embed_queries(queries, cache, model=None, batch_size=SEARCH_BATCH_SIZE):
+    """
+    Embeddings for `queries` through an LRU `cache` keyed by the normalized
+    query; only cache misses go through the model, in one encode() call.
+    """
+    keys = [normalize_query(q) for q in queries]
+    vectors = [cache.get(k) for k in keys]
+    missing = list(dict.fromkeys(k for k, v in zip(keys, vectors) if v is None))
+    CACHE_LOOKUPS.inc(len(keys) - len(missing), cache="embeddings", outcome="hit")
+    CACHE_LOOKUPS.inc(len(missing), cache="embeddings", outcome="miss")
+    if missing:
+        with span("search.encode"):
+            encoded = np.asarray((model or get_embedder()).encode(missing, batch_size=batch_size),
+                                 dtype=np.float32)
+        fresh = dict(zip(missing, encoded))
+        for k, v in fresh.items():
+            cache.put(k, v)
+        vectors = [v if v is not None else fresh[k] for k, v in zip(keys, vectors)]
+    return np.vstack(vectors)
+
+
+def case_texts(store, results, max_cases=3, max_chars=3000, min_chars=300):
+    """
+    Opening `max_chars` characters of the text (from the CaseTextStore
+    `store`) of the top `max_cases` distinct cases in `results`. Texts
+    shorter than `min_chars` are skipped. Only the compressed frames
+    covering the prefix are read.
+    """
+    texts, seen = [], set()
+    for result in results:
+        case_id = result.get("case_id")
+        if not case_id or case_id in seen:
+            continue
+        seen.add(case_id)
+        if len(seen) > max_cases:
+            break
+        text = store.get(case_id, max_chars)
+        if text and len(text) >= min(min_chars, max_chars):
+            texts.append(text)
+    return texts
+
+
+def reciprocal_rank_fusion(rankings, top_k, k=RRF_K):
+    """
+    Fuse ranked row-id lists: each row scores sum(1 / (k + rank)) over the
+    lists it appears in. Returns (rows, scores) of the top_k, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking.tolist(), start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank)
+    best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return np.array(best, dtype=np.int64), np.array([scores[r] for r in best], dtype=np.float32)
+
+
+def make_filter(date_from=None, date_to=None, courts=None, case_ids=None):
+    """
+    Hashable search filter (date_from days, date_to days, courts, case_ids),
+    or None when nothing is filtered.
+    """
+    def days(value):
+        if value is None or value == "":
+            return None
+        d = date_to_days(value)
+        if d == UNKNOWN_DATE:
+            raise ValueError(f"Invalid date {value!r} (expected YYYY-MM-DD)")
+        return d
+
+    filters = (
+        days(date_from),
+        days(date_to),
+        tuple(sorted(c.strip().lower() for c in courts)) if courts else (),
+        tuple(sorted(int(c) for c in case_ids)) if case_ids else (),
+    )
+    return filters if any(f is not None and f != () for f in filters) else None
+
+
+def normalize_query(query):
+    """
+    Cache key for a query: surrounding and repeated whitespace don't change it.
+    """
+    return " ".join(query.split())
+
 
-    query_embedding = model.encode([query])
-    distances, indices = index.search(np.array(query_embedding), top_k)
+_engine = None
 
-    results = []
-    for idx in indices[0]:
-        match = metadata[idx]
-        results.append({
-            "case_name": match["case_name"],
-            "date_filed": match["date_filed"],
-            "snippet": match["chunk_text"][:500],
-            "link": match["download_url"]
-        })
-    return results
+def open_engine():
+    """
+    A SearchEngine over the local index, or with SHARDS set, a
+    ShardedSearchEngine that fans queries out to the shard workers.
+    Both answer the same calls.
+    """
+    if SHARDS:
+        from .shards import ShardedSearchEngine
+        return ShardedSearchEngine()
+    return SearchEngine()
+
+def get_engine():
+    """
+    Process-wide engine (see `open_engine`) used by `search()`.
+    """
+    global _engine
+    if _engine is None:
+        _engine = open_engine()
+    return _engine
+
+def search(query, top_k=5, nprobe=None, ef_search=None, mode=SEARCH_MODE,
+           date_from=None, date_to=None, courts=None, case_ids=None, group_by_case=False, case_score="max"):
+    """
+    Semantic search for the most relevant case snippets, optionally limited
+    to a filing-date range, courts and/or case ids. `group_by_case` returns
+    top_k distinct cases instead of top_k chunks.
+    """
+    engine = get_engine()
+    if not engine.refresh():
+        print("❌ FAISS index or metadata not found.")
+        return []
+    return engine.search(query, top_k, nprobe=nprobe, ef_search=ef_search, mode=mode,
+                         date_from=date_from, date_to=date_to, courts=courts, case_ids=case_ids,
+                         group_by_case=group_by_case, case_score=case_score)
+
+def search_many(queries, top_k=5, nprobe=None, ef_search=None, mode=SEARCH_MODE,
+                date_from=None, date_to=None, courts=None, case_ids=None, group_by_case=False, case_score="max"):
+    """
+    Batched semantic search: one result list per query.
+    """
+    engine = get_engine()
+    if not engine.refresh():
+        print("❌ FAISS index or metadata not found.")
+        return [[] for _ in queries]
+    return engine.search_many(queries, top_k, nprobe=nprobe, ef_search=ef_search, mode=mode,
+                              date_from=date_from, date_to=date_to, courts=courts, case_ids=case_ids,
+                              group_by_case=group_by_case, case_score=case_score)
 
 # Example interactive usage:
 if __name__ == "__main__":
+    from querycase.summarizer import summarize_texts
+
     query = input("Enter legal question: ")
     results = search(query)
 
@@ -49,29 +555,23 @@ if __name__ == "__main__":
         print(f"Link: {result['link']}")
         print(f"Snippet: {result['snippet'][:500]}...")
 
-    # 🧠 Load full case texts from data/json/<case_id>.json
-    full_texts = []
-    for result in results[:3]:  # summarize only top 3 results
-        case_id = result.get("case_id")
-        if not case_id:
-            continue
-        json_path = os.path.join(JSON_DIR, f"{case_id}.json")
-        if os.path.exists(json_path):
-            try:
-                with open(json_path, "r", encoding="utf-8") as f:
-                    case_data = json.load(f)
-                    opinion_text = case_data.get("opinion_text", "")
-                    if len(opinion_text) >= 300:
-                        full_texts.append(opinion_text[:3000])  # trim for summarizer input limit
-            except Exception as e:
-                print(f"⚠️ Failed to load {case_id}: {e}")
-
-    if full_texts:
-        print("\n🧠 Summary of Relevant Cases:\n")
-        summary = summarize_texts(query, full_texts)
-        print(summary)
-    else:
-        print("\n⚠️ No usable full texts found for summarization.")
-
+    # 🧠 Precomputed per-case summaries (made at ingest) need no model time
+    case_summaries = []
+    for result in results[:3]:
+        if result.get("summary") and (result["case_name"], result["summary"]) not in case_summaries:
+            case_summaries.append((result["case_name"], result["summary"]))
+    if case_summaries:
+        print("\n🧠 Case Summaries:\n")
+        for case_name, summary in case_summaries:
+            print(f"• {case_name}: {summary}\n")
 
+    # 🧠 Otherwise generate one from the stored case texts
+    if not case_summaries:
+        full_texts = get_engine().case_texts(results, max_cases=3, max_chars=3000)  # trim for summarizer input limit
 
+        if full_texts:
+            print("\n🧠 Summary of Relevant Cases:\n")
+            summary = summarize_texts(query, full_texts)
+            print(summary)
+        else:
+            print("\n⚠️ No usable full texts found for summarization.")
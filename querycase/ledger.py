@@ -0,0 +1,275 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+from .config import LEDGER_PATH, LAST_FETCH_PATH, JSON_DIR, DEFAULT_FETCH_START, FETCH_MAX_ATTEMPTS, SHARDS
+from .metastore import MetadataStore, open_store, days_to_date
+
+# Per-case ingest state. A case is recorded as fetched when its JSON is on
+# disk and as indexed once its chunks are in a published segment; skipped
+# cases (too little text) aren't downloaded again. Retry cases (failed
+# downloads, lost JSON files) are fetched again: the API is paged from the
+# oldest of them until they resolve or run out of attempts.
+FETCHED, INDEXED, SKIPPED, RETRY = "fetched", "indexed", "skipped", "retry"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    case_id INTEGER PRIMARY KEY,
+    date_filed TEXT,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS cases_state ON cases(state);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class IngestLedger:
+    """
+    SQLite (WAL mode) ledger of fetched / indexed / skipped state per case
+    id. Every call writes one batch in one transaction, so a crash leaves
+    either all or none of a batch recorded. Replaces checkpoint.json, which
+    was rewritten after every case.
+    """
+
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        # Shared by the fetch thread and the index stage, serialized by the lock
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(cases)")]
+        if "attempts" not in columns:
+            self._db.execute("ALTER TABLE cases ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self._lock = threading.Lock()
+        if self._setting("migrated") is None:
+            self.migrate()
+            self._set("migrated", "1")
+
+    def _setting(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key, value):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _record(self, cases, state):
+        now = time.time()
+        rows = [(int(c["id"]), c.get("date_filed"), state, now) for c in cases]
+        if not rows:
+            return
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany(
+                    "INSERT INTO cases (case_id, date_filed, state, updated) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(case_id) DO UPDATE SET "
+                    "date_filed = COALESCE(excluded.date_filed, cases.date_filed), state = excluded.state, updated = excluded.updated",
+                    rows,
+                )
+
+    def mark_fetched(self, cases):
+        self._record(cases, FETCHED)
+
+    def mark_indexed(self, cases):
+        self._record(cases, INDEXED)
+
+    def mark_skipped(self, cases):
+        self._record(cases, SKIPPED)
+
+    def mark_retry(self, cases, max_attempts=FETCH_MAX_ATTEMPTS):
+        """
+        Record failed downloads to fetch again on a later run. A case that
+        has failed `max_attempts` times is recorded as skipped instead.
+        """
+        now = time.time()
+        rows = [(int(c["id"]), c.get("date_filed"), RETRY, now) for c in cases]
+        if not rows:
+            return
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany(
+                    "INSERT INTO cases (case_id, date_filed, state, updated, attempts) VALUES (?, ?, ?, ?, 1) "
+                    "ON CONFLICT(case_id) DO UPDATE SET "
+                    "date_filed = COALESCE(excluded.date_filed, cases.date_filed), updated = excluded.updated, "
+                    f"attempts = cases.attempts + 1, state = CASE WHEN cases.attempts + 1 >= {int(max_attempts)} "
+                    f"THEN '{SKIPPED}' ELSE excluded.state END",
+                    rows,
+                )
+
+    def forget(self, case_ids):
+        """
+        Queue cases to be fetched again (their filing date is kept, so the
+        next fetch pages back to it).
+        """
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany("UPDATE cases SET state = ?, updated = ? WHERE case_id = ?",
+                                     [(RETRY, time.time(), int(i)) for i in case_ids])
+
+    def retries(self):
+        """
+        Ids of cases waiting to be fetched again.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT case_id FROM cases WHERE state = ? ORDER BY date_filed, case_id", (RETRY,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def seen(self, case_ids):
+        """
+        The subset of `case_ids` already in the ledger and not waiting for
+        a retry.
+        """
+        case_ids = [int(i) for i in case_ids]
+        found = set()
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(case_ids), 500):
+                part = case_ids[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT case_id FROM cases WHERE case_id IN ({','.join('?' * len(part))}) AND state != ?",
+                    part + [RETRY],
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def state(self, case_id):
+        with self._lock:
+            row = self._db.execute("SELECT state FROM cases WHERE case_id = ?", (int(case_id),)).fetchone()
+        return row[0] if row else None
+
+    def unindexed(self):
+        """
+        Ids of cases fetched but not indexed yet (e.g. after a crash).
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT case_id FROM cases WHERE state = ? ORDER BY date_filed, case_id", (FETCHED,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def resume_date(self):
+        """
+        Date to page the API from: the oldest filing date waiting for a
+        retry, else the newest filing date recorded (or the start date
+        carried over from checkpoint.json).
+        """
+        with self._lock:
+            oldest_retry = self._db.execute(
+                "SELECT MIN(date_filed) FROM cases WHERE state = ?", (RETRY,)).fetchone()[0]
+            latest = self._db.execute(
+                "SELECT MAX(date_filed) FROM cases WHERE state != ?", (RETRY,)).fetchone()[0]
+        if oldest_retry:
+            return oldest_retry
+        dates = [d for d in (latest, self._setting("start_date")) if d]
+        return max(dates) if dates else DEFAULT_FETCH_START
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM cases GROUP BY state").fetchall())
+
+    def migrate(self, checkpoint_path=LAST_FETCH_PATH, json_dir=JSON_DIR, layout=None):
+        """
+        Seed a new ledger: every case already in the index is indexed, JSON
+        files left over from an interrupted run are fetched (so they get
+        indexed next), and the old checkpoint's date becomes the start date.
+        """
+        case_ids, days = indexed_cases(layout)
+        if len(case_ids):
+            self._record([{"id": int(c), "date_filed": days_to_date(d)}
+                          for c, d in zip(case_ids.tolist(), days.tolist())], INDEXED)
+            print(f"🗃️ Recorded {len(case_ids)} indexed cases in the ingest ledger")
+        leftover = [int(name[:-5]) for name in os.listdir(json_dir) if name[:-5].isdigit() and name.endswith(".json")]
+        leftover = np.setdiff1d(np.asarray(leftover, dtype=np.int64), case_ids)
+        if len(leftover):
+            self._record([{"id": int(c)} for c in leftover.tolist()], FETCHED)
+            print(f"🗃️ Queued {len(leftover)} fetched but unindexed cases from {json_dir}")
+        try:
+            with open(checkpoint_path, "r") as f:
+                start = json.load(f).get("date_filed")
+        except (OSError, ValueError):
+            start = None
+        if start:
+            self._set("start_date", start)
+            print(f"🗃️ Resuming from checkpoint.json date {start}")
+
+
+def indexed_cases(layout=None):
+    """
+    Sorted ids and filing days of every case in the index: the metadata
+    store, or with sharding (SHARDS, or an explicit ShardLayout) the
+    metadata stores of all shards.
+    """
+    if layout is None and SHARDS:
+        from .shards import ShardLayout  # shards imports embed, which imports this module
+        layout = ShardLayout()
+    if layout is None:
+        stores = [open_store()]
+    else:
+        stores = [MetadataStore(layout.paths(shard)["meta_dir"]) for shard in range(layout.shards)]
+    case_ids = np.concatenate([np.asarray(store.case_ids, dtype=np.int64) for store in stores])
+    days = np.concatenate([np.asarray(store.date_days, dtype=np.int64) for store in stores])
+    case_ids, first = np.unique(case_ids, return_index=True)
+    return case_ids, days[first]
+
+
+def load_unindexed(ledger, json_dir=JSON_DIR, layout=None):
+    """
+    Cases fetched before a crash but never indexed, read back from their
+    JSON files. Cases that made it into the index before the crash are
+    marked indexed instead, and cases whose JSON is gone are queued to be
+    fetched again.
+    """
+    case_ids = ledger.unindexed()
+    if not case_ids:
+        return []
+    done = np.isin(np.asarray(case_ids, dtype=np.int64), indexed_cases(layout)[0])
+    ledger.mark_indexed([{"id": c} for c, d in zip(case_ids, done.tolist()) if d])
+
+    cases, missing = [], []
+    for case_id in (c for c, d in zip(case_ids, done.tolist()) if not d):
+        try:
+            with open(os.path.join(json_dir, f"{case_id}.json"), "r", encoding="utf-8") as f:
+                cases.append(json.load(f))
+        except (OSError, ValueError):
+            missing.append(case_id)
+    if missing:
+        ledger.forget(missing)
+    return cases
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """
+    Shared IngestLedger, opened on first use.
+    """
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = IngestLedger()
+        return _ledger
+
+
+if __name__ == "__main__":
+    ledger = get_ledger()
+    print(f"📒 {ledger.path}: {ledger.counts()}, resuming from {ledger.resume_date()}")
@@ -0,0 +1,314 @@
+import os
+import json
+import mmap
+from datetime import date
+import numpy as np
+from .config import META_DIR, META_PATH
+
+# One fixed-width record per FAISS row. Strings live in blob.bin and are
+# referenced by (offset, length); case name/url are written once per case.
+ROW_DTYPE = np.dtype([
+    ("case_id", "<i8"),
+    ("date_days", "<i4"),     # days since 1970-01-01, UNKNOWN_DATE if missing
+    ("text_len", "<u4"),
+    ("text_off", "<u8"),
+    ("name_off", "<u8"),
+    ("url_off", "<u8"),
+    ("name_len", "<u4"),
+    ("url_len", "<u4"),
+])
+
+# Court codes ("ca9", "cadc", ...) are a separate uint16 column indexed into
+# courts.json; 0 is the unknown court. Stores created before the column
+# existed simply read as unknown for their older rows.
+COURT_DTYPE = np.dtype("<u2")
+UNKNOWN_COURT = ""
+
+UNKNOWN_DATE = np.iinfo(np.int32).min
+EPOCH = date(1970, 1, 1)
+
+
+def date_to_days(value):
+    try:
+        return (date.fromisoformat(str(value)[:10]) - EPOCH).days
+    except (TypeError, ValueError):
+        return UNKNOWN_DATE
+
+
+def normalize_court(code):
+    return (code or UNKNOWN_COURT).strip().lower()
+
+
+def days_to_date(days):
+    if days == UNKNOWN_DATE:
+        return None
+    return date.fromordinal(EPOCH.toordinal() + int(days)).isoformat()
+
+
+class MetadataStore:
+    """
+    Append-only chunk metadata keyed by FAISS row id.
+
+    rows.bin holds one ROW_DTYPE record per row (memory-mapped, so case_id and
+    date_days are available as columns without parsing anything), blob.bin
+    holds the UTF-8 chunk text, case names and URLs. store[row] decodes a
+    single row in O(1) and returns the same dict shape metadata.json used.
+    courts.u2 is a parallel court-id column (vocabulary in courts.json).
+    Files only ever grow: after a truncate(), rows.len holds the row count
+    until appends have overwritten the dropped rows.
+    """
+
+    def __init__(self, path=META_DIR):
+        self.path = path
+        self.rows_path = os.path.join(path, "rows.bin")
+        self.blob_path = os.path.join(path, "blob.bin")
+        self.courts_path = os.path.join(path, "courts.u2")
+        self.court_codes_path = os.path.join(path, "courts.json")
+        self.length_path = os.path.join(path, "rows.len")
+        os.makedirs(path, exist_ok=True)
+        for p in (self.rows_path, self.blob_path, self.courts_path):
+            if not os.path.exists(p):
+                open(p, "ab").close()
+        self._rows = np.empty(0, dtype=ROW_DTYPE)
+        self._courts = np.empty(0, dtype=COURT_DTYPE)
+        self.court_codes = [UNKNOWN_COURT]
+        self._blob = None
+        self._generation = None
+        self.refresh()
+
+    # -----------------------------
+    # Reading
+    # -----------------------------
+
+    def generation(self):
+        st = os.stat(self.rows_path)
+        try:
+            st_length = os.stat(self.length_path)
+            length = st_length.st_ino, st_length.st_mtime_ns
+        except FileNotFoundError:
+            length = None
+        return st.st_size, st.st_mtime_ns, length
+
+    def _row_count(self, size):
+        # A partially written trailing record (crash or concurrent append) is ignored
+        n = size // ROW_DTYPE.itemsize
+        try:
+            with open(self.length_path, "r", encoding="utf-8") as f:
+                return min(n, int(f.read()))
+        except (FileNotFoundError, ValueError):
+            return n
+
+    def refresh(self):
+        """
+        Re-map the files if they changed on disk. Returns True if reloaded.
+        """
+        generation = self.generation()
+        if generation == self._generation:
+            return False
+
+        n = self._row_count(generation[0])
+        self._rows = (
+            np.memmap(self.rows_path, dtype=ROW_DTYPE, mode="r", shape=(n,))
+            if n else np.empty(0, dtype=ROW_DTYPE)
+        )
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
+        if os.path.getsize(self.blob_path):
+            with open(self.blob_path, "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        m = min(n, os.path.getsize(self.courts_path) // COURT_DTYPE.itemsize)
+        courts = np.memmap(self.courts_path, dtype=COURT_DTYPE, mode="r", shape=(m,)) if m else np.empty(0, COURT_DTYPE)
+        if m < n:
+            courts = np.concatenate([courts, np.zeros(n - m, dtype=COURT_DTYPE)])
+        self._courts = courts
+        if os.path.exists(self.court_codes_path):
+            with open(self.court_codes_path, "r", encoding="utf-8") as f:
+                self.court_codes = json.load(f)
+        self._generation = generation
+        return True
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def rows(self):
+        return self._rows
+
+    @property
+    def case_ids(self):
+        return self._rows["case_id"]
+
+    @property
+    def date_days(self):
+        return self._rows["date_days"]
+
+    @property
+    def court_ids(self):
+        return self._courts
+
+    def court_id(self, code):
+        """
+        Column value for a court code, or None if no row has that court.
+        """
+        try:
+            return self.court_codes.index(normalize_court(code))
+        except ValueError:
+            return None
+
+    def _string(self, offset, length):
+        if not length:
+            return None
+        return self._blob[offset:offset + length].decode("utf-8")
+
+    def chunk_text(self, row):
+        r = self._rows[row]
+        return self._string(int(r["text_off"]), int(r["text_len"])) or ""
+
+    def __getitem__(self, row):
+        if row < 0 or row >= len(self._rows):
+            raise IndexError(row)
+        r = self._rows[row]
+        return {
+            "case_id": int(r["case_id"]),
+            "case_name": self._string(int(r["name_off"]), int(r["name_len"])) or "Unknown Case",
+            "date_filed": days_to_date(r["date_days"]) or "Unknown Date",
+            "download_url": self._string(int(r["url_off"]), int(r["url_len"])),
+            "chunk_text": self._string(int(r["text_off"]), int(r["text_len"])) or "",
+            "court": self.court_codes[int(self._courts[row])] or None,
+        }
+
+    # -----------------------------
+    # Writing
+    # -----------------------------
+
+    def append(self, entries):
+        """
+        Append metadata dicts (case_id, case_name, date_filed, download_url,
+        chunk_text) as new rows. The blob is flushed before the rows that point
+        into it, so a crash never leaves a row referencing missing text.
+        """
+        if not entries:
+            return
+        records = np.zeros(len(entries), dtype=ROW_DTYPE)
+        courts = self._court_column(entries)
+        case_strings = {}
+
+        with open(self.blob_path, "ab") as blob:
+            offset = blob.tell()
+
+            def put(value):
+                nonlocal offset
+                data = (value or "").encode("utf-8")
+                start = offset
+                blob.write(data)
+                offset += len(data)
+                return start, len(data)
+
+            for i, entry in enumerate(entries):
+                case_id = int(entry["case_id"])
+                if case_id not in case_strings:
+                    case_strings[case_id] = (put(entry.get("case_name")), put(entry.get("download_url")))
+                (name_off, name_len), (url_off, url_len) = case_strings[case_id]
+                text_off, text_len = put(entry.get("chunk_text"))
+                records[i] = (
+                    case_id, date_to_days(entry.get("date_filed")),
+                    text_len, text_off, name_off, url_off, name_len, url_len,
+                )
+            blob.flush()
+            os.fsync(blob.fileno())
+
+        start = len(self._rows)
+        with open(self.courts_path, "r+b") as f:
+            # Seeking past the end zero-pads a column that predates these rows
+            f.seek(start * COURT_DTYPE.itemsize)
+            f.write(courts.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(self.rows_path, "r+b") as f:
+            # Overwrite dropped rows and any partial trailing record left by a crash
+            f.seek(start * ROW_DTYPE.itemsize)
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._write_length(start + len(records))
+
+        self.refresh()
+
+    def _court_column(self, entries):
+        codes = [normalize_court(entry.get("court")) for entry in entries]
+        new_codes = sorted(set(codes) - set(self.court_codes))
+        if new_codes:
+            # Vocabulary is written (atomically) before any row can refer to it
+            vocabulary = self.court_codes + new_codes
+            tmp_path = self.court_codes_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(vocabulary, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.court_codes_path)
+            self.court_codes = vocabulary
+        lookup = {code: i for i, code in enumerate(self.court_codes)}
+        return np.array([lookup[code] for code in codes], dtype=COURT_DTYPE)
+
+    def _write_length(self, n):
+        """
+        Record `n` rows in rows.len while rows.bin holds more, else drop it.
+        """
+        if n < os.path.getsize(self.rows_path) // ROW_DTYPE.itemsize:
+            tmp_path = self.length_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(str(n))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.length_path)
+        elif os.path.exists(self.length_path):
+            os.remove(self.length_path)
+
+    def truncate(self, n):
+        """
+        Drop rows past `n`, e.g. rows appended before a crash kept the FAISS
+        index from being written. The files aren't shrunk: a search process
+        may have the dropped rows memory-mapped, and touching a mapped page
+        past the end of a file is a SIGBUS.
+        """
+        if n >= len(self._rows):
+            return
+        self._write_length(n)
+        self.refresh()
+
+
+def migrate_json(json_path=META_PATH, path=META_DIR, batch_size=10000):
+    """
+    One-shot migration of a legacy metadata.json list into a MetadataStore.
+    The JSON file is left in place.
+    """
+    store = MetadataStore(path)
+    if len(store):
+        print(f"⚠️ Metadata store at {path} already has {len(store)} rows — skipping migration.")
+        return store
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+
+    for i in range(0, len(metadata), batch_size):
+        store.append(metadata[i:i + batch_size])
+
+    print(f"✅ Migrated {len(store)} rows from {json_path} to {path}")
+    return store
+
+
+def open_store(path=META_DIR, legacy_json=META_PATH):
+    """
+    Open the metadata store, migrating the legacy metadata.json on first use.
+    """
+    store = MetadataStore(path)
+    if not len(store) and legacy_json and os.path.exists(legacy_json):
+        store = migrate_json(legacy_json, path)
+    return store
+
+
+if __name__ == "__main__":
+    migrate_json()
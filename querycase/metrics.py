@@ -0,0 +1,255 @@
+import os
+import atexit
+import bisect
+import cProfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .config import METRICS_ENABLED, METRICS_BUCKETS, METRICS_WRITE_INTERVAL
+
+# Dependency-free counters / histograms rendered in the Prometheus text
+# format. Spans are context managers, so timing a section costs two
+# perf_counter() calls and a lock.
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def lines(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=METRICS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def stats(self, **labels):
+        """
+        (count, sum) for one label set.
+        """
+        series = self._series.get(tuple(labels.get(name, "") for name in self.labelnames))
+        return (sum(series[:-1]), series[-1]) if series else (0, 0.0)
+
+    def lines(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = (("le", _number(bound)),)
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    """
+    Named metrics of this process. `counter()` / `histogram()` return the
+    existing metric when the name is already registered, so modules can
+    declare what they use at import time.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._get(Counter, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=METRICS_BUCKETS):
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        out = []
+        for metric in metrics:
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.lines())
+        return "\n".join(out) + "\n"
+
+    def write(self, path):
+        """
+        Atomically write render() to `path` (e.g. for node_exporter's
+        textfile collector).
+        """
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+SPAN_SECONDS = histogram("querycase_span_seconds", "Wall time of instrumented sections", ("span",))
+
+
+@contextmanager
+def span(name):
+    """
+    Time the enclosed block into querycase_span_seconds{span=name}.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - start, span=name)
+
+
+def timed(name):
+    """
+    Decorator form of span().
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_export(path=None, port=None, host="127.0.0.1", interval=METRICS_WRITE_INTERVAL, registry=REGISTRY):
+    """
+    Export metrics for the rest of the run: serve GET /metrics on `port`
+    and/or rewrite `path` every `interval` seconds and at exit. Both run on
+    daemon threads.
+    """
+    if port:
+        handler = type("BoundMetricsHandler", (_MetricsHandler,), {"registry": registry})
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"📊 Metrics on http://{host}:{port}/metrics")
+    if path:
+        def write_periodically():
+            while True:
+                time.sleep(interval)
+                registry.write(path)
+
+        threading.Thread(target=write_periodically, name="metrics-file", daemon=True).start()
+        atexit.register(registry.write, path)
+        print(f"📊 Writing metrics to {path}")
+
+
+@contextmanager
+def profiled(target=None):
+    """
+    Optional per-run profiling. `target` is a path for cProfile stats (open
+    with `python -m pstats` or snakeviz), or "py-spy" to print the command
+    that attaches py-spy to this process; None does nothing.
+    """
+    if not target:
+        yield
+        return
+    if target == "py-spy":
+        print(f"🔬 Profile with: py-spy record --pid {os.getpid()} -o profile.svg")
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(target)
+        print(f"🔬 cProfile stats written to {target}")
+
+
+def add_arguments(parser):
+    """
+    --metrics-file / --metrics-port / --profile for a command-line entry point.
+    """
+    parser.add_argument("--metrics-file", default=None, help="Write Prometheus metrics to this file")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port")
+    parser.add_argument("--profile", default=None, metavar="PATH|py-spy",
+                        help="cProfile the run into PATH, or print a py-spy command for this process")
@@ -0,0 +1,197 @@
+import queue
+import threading
+import time
+from .metrics import span
+
+_DONE = object()
+
+
+class StageStats:
+    """
+    Per-stage counters: items handled, units (cases/chunks) and busy time.
+    """
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.units = 0
+        self.busy = 0.0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, units, seconds):
+        with self._lock:
+            self.items += 1
+            self.units += units
+            self.busy += seconds
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.units / elapsed if elapsed > 0 else 0.0
+
+    def utilization(self, workers=1):
+        elapsed = time.monotonic() - self.started
+        return self.busy / (elapsed * workers) if elapsed > 0 else 0.0
+
+
+class Stage:
+    """
+    One pipeline step: `fn(item)` runs on `workers` threads, reading from the
+    previous stage's bounded queue and writing its result to the next.
+    Returning None drops the item. `count(item)` gives the unit count
+    reported for throughput (e.g. cases per batch).
+    """
+
+    def __init__(self, name, fn, workers=1, unit="items", count=None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.count = count or (lambda item: 1)
+        self.stats = StageStats(name, unit)
+
+
+class Pipeline:
+    """
+    Producer/consumer pipeline: a source iterator feeds a chain of stages
+    connected by bounded queues, so every stage runs concurrently and a slow
+    stage applies back-pressure instead of buffering unboundedly.
+    """
+
+    def __init__(self, source, stages, queue_size=2, report_every=30.0, source_name="fetch",
+                 source_unit="items", source_count=None):
+        self.source = source
+        self.source_stage = Stage(source_name, None, unit=source_unit, count=source_count)
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.report_every = report_every
+        self._stop = threading.Event()    # source stops pulling, in-flight items drain
+        self._abort = threading.Event()   # a stage failed, in-flight items are dropped
+        self._errors = []
+
+    # -----------------------------
+    # Workers
+    # -----------------------------
+
+    def _put(self, q, item):
+        # Bounded put that still notices an abort
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run_source(self):
+        stats = self.source_stage.stats
+        out = self.queues[0]
+        try:
+            it = iter(self.source)
+            while not (self._stop.is_set() or self._abort.is_set()):
+                start = time.monotonic()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                stats.record(self.source_stage.count(item), time.monotonic() - start)
+                if not self._put(out, item):
+                    break
+        except Exception as e:
+            self._fail(self.source_stage, e)
+        finally:
+            close = getattr(self.source, "close", None)
+            if close:
+                close()
+            self._put_done(out, 1)
+
+    def _run_stage(self, i, finished):
+        stage = self.stages[i]
+        inbox = self.queues[i]
+        outbox = self.queues[i + 1] if i + 1 < len(self.queues) else None
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            if self._abort.is_set():
+                continue  # drain so upstream never blocks
+            start = time.monotonic()
+            try:
+                with span(f"stage.{stage.name}"):
+                    result = stage.fn(item)
+            except Exception as e:
+                self._fail(stage, e)
+                continue
+            stage.stats.record(stage.count(item), time.monotonic() - start)
+            if result is not None and outbox is not None:
+                self._put(outbox, result)
+
+        # Last worker of this stage passes the shutdown on
+        with finished["lock"]:
+            finished[i] += 1
+            last = finished[i] == stage.workers
+        if last and outbox is not None:
+            self._put_done(outbox, self.stages[i + 1].workers)
+
+    def _put_done(self, q, n):
+        for _ in range(n):
+            q.put(_DONE)
+
+    def _fail(self, stage, error):
+        print(f"❌ Stage '{stage.name}' failed: {error}")
+        self._errors.append((stage.name, error))
+        self._abort.set()
+
+    # -----------------------------
+    # Control
+    # -----------------------------
+
+    def stop(self):
+        """
+        Ask the source to stop; items already in flight still run to the end.
+        """
+        self._stop.set()
+
+    def report(self):
+        lines = []
+        all_stages = [self.source_stage] + self.stages
+        for i, stage in enumerate(all_stages):
+            s = stage.stats
+            depth = f"queue={self.queues[i].qsize()}/{self.queues[i].maxsize}" if i < len(self.queues) else ""
+            lines.append(
+                f"  {stage.name:<8} {s.units:>8} {s.unit:<7} {s.rate():8.2f}/s  "
+                f"busy={100 * s.utilization(stage.workers):5.1f}%  {depth}"
+            )
+        print("📊 Pipeline stages:\n" + "\n".join(lines))
+
+    def run(self):
+        finished = {i: 0 for i in range(len(self.stages))}
+        finished["lock"] = threading.Lock()
+
+        threads = [threading.Thread(target=self._run_source, name="stage-source", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            for w in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._run_stage, args=(i, finished), name=f"stage-{stage.name}-{w}", daemon=True
+                ))
+        for t in threads:
+            t.start()
+
+        last_report = time.monotonic()
+        while any(t.is_alive() for t in threads):
+            try:
+                threads[-1].join(timeout=1.0)
+            except KeyboardInterrupt:
+                if self._stop.is_set():
+                    self._abort.set()
+                    raise
+                print("⏹️ Stopping after in-flight batches (Ctrl-C again to abort)...")
+                self.stop()
+            if self.report_every and time.monotonic() - last_report >= self.report_every:
+                self.report()
+                last_report = time.monotonic()
+
+        self.report()
+        if self._errors:
+            name, error = self._errors[0]
+            raise RuntimeError(f"Pipeline stage '{name}' failed") from error
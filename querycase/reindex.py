@@ -0,0 +1,34 @@
+import argparse
+from .config import SEGMENTS_DIR, INDEX_PATH, VECTORS_PATH, INDEX_TYPE, IVF_NLIST, PQ_M, HNSW_M
+from .ann import INDEX_SPECS
+from .segments import SegmentedIndex, TRAIN_SAMPLE
+
+
+def rebuild_index(kind=INDEX_TYPE, segments_dir=SEGMENTS_DIR, vectors_path=VECTORS_PATH,
+                  nlist=IVF_NLIST, pq_m=PQ_M, hnsw_m=HNSW_M, train_size=TRAIN_SAMPLE):
+    """
+    Compact every index segment into one `kind` index trained and rebuilt
+    from the stored vectors. Row ids (and therefore metadata) are unchanged.
+    """
+    segments = SegmentedIndex(segments_dir, legacy_index_path=INDEX_PATH if segments_dir == SEGMENTS_DIR else None)
+    segments.lock_for_writing()
+    segments.refresh(load=False)
+    segments.remove_orphans()
+    return segments.compact(kind, vectors_path=vectors_path, nlist=nlist, pq_m=pq_m,
+                            hnsw_m=hnsw_m, train_size=train_size)
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Compact the index segments and rebuild them from stored vectors.")
+    parser.add_argument("--type", default=INDEX_TYPE, choices=sorted(INDEX_SPECS), help="Index type to build")
+    parser.add_argument("--nlist", type=int, default=IVF_NLIST, help="Max IVF lists (ivf_flat / ivf_pq)")
+    parser.add_argument("--pq-m", type=int, default=PQ_M, help="PQ sub-quantizers (ivf_pq)")
+    parser.add_argument("--hnsw-m", type=int, default=HNSW_M, help="HNSW graph degree (hnsw)")
+    parser.add_argument("--train-size", type=int, default=TRAIN_SAMPLE, help="Training sample size")
+    args = parser.parse_args()
+
+    rebuild_index(args.type, nlist=args.nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m, train_size=args.train_size)
+
+
+if __name__ == "__main__":
+    run()
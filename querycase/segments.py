@@ -0,0 +1,436 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import faiss
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locking
+    fcntl = None
+from .config import (
+    SEGMENTS_DIR, INDEX_PATH, VECTORS_PATH, INDEX_TYPE, EMBEDDING_DIM,
+    IVF_NLIST, PQ_M, HNSW_M, MAX_SEGMENTS,
+)
+from .ann import (
+    make_index, new_index, needs_training, index_kind, search_parameters, bitmap_selector,
+    load_vectors, sync_vectors,
+)
+
+MANIFEST = "manifest.json"
+WRITER_LOCK = "writer.lock"
+TRAIN_SAMPLE = 256 * 1024  # vectors used to train IVF centroids / PQ codebooks
+MIN_PQ_TRAIN = 39 * 256    # 8-bit PQ codebooks need ~39 points per centroid
+ADD_BATCH = 65536
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_index_atomic(index, path):
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SegmentedIndex:
+    """
+    FAISS index persisted as immutable segment files plus a manifest.
+
+    Each ingest batch becomes a new small segment instead of rewriting one
+    big index file. Row ids are global: segment i holds the rows after all
+    rows of segments 0..i-1, so the metadata store and vector file line up
+    unchanged. Searches query every segment and merge the per-segment top-k.
+
+    Segment files are written to a temp name, fsynced and renamed before the
+    manifest (also replaced atomically) references them, so a crash at any
+    point leaves the previous manifest and its segments intact.
+    `compact()` merges all segments into one, rebuilt from stored vectors.
+    """
+
+    def __init__(self, directory=SEGMENTS_DIR, mmap=False, legacy_index_path=INDEX_PATH):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST)
+        self.mmap = mmap
+        self.legacy_index_path = legacy_index_path
+        self.manifest = {"generation": 0, "next_id": 1, "segments": [], "template": None}
+        self._loaded = {}      # file name -> faiss index (segments are immutable)
+        self._keep_loaded = True
+        self._view = ([], {})  # (segments, loaded) swapped together for searches
+        self._stamp = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # -----------------------------
+    # Manifest
+    # -----------------------------
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        manifest = dict(manifest, generation=manifest["generation"] + 1)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        _fsync_dir(self.directory)
+        self.manifest = manifest
+        self._stamp = self._manifest_stamp()
+
+    def _manifest_stamp(self):
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _adopt_legacy_index(self):
+        """
+        First run after upgrading: hard-link the single faiss_index.index
+        into the segment directory as segment 1.
+        """
+        if not (self.legacy_index_path and os.path.exists(self.legacy_index_path)):
+            return None
+        legacy = faiss.read_index(self.legacy_index_path)
+        sync_vectors(legacy)
+        name = "seg-000001.index"
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            try:
+                os.link(self.legacy_index_path, path)
+            except OSError:
+                _write_index_atomic(legacy, path)
+        manifest = {
+            "generation": 0, "next_id": 2, "template": None,
+            "segments": [{"file": name, "rows": int(legacy.ntotal), "kind": index_kind(legacy)}],
+        }
+        self._write_manifest(manifest)
+        print(f"ℹ️ Adopted {self.legacy_index_path} as segment {name} ({legacy.ntotal} rows)")
+        return self.manifest
+
+    def lock_for_writing(self, wait=False):
+        """
+        Take the directory's writer lock for the life of this object, so an
+        ingest and a `querycase-reindex` never edit the manifest at once.
+        If another process holds it, fail, or with wait=True block until
+        it's released.
+        """
+        if fcntl is None or getattr(self, "_writer_lock", None):
+            return
+        f = open(os.path.join(self.directory, WRITER_LOCK), "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            if not wait:
+                f.close()
+                raise RuntimeError(f"Another ingest or reindex is writing to {self.directory}")
+            print(f"⏳ Another ingest or reindex is writing to {self.directory} — waiting for it to finish...")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            except BaseException:
+                f.close()
+                raise
+        self._writer_lock = f
+
+    def unlock(self):
+        """
+        Release the writer lock taken by lock_for_writing().
+        """
+        f = getattr(self, "_writer_lock", None)
+        if f is not None:
+            f.close()  # closing the descriptor drops the flock
+            self._writer_lock = None
+
+    def refresh(self, load=True):
+        """
+        Re-read the manifest if it changed and (with load=True) open any new
+        segment files. Returns True if something changed.
+        """
+        with self._lock:
+            stamp = self._manifest_stamp()
+            if stamp is None:
+                manifest = self._adopt_legacy_index()
+                if manifest is None:
+                    return False
+                stamp = self._stamp
+            elif stamp == self._stamp:
+                return False
+            else:
+                self.manifest = self._read_manifest()
+            self._stamp = stamp
+
+            self._keep_loaded = load
+            if load:
+                for attempt in range(3):
+                    try:
+                        names = [s["file"] for s in self.manifest["segments"]]
+                        self._loaded = {name: self._loaded.get(name) or self._read_segment(name) for name in names}
+                        break
+                    except RuntimeError:
+                        # A compaction in another process removed a segment: re-read the manifest
+                        if attempt == 2:
+                            raise
+                        time.sleep(0.1)
+                        self.manifest = self._read_manifest()
+                        self._stamp = self._manifest_stamp()
+                self._publish_view()
+            return True
+
+    def _publish_view(self):
+        self._view = (list(self.manifest["segments"]), dict(self._loaded))
+
+    def _read_segment(self, name):
+        path = os.path.join(self.directory, name)
+        if self.mmap:
+            try:
+                return faiss.read_index(path, faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0))
+            except RuntimeError as e:
+                print(f"⚠️ mmap load failed for {name} ({e}), reading into memory")
+        return faiss.read_index(path)
+
+    def generation(self):
+        return self.manifest["generation"]
+
+    @property
+    def segments(self):
+        return self.manifest["segments"]
+
+    @property
+    def ntotal(self):
+        return sum(s["rows"] for s in self.manifest["segments"])
+
+    def kind(self):
+        segments = self.manifest["segments"]
+        return segments[0]["kind"] if segments else None
+
+    def target_kind(self):
+        """
+        Index type compactions build: the type of the last compaction or
+        rebuild (kept in the manifest, even when too few rows forced a
+        flat fallback), else the first segment's, else INDEX_TYPE.
+        """
+        return self.manifest.get("kind") or self.kind() or INDEX_TYPE
+
+    # -----------------------------
+    # Search
+    # -----------------------------
+
+    def search(self, query_vectors, top_k, nprobe=None, ef_search=None, mask=None):
+        """
+        Search all segments and merge their top-k into global row ids.
+        Returns (distances, indices) like faiss.Index.search. `mask` is a
+        boolean array over global rows; only True rows are scanned.
+        """
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        segments, loaded = self._view
+        all_d, all_i = [], []
+        offset = 0
+        for seg in segments:
+            index = loaded[seg["file"]]
+            sel = bits = None
+            if mask is not None:
+                seg_mask = mask[offset:offset + seg["rows"]]
+                if not seg_mask.any():
+                    offset += seg["rows"]
+                    continue
+                if not seg_mask.all():
+                    sel, bits = bitmap_selector(seg_mask)
+            params = search_parameters(index, nprobe, ef_search, sel=sel)
+            d, i = index.search(query_vectors, top_k, params=params)
+            all_d.append(d)
+            all_i.append(np.where(i >= 0, i + offset, -1))
+            offset += seg["rows"]
+
+        if not all_d:
+            n = len(query_vectors)
+            return np.full((n, top_k), np.inf, dtype=np.float32), np.full((n, top_k), -1, dtype=np.int64)
+        if len(all_d) == 1:
+            return all_d[0], all_i[0]
+
+        distances = np.hstack(all_d)
+        indices = np.hstack(all_i)
+        distances[indices < 0] = np.inf
+        order = np.argsort(distances, axis=1, kind="stable")[:, :top_k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def reconstruct_n(self, start, n):
+        """
+        Rows [start, start + n) across segments (flat/HNSW segments only).
+        """
+        out = []
+        offset = 0
+        for seg in self.manifest["segments"]:
+            lo, hi = max(start, offset), min(start + n, offset + seg["rows"])
+            if lo < hi:
+                index = self._loaded.get(seg["file"]) or self._read_segment(seg["file"])
+                out.append(index.reconstruct_n(lo - offset, hi - lo))
+            offset += seg["rows"]
+        return np.vstack(out) if out else np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+    # -----------------------------
+    # Writing
+    # -----------------------------
+
+    def _empty_index(self):
+        """
+        Index for a new segment: a copy of the trained template left by the
+        last compaction, or a fresh INDEX_TYPE index.
+        """
+        template = self.manifest.get("template")
+        if template:
+            return faiss.read_index(os.path.join(self.directory, template))
+        return new_index()
+
+    def add_segment(self, vectors):
+        """
+        Write `vectors` as a new immutable segment and publish it.
+        Returns the new total row count.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            index = self._empty_index()
+            index.add(vectors)
+            name = f"seg-{self.manifest['next_id']:06d}.index"
+            _write_index_atomic(index, os.path.join(self.directory, name))
+
+            manifest = dict(self.manifest)
+            manifest["next_id"] += 1
+            manifest["segments"] = manifest["segments"] + [
+                {"file": name, "rows": int(index.ntotal), "kind": index_kind(index)}
+            ]
+            self._write_manifest(manifest)
+            if self._keep_loaded:
+                self._loaded[name] = index
+                self._publish_view()
+            return self.ntotal
+
+    def remove_orphans(self):
+        """
+        Delete segment files not referenced by the manifest (left by a crash
+        between writing a segment and publishing it). Writer-side only.
+        """
+        with self._lock:
+            keep = {s["file"] for s in self.manifest["segments"]}
+            if self.manifest.get("template"):
+                keep.add(self.manifest["template"])
+            for name in os.listdir(self.directory):
+                if name in (MANIFEST, WRITER_LOCK) or name in keep:
+                    continue
+                if name.endswith(".index") or name.endswith(".tmp"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def compact(self, kind=INDEX_TYPE, vectors_path=VECTORS_PATH, nlist=IVF_NLIST, pq_m=PQ_M,
+                hnsw_m=HNSW_M, train_size=TRAIN_SAMPLE, seed=0):
+        """
+        Merge every current segment into one `kind` index built from the
+        stored vectors. Segments added while compacting are kept after it.
+        """
+        with self._lock:
+            snapshot = list(self.manifest["segments"])
+            # Reserve file ids now so the big writes below can happen unlocked
+            seg_id = self.manifest["next_id"]
+            self.manifest = dict(self.manifest, next_id=seg_id + 2)
+        n = sum(s["rows"] for s in snapshot)
+        vectors = load_vectors(vectors_path)
+        if not n:
+            print("❌ Nothing to compact.")
+            return None
+        if len(vectors) < n:
+            raise RuntimeError(f"Only {len(vectors)} stored vectors for {n} index rows — run an ingest to backfill")
+
+        requested = kind
+        if kind == "ivf_pq" and n < MIN_PQ_TRAIN:
+            print(f"ℹ️ {n} rows is too few to train ivf_pq (need {MIN_PQ_TRAIN}) — compacting as flat")
+            kind = "flat"
+
+        start = time.perf_counter()
+        index = make_index(kind, vectors.shape[1], n_vectors=n, nlist=nlist, pq_m=pq_m, hnsw_m=hnsw_m)
+        name = f"seg-{seg_id:06d}.index"
+        template = None
+        if needs_training(kind):
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(n, size=min(n, train_size), replace=False))
+            print(f"🏋️ Training {kind} on {len(sample)} of {n} vectors...")
+            index.train(np.ascontiguousarray(vectors[sample]))
+            # Trained-but-empty copy that future segments start from
+            template = f"template-{seg_id + 1:06d}.index"
+            _write_index_atomic(index, os.path.join(self.directory, template))
+
+        for i in range(0, n, ADD_BATCH):
+            index.add(np.ascontiguousarray(vectors[i:min(i + ADD_BATCH, n)]))
+        _write_index_atomic(index, os.path.join(self.directory, name))
+
+        with self._lock:
+            old = {s["file"] for s in snapshot}
+            old_template = self.manifest.get("template")
+            manifest = dict(self.manifest)
+            manifest["template"] = template
+            manifest["kind"] = requested
+            manifest["segments"] = [{"file": name, "rows": int(index.ntotal), "kind": kind}] + [
+                s for s in self.manifest["segments"] if s["file"] not in old
+            ]
+            self._write_manifest(manifest)
+            if self._keep_loaded:
+                self._loaded = {s["file"]: self._loaded.get(s["file"]) for s in manifest["segments"]}
+                self._loaded[name] = index
+                self._publish_view()
+
+            for f in old | ({old_template} if old_template else set()):
+                try:
+                    os.remove(os.path.join(self.directory, f))
+                except FileNotFoundError:
+                    pass
+
+        print(f"✅ Compacted {len(snapshot)} segment(s) into one {kind} index with {n} rows "
+              f"in {time.perf_counter() - start:.1f}s")
+        return index
+
+
+class Compactor:
+    """
+    Runs `SegmentedIndex.compact()` on a background thread once more than
+    MAX_SEGMENTS segments exist, so ingest never waits for a merge. The
+    merged segment keeps the index's current type (`target_kind()`, so a
+    `querycase-reindex --type` sticks), training it if needed; `kind`
+    overrides it.
+    """
+
+    def __init__(self, segments, max_segments=MAX_SEGMENTS, kind=None, vectors_path=VECTORS_PATH):
+        self.segments = segments
+        self.max_segments = max_segments
+        self.kind = kind
+        self.vectors_path = vectors_path
+        self._thread = None
+
+    def maybe_compact(self):
+        if not self.max_segments or len(self.segments.segments) <= self.max_segments:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        print(f"🧱 {len(self.segments.segments)} segments — compacting in the background")
+        self._thread = threading.Thread(target=self.segments.compact, name="compact",
+                                        kwargs={"kind": self.kind or self.segments.target_kind(),
+                                                "vectors_path": self.vectors_path})
+        self._thread.start()
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,264 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .config import SERVE_HOST, SERVE_PORT, SERVE_BATCH_WINDOW_MS, SERVE_MAX_BATCH, SEARCH_MODE
+from .index import open_engine, make_filter
+from .models import get_embedder
+from .metrics import REGISTRY, add_arguments, start_export, profiled, span, histogram
+from .config import METRICS_FILE, METRICS_PORT
+
+BATCH_QUERIES = histogram("querycase_serve_batch_queries", "Queries per micro-batch",
+                          buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+
+class MicroBatcher:
+    """
+    Collects queries from concurrent requests for up to `window_ms` (or
+    until `max_batch` queries are waiting) and answers them with a single
+    `engine.search_many()` call, so the model encode and FAISS search run
+    once per batch instead of once per request.
+    """
+
+    def __init__(self, engine, window_ms=SERVE_BATCH_WINDOW_MS, max_batch=SERVE_MAX_BATCH):
+        self.engine = engine
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.batches = 0
+        self.queries = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="search-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, queries, top_k=5, vectors=None, **options):
+        """
+        Queue `queries` for the next batch. `options` are passed on to
+        search_many (nprobe, ef_search, mode, filters); `vectors` are the
+        queries' embeddings if the caller already has them. Returns a Future
+        that resolves to one result list per query.
+        """
+        future = Future()
+        options = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in options.items()))
+        self._queue.put((list(queries), top_k, options, vectors, future))
+        return future
+
+    def _collect(self):
+        requests = [self._queue.get()]
+        waiting = len(requests[0][0])
+        deadline = time.monotonic() + self.window
+        while waiting < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            requests.append(request)
+            waiting += len(request[0])
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            # Index knobs, ranking and filters apply to the whole search, so batch per option set
+            groups = {}
+            for request in requests:
+                groups.setdefault(request[2], []).append(request)
+            for options, group in groups.items():
+                self._search(group, dict(options))
+
+    def _search(self, group, options):
+        queries = [q for request in group for q in request[0]]
+        top_k = max(request[1] for request in group)
+        # Use the callers' embeddings only if every request in the batch brought them
+        if all(request[3] is not None for request in group):
+            options["query_vectors"] = [v for request in group for v in request[3]]
+        BATCH_QUERIES.observe(len(queries))
+        try:
+            with span("serve.batch"):
+                results = self.engine.search_many(queries, top_k, **options)
+        except Exception as e:
+            for request in group:
+                request[-1].set_exception(e)
+            return
+        self.batches += 1
+        self.queries += len(queries)
+        start = 0
+        for request_queries, request_top_k, _, _, future in group:
+            end = start + len(request_queries)
+            future.set_result([r[:request_top_k] for r in results[start:end]])
+            start = end
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch": self.queries / self.batches if self.batches else 0.0,
+        }
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    """
+    POST /search  {"query": "..."} or {"queries": [...]}, optional
+                  "top_k", "nprobe", "ef_search", "mode" (vector / keyword / hybrid),
+                  "date_from" / "date_to" (YYYY-MM-DD), "courts" (list of codes),
+                  "case_ids" (list of ints), "group_by_case" (bool), "case_score" ("max" / "sum"),
+                  "vectors" (one query embedding per query, skips encoding),
+                  "bm25_stats" ({"docs", "tokens", "df": {term: df}} to score BM25 with)
+    POST /terms   {"terms": [...]}: BM25 documents, tokens and document frequencies
+    GET  /health  index row count, type, generation and courts
+    GET  /stats   micro-batching counters
+    GET  /metrics Prometheus metrics (spans, counters, histograms)
+    """
+
+    batcher = None  # set by make_server()
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        engine = self.batcher.engine
+        if self.path == "/health":
+            ready = engine.refresh()
+            self._send_json(200 if ready else 503, {
+                "status": "ok" if ready else "empty",
+                "rows": engine.ntotal,
+                "index_type": engine.index_kind() if ready else None,
+                "generation": engine.generation(),
+                "courts": engine.courts(),
+            })
+        elif self.path == "/stats":
+            self._send_json(200, self.batcher.stats())
+        elif self.path == "/metrics":
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path == "/terms":
+            self._terms()
+            return
+        if self.path != "/search":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            single = "query" in body
+            queries = [body["query"]] if single else body.get("queries")
+            if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+                raise ValueError("expected 'query' (string) or 'queries' (list of strings)")
+            top_k = int(body.get("top_k", 5))
+            nprobe = body.get("nprobe")
+            ef_search = body.get("ef_search")
+            mode = body.get("mode", SEARCH_MODE)
+            if mode not in ("vector", "keyword", "hybrid"):
+                raise ValueError("'mode' must be 'vector', 'keyword' or 'hybrid'")
+            filters = {k: body.get(k) for k in ("date_from", "date_to", "courts", "case_ids")}
+            if isinstance(filters["courts"], str):
+                filters["courts"] = [filters["courts"]]
+            if filters["case_ids"] is not None:
+                filters["case_ids"] = [int(c) for c in filters["case_ids"]]
+            vectors = body.get("vectors")
+            if vectors is not None and len(vectors) != len(queries):
+                raise ValueError("'vectors' must hold one embedding per query")
+            make_filter(**filters)  # reject bad dates up front
+            stats = body.get("bm25_stats")
+            if stats is not None:
+                # Hashable, to key micro-batches and the result cache
+                stats = (int(stats["docs"]), int(stats["tokens"]),
+                         tuple(sorted((str(term), int(df)) for term, df in stats["df"].items())))
+            grouping = {"group_by_case": bool(body.get("group_by_case", False)),
+                        "case_score": body.get("case_score", "max")}
+            if grouping["case_score"] not in ("max", "sum"):
+                raise ValueError("'case_score' must be 'max' or 'sum'")
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        options = {"bm25_stats": stats} if stats is not None else {}
+        try:
+            results = self.batcher.submit(
+                queries, top_k, vectors, nprobe=nprobe, ef_search=ef_search, mode=mode, **filters, **grouping,
+                **options
+            ).result() if queries else []
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        # Lets a shard coordinator notice new segments without polling /health
+        generation = self.batcher.engine.generation()
+        self._send_json(200, {"results": results[0] if single else results, "generation": generation})
+
+    def _terms(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            terms = json.loads(self.rfile.read(length) or b"{}").get("terms")
+            if not isinstance(terms, list) or not all(isinstance(t, str) for t in terms):
+                raise ValueError("expected 'terms' (list of strings)")
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        engine = self.batcher.engine
+        engine.refresh()
+        docs, tokens, df = engine.term_stats(terms)
+        self._send_json(200, {"docs": docs, "tokens": tokens, "df": df})
+
+    def log_message(self, format, *args):
+        pass  # keep the console quiet under load
+
+
+def make_server(host=SERVE_HOST, port=SERVE_PORT, engine=None,
+                window_ms=SERVE_BATCH_WINDOW_MS, max_batch=SERVE_MAX_BATCH):
+    """
+    Threaded HTTP server whose handlers share one engine (a SearchEngine,
+    or the shard coordinator with SHARDS set) through a MicroBatcher.
+    """
+    batcher = MicroBatcher(engine or open_engine(), window_ms=window_ms, max_batch=max_batch)
+    handler = type("BoundSearchHandler", (SearchHandler,), {"batcher": batcher})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Serve batched case search over HTTP.")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--window-ms", type=float, default=SERVE_BATCH_WINDOW_MS,
+                        help="How long to wait for concurrent requests to join a batch")
+    parser.add_argument("--max-batch", type=int, default=SERVE_MAX_BATCH, help="Max queries per batch")
+    add_arguments(parser)
+    args = parser.parse_args()
+    start_export(args.metrics_file or METRICS_FILE, args.metrics_port or METRICS_PORT)
+
+    # Load the embedding model up front so the first request doesn't pay for it
+    get_embedder()
+    server = make_server(args.host, args.port, window_ms=args.window_ms, max_batch=args.max_batch)
+    if not server.RequestHandlerClass.batcher.engine.refresh():
+        print("⚠️ Index is empty; serving anyway and picking up new segments as they appear.")
+    print(f"✅ Serving search on http://{args.host}:{args.port} (POST /search, GET /metrics)")
+    try:
+        with profiled(args.profile):
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,774 @@
+"""
+Sharded scatter-gather search.
+
+The index (FAISS segments, BM25 postings, metadata, stored vectors and
+chunk hashes) is split into SHARDS shards under SHARDS_DIR, by a hash of
+case_id or by date_filed range, so every chunk of a case lives in one
+shard. Each shard is an ordinary index directory searched by its own
+worker process (the HTTP search service over that shard); the coordinator
+encodes each query once, fans it out to every worker in parallel and
+merges the per-shard top-k. Shards are written, compacted and rebuilt
+independently: a rebuild of one shard only takes that shard's writer lock
+and its worker keeps serving the old segments until the new manifest is
+published.
+
+    querycase-shards split                # partition the existing single index
+    querycase-shards serve                # workers + coordinator on SERVE_PORT
+    querycase-shards rebuild --shard 2 --type ivf_pq
+    querycase-shards status
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from .config import (
+    SHARDS, SHARD_BY, SHARD_DATE_BOUNDS, SHARDS_DIR, SHARD_HOST, SHARD_BASE_PORT, SHARD_URLS,
+    SHARD_TIMEOUT, SHARD_PARTIAL_RESULTS, SHARD_TERM_CACHE_ENTRIES, SHARD_HEALTH_INTERVAL, SEGMENTS_DIR, VECTORS_PATH, INDEX_TYPE, IVF_NLIST, PQ_M, HNSW_M,
+    SEARCH_MODE, SEARCH_BATCH_SIZE, HYBRID_CANDIDATES, CASE_OVERFETCH, SNIPPETS_PER_CASE,
+    QUERY_EMBED_CACHE_ENTRIES, RESULT_CACHE_ENTRIES, SERVE_HOST, SERVE_PORT, SERVE_BATCH_WINDOW_MS,
+    SERVE_MAX_BATCH, METRICS_FILE, METRICS_PORT,
+)
+from .metastore import open_store, date_to_days, days_to_date
+from .ann import count_vectors, load_vectors
+from .bm25 import tokenize
+from .segments import SegmentedIndex
+from .embed import IndexWriter
+from .casestore import CaseTextStore
+from .cache import LRUCache
+from .index import (
+    SearchEngine, embed_queries, case_texts, reciprocal_rank_fusion, make_filter, normalize_query,
+    CACHE_LOOKUPS, SEARCH_QUERIES,
+)
+from .metrics import span, counter, add_arguments, start_export, profiled
+
+SHARD_ERRORS = counter("querycase_shard_errors_total", "Failed requests to shard workers", ("shard",))
+
+LAYOUT_FILE = "layout.json"
+SHARD_ID_BITS = 40  # merged hits are keyed shard << 40 | row for rank fusion
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)  # Fibonacci hashing: spreads sequential case ids evenly
+
+
+class ShardLayout:
+    """
+    Which shard each case belongs to, and where each shard's files live.
+    The layout is recorded in SHARDS_DIR/layout.json so a config change
+    can't silently route new cases to the wrong shard.
+    """
+
+    def __init__(self, shards=SHARDS, by=SHARD_BY, date_bounds=SHARD_DATE_BOUNDS, directory=SHARDS_DIR):
+        if by not in ("case_hash", "date"):
+            raise ValueError(f"Unknown SHARD_BY {by!r} (expected 'case_hash' or 'date')")
+        if by == "date":
+            if shards and shards != len(date_bounds) + 1:
+                raise ValueError(f"{len(date_bounds)} date bounds make {len(date_bounds) + 1} shards, not {shards}")
+            shards = len(date_bounds) + 1
+        if shards < 1:
+            raise ValueError("Sharding needs SHARDS >= 1")
+        self.shards = shards
+        self.by = by
+        self.date_bounds = [str(d) for d in date_bounds]
+        self.directory = directory
+        self._bounds = np.array(sorted(date_to_days(d) for d in self.date_bounds), dtype=np.int64)
+
+    def describe(self):
+        return {"shards": self.shards, "by": self.by, "date_bounds": self.date_bounds}
+
+    def check(self):
+        """
+        Record the layout on first use; refuse to run against shards that
+        were split differently.
+        """
+        path = os.path.join(self.directory, LAYOUT_FILE)
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored != self.describe():
+                raise RuntimeError(f"Shards in {self.directory} were split as {stored}, but the config says "
+                                   f"{self.describe()} — re-split the index or restore the config")
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.describe(), f, indent=2)
+        return self
+
+    def shard_of(self, case_ids, dates=None):
+        """
+        Shard of each case, from its id (case_hash) or ISO filing date
+        (date; unknown dates go to shard 0).
+        """
+        if self.by == "date":
+            days = np.array([date_to_days(d) for d in dates], dtype=np.int64)
+            return np.searchsorted(self._bounds, days, side="right")
+        ids = np.asarray(case_ids, dtype=np.int64).astype(np.uint64)
+        return ((ids * HASH_MULTIPLIER) >> np.uint64(32)) % np.uint64(self.shards)
+
+    def assign(self, metadata):
+        """
+        Shard of every metadata entry (one per chunk).
+        """
+        return self.shard_of([entry["case_id"] for entry in metadata],
+                             [entry.get("date_filed") for entry in metadata]).astype(np.int64)
+
+    def paths(self, shard):
+        """
+        IndexWriter / SearchEngine paths of one shard.
+        """
+        root = os.path.join(self.directory, f"shard-{shard:02d}")
+        os.makedirs(root, exist_ok=True)
+        return {
+            "segments_dir": os.path.join(root, "segments"),
+            "bm25_dir": os.path.join(root, "bm25"),
+            "meta_dir": os.path.join(root, "metadata"),
+            "vectors_path": os.path.join(root, "vectors.f32"),
+            "hashes_path": os.path.join(root, "chunk_hashes.i8"),
+        }
+
+
+# -----------------------------
+# Writing
+# -----------------------------
+
+class ShardedDedup:
+    """
+    The per-shard BatchDedup plans of one ingest batch, concatenated in
+    shard order. Duplicates are found within a shard only.
+    """
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.chunks = [c for part in parts for c in part.chunks]
+        self.metadata = [m for part in parts for m in part.metadata]
+        self.hashes = [h for part in parts for h in part.hashes]
+        self.total = sum(part.total for part in parts)
+        self.reused = sum(part.reused for part in parts)
+        self.skipped = sum(part.skipped for part in parts)
+
+    def embeddings(self, encoded, vectors=None):
+        encoded = np.asarray(encoded, dtype=np.float32)
+        out, start = [], 0
+        for part in self.parts:
+            end = start + len(part.chunks)
+            if part.metadata:
+                out.append(part.embeddings(encoded[start:end]))
+            start = end
+        return np.vstack(out) if out else np.empty((0, encoded.shape[-1]), dtype=np.float32)
+
+    def summary(self):
+        return (f"{self.total} chunks: {len(self.chunks)} to encode, "
+                f"{self.reused} duplicates reused, {self.skipped} skipped")
+
+
+class ShardedIndexWriter:
+    """
+    IndexWriter over every shard: each batch is split by shard and appended
+    to the shards it touches. Same interface as IndexWriter (ntotal, dedup,
+    append, close), so the ingest pipeline doesn't know about shards.
+
+    A shard's writer, and so its writer lock, is only opened when a batch
+    first routes rows to it. If `querycase-shards rebuild` holds that
+    shard's lock, the ingest waits for the rebuild instead of failing.
+    """
+
+    def __init__(self, layout=None):
+        self.layout = (layout or ShardLayout()).check()
+        self.writers = [None] * self.layout.shards
+
+    def shard_writer(self, shard):
+        if self.writers[shard] is None:
+            self.writers[shard] = IndexWriter(**self.layout.paths(shard), wait_for_lock=True)
+        return self.writers[shard]
+
+    def rows(self, shard):
+        """
+        Rows in one shard; read from its manifest if no batch has touched it yet.
+        """
+        if self.writers[shard] is not None:
+            return self.writers[shard].ntotal
+        segments = SegmentedIndex(self.layout.paths(shard)["segments_dir"], legacy_index_path=None)
+        segments.refresh(load=False)
+        return segments.ntotal
+
+    @property
+    def ntotal(self):
+        return sum(self.rows(shard) for shard in range(self.layout.shards))
+
+    def _split(self, metadata):
+        """
+        (shard, batch rows) of every shard the batch touches.
+        """
+        parts = self.layout.assign(metadata)
+        split = [(shard, np.flatnonzero(parts == shard)) for shard in range(self.layout.shards)]
+        return [(shard, rows) for shard, rows in split if len(rows)]
+
+    def dedup(self, chunks, new_metadata):
+        return ShardedDedup([
+            self.shard_writer(shard).dedup([chunks[i] for i in rows], [new_metadata[i] for i in rows])
+            for shard, rows in self._split(new_metadata)
+        ])
+
+    def append(self, embeddings, new_metadata, hashes=None):
+        if not len(embeddings):
+            return
+        for shard, rows in self._split(new_metadata):
+            self.shard_writer(shard).append(embeddings[rows], [new_metadata[i] for i in rows],
+                                            None if hashes is None else [hashes[i] for i in rows])
+
+    def close(self):
+        for writer in self.writers:
+            if writer is not None:
+                writer.close()
+
+
+def split_index(layout=None, batch_size=50000):
+    """
+    Partition the single index into shards, from its metadata store and
+    stored vectors. Row order is kept within each shard.
+    """
+    layout = layout or ShardLayout()
+    source = SegmentedIndex(SEGMENTS_DIR)
+    source.lock_for_writing()
+    try:
+        source.refresh(load=False)
+        n = source.ntotal
+        metadata = open_store()
+        if not n:
+            print("❌ Nothing to split.")
+            return 0
+        if count_vectors(VECTORS_PATH) < n:
+            raise RuntimeError(f"Only {count_vectors(VECTORS_PATH)} stored vectors for {n} index rows "
+                               "— run an ingest to backfill them first")
+        n = min(n, len(metadata))
+        vectors = load_vectors(VECTORS_PATH)
+        writer = ShardedIndexWriter(layout)
+        try:
+            if writer.ntotal:
+                raise RuntimeError(f"Shards in {layout.directory} already hold {writer.ntotal} rows")
+            print(f"🧩 Splitting {n} rows into {layout.shards} shards by {layout.by}...")
+            for start in range(0, n, batch_size):
+                end = min(start + batch_size, n)
+                writer.append(np.asarray(vectors[start:end]), [metadata[row] for row in range(start, end)])
+            rows = [writer.rows(shard) for shard in range(layout.shards)]
+        finally:
+            writer.close()
+    finally:
+        source.unlock()
+    print(f"✅ Split {n} rows: " + ", ".join(f"shard {i}: {r}" for i, r in enumerate(rows)))
+    return n
+
+
+# -----------------------------
+# Searching
+# -----------------------------
+
+def shard_urls(layout=None, host=SHARD_HOST, base_port=SHARD_BASE_PORT):
+    """
+    Worker URLs: SHARD_URLS if set, else one local port per shard.
+    """
+    if SHARD_URLS:
+        return list(SHARD_URLS)
+    layout = layout or ShardLayout()
+    return [f"http://{host}:{base_port + shard}" for shard in range(layout.shards)]
+
+
+def group_hits(hits, top_k, case_score="max", snippets=SNIPPETS_PER_CASE):
+    """
+    Group one query's merged chunk results (best first) by case_id, like
+    SearchEngine.case_results_for: a case scores the max (or sum) of its
+    chunk scores and carries its best `snippets` snippets.
+    """
+    if case_score not in ("max", "sum"):
+        raise ValueError(f"Unknown case_score {case_score!r} (expected 'max' or 'sum')")
+    cases = {}
+    for hit in hits:
+        case = cases.get(hit["case_id"])
+        if case is None:
+            case = cases[hit["case_id"]] = dict(hit, snippets=[], matched_chunks=0)
+        elif case_score == "sum":
+            case["score"] += hit["score"]
+        case["matched_chunks"] += 1
+        if len(case["snippets"]) < snippets:
+            case["snippets"].append(hit["snippet"])
+    return sorted(cases.values(), key=lambda case: case["score"], reverse=True)[:top_k]
+
+
+class ShardedSearchEngine:
+    """
+    Search coordinator with the SearchEngine interface (search, search_many,
+    refresh, courts, case_texts, ...) over the shard workers, so the web
+    app, search_cases() and the HTTP service work unchanged.
+
+    Queries are encoded here once and the vectors sent along, so workers
+    never load the embedding model. Vector scores (1 / (1 + L2)) compare
+    across shards and merge exactly. For BM25, the shards' document counts
+    and term document frequencies are summed here and sent along, so every
+    shard scores with the statistics of the whole collection and keyword
+    results match the single index too. Hybrid asks every shard for its
+    vector and keyword candidates and fuses the merged lists here. Case
+    grouping is done after the merge, which is exact because a case never
+    spans shards.
+
+    A shard that doesn't answer within SHARD_TIMEOUT is left out of the
+    results (SHARD_PARTIAL_RESULTS) or fails the search; partial results
+    aren't cached. Worker health is checked every `health_interval`
+    seconds, or on the next query once a search answer carries a new
+    shard generation.
+    """
+
+    def __init__(self, urls=None, model=None, timeout=SHARD_TIMEOUT, partial=SHARD_PARTIAL_RESULTS,
+                 health_interval=SHARD_HEALTH_INTERVAL):
+        self.urls = [url.rstrip("/") for url in (urls or shard_urls())]
+        self.model = model
+        self.timeout = timeout
+        self.partial = partial
+        self.health_interval = health_interval
+        self.health = [None] * len(self.urls)
+        self._checked = None  # time.monotonic() of the last /health round
+        self.texts = None
+        self.embedding_cache = LRUCache(QUERY_EMBED_CACHE_ENTRIES)
+        self.result_cache = LRUCache(RESULT_CACHE_ENTRIES)
+        self.term_cache = LRUCache(SHARD_TERM_CACHE_ENTRIES)
+        self._collection = None  # (documents, tokens) over all shards
+        self._result_generation = None
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.urls), pool_maxsize=4 * len(self.urls))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=2 * len(self.urls), thread_name_prefix="shard")
+
+    def _failed(self, shard, error):
+        SHARD_ERRORS.inc(shard=str(shard))
+        if not self.partial:
+            raise RuntimeError(f"Shard {shard} ({self.urls[shard]}) failed: {error}")
+        print(f"⚠️ Shard {shard} ({self.urls[shard]}) failed: {error}")
+
+    def _health(self, shard):
+        try:
+            # An empty shard answers 503 with its health as usual
+            return self._session.get(f"{self.urls[shard]}/health", timeout=self.timeout).json()
+        except (requests.RequestException, ValueError) as e:
+            return e
+
+    def _post(self, shard, path, body):
+        try:
+            response = self._session.post(f"{self.urls[shard]}{path}", json=body, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            return e
+
+    def _search(self, shard, body):
+        answer = self._post(shard, "/search", body)
+        if isinstance(answer, Exception):
+            return answer
+        if "results" not in answer:
+            return ValueError(f"unexpected answer {answer!r}")
+        h = self.health[shard]
+        if h and "generation" in answer and answer["generation"] != h["generation"]:
+            self._checked = None  # the shard published new segments: re-check health on the next query
+        return answer["results"]
+
+    def refresh(self):
+        """
+        Ask every worker for its health (rows, index type, generation), if
+        the last answers are older than health_interval or a shard changed
+        since. Returns False if no shard has anything to search.
+        """
+        now = time.monotonic()
+        if self._checked is None or now - self._checked >= self.health_interval:
+            health = list(self._pool.map(self._health, range(len(self.urls))))
+            for shard, h in enumerate(health):
+                if isinstance(h, Exception):
+                    health[shard] = None
+                    self._failed(shard, h)
+            self.health = health
+            self._checked = now
+            if self.texts is None:
+                self.texts = CaseTextStore()
+            else:
+                self.texts.refresh()
+        return any(h and h["status"] == "ok" for h in self.health)
+
+    def _live(self):
+        return [shard for shard, h in enumerate(self.health) if h and h["status"] == "ok"]
+
+    def generation(self):
+        return tuple(json.dumps(h["generation"]) if h else None for h in self.health)
+
+    @property
+    def ntotal(self):
+        return sum(h["rows"] for h in self.health if h)
+
+    def index_kind(self):
+        kinds = {self.health[shard]["index_type"] for shard in self._live()}
+        if len(kinds) > 1:
+            return "mixed"
+        return kinds.pop() if kinds else None
+
+    def courts(self):
+        return sorted({code for h in self.health if h for code in h.get("courts") or ()})
+
+    def cache_stats(self):
+        return {"embeddings": self.embedding_cache.stats(), "results": self.result_cache.stats()}
+
+    def embed_queries(self, queries, batch_size=SEARCH_BATCH_SIZE):
+        return embed_queries(queries, self.embedding_cache, self.model, batch_size)
+
+    def term_stats(self, terms):
+        """
+        BM25 documents, tokens and document frequencies of `terms` summed
+        over the live shards, i.e. those of the unsharded index. Cached
+        until a shard's generation changes; only unseen terms are asked for.
+        """
+        df = {term: self.term_cache.get(term) for term in set(terms)}
+        missing = sorted(term for term, count in df.items() if count is None)
+        if not missing and self._collection is not None:
+            return self._collection + (df,)
+        shards = self._live()
+        futures = [(shard, self._pool.submit(self._post, shard, "/terms", {"terms": missing})) for shard in shards]
+        complete = len(shards) == len(self.urls)
+        docs = tokens = 0
+        df.update((term, 0) for term in missing)
+        for shard, future in futures:
+            answer = future.result()
+            if isinstance(answer, Exception):
+                self._failed(shard, answer)
+                complete = False
+                continue
+            docs += answer["docs"]
+            tokens += answer["tokens"]
+            for term in missing:
+                df[term] += answer["df"].get(term, 0)
+        if complete:
+            self._collection = (docs, tokens)
+            for term in missing:
+                self.term_cache.put(term, df[term])
+        return docs, tokens, df
+
+    def case_texts(self, results, max_cases=3, max_chars=3000, min_chars=300):
+        if self.texts is None:
+            return []
+        return case_texts(self.texts, results, max_cases, max_chars, min_chars)
+
+    def _scatter(self, body, vectors, modes, bm25_stats=None):
+        """
+        POST the search to every live shard once per mode (vectors only
+        go with vector searches, BM25 statistics with keyword ones). Returns {mode: [per-shard results]} with
+        None for shards that failed, and whether every shard answered.
+        """
+        shards = self._live()
+        complete = len(shards) == len(self.urls)
+        for shard, h in enumerate(self.health):
+            if h is None:
+                complete = False
+        futures = {}
+        for mode in modes:
+            request = dict(body, mode=mode)
+            if mode == "vector":
+                request["vectors"] = vectors
+            elif bm25_stats:
+                request["bm25_stats"] = bm25_stats
+            for shard in shards:
+                futures[mode, shard] = self._pool.submit(self._search, shard, request)
+        answers = {mode: [] for mode in modes}
+        for (mode, shard), future in futures.items():
+            result = future.result()
+            if isinstance(result, Exception):
+                self._failed(shard, result)
+                complete = False
+                continue
+            for hit in (h for hits in result for h in hits):
+                hit["shard"] = shard
+            answers[mode].append(result)
+        return answers, complete
+
+    def search(self, query, top_k=5, nprobe=None, ef_search=None, mode=SEARCH_MODE,
+               date_from=None, date_to=None, courts=None, case_ids=None, group_by_case=False, case_score="max"):
+        return self.search_many([query], top_k, nprobe=nprobe, ef_search=ef_search, mode=mode,
+                                date_from=date_from, date_to=date_to, courts=courts, case_ids=case_ids,
+                                group_by_case=group_by_case, case_score=case_score)[0]
+
+    def search_many(self, queries, top_k=5, nprobe=None, ef_search=None, mode=SEARCH_MODE,
+                    date_from=None, date_to=None, courts=None, case_ids=None, group_by_case=False,
+                    case_score="max", batch_size=SEARCH_BATCH_SIZE, query_vectors=None):
+        """
+        Same results as SearchEngine.search_many, gathered from the shards.
+        """
+        if mode not in ("vector", "keyword", "hybrid"):
+            raise ValueError(f"Unknown search mode {mode!r} (expected 'vector', 'keyword' or 'hybrid')")
+        filters = make_filter(date_from, date_to, courts, case_ids)
+        if not queries:
+            return []
+        if not self.refresh():
+            return [[] for _ in queries]
+
+        generation = self.generation()
+        if generation != self._result_generation:
+            # A shard changed: cached results and BM25 statistics are stale
+            self.result_cache.clear()
+            self.term_cache.clear()
+            self._collection = None
+            self._result_generation = generation
+        grouping = (case_score,) if group_by_case else None
+        keys = [(normalize_query(q), top_k, nprobe, ef_search, mode, filters, grouping, generation) for q in queries]
+        results = [self.result_cache.get(k) for k in keys]
+        todo = [i for i, r in enumerate(results) if r is None]
+        SEARCH_QUERIES.inc(len(queries), mode=mode)
+        CACHE_LOOKUPS.inc(len(keys) - len(todo), cache="results", outcome="hit")
+        CACHE_LOOKUPS.inc(len(todo), cache="results", outcome="miss")
+        if not todo:
+            return [list(r) for r in results]
+
+        todo_queries = [queries[i] for i in todo]
+        fetch_k = top_k * CASE_OVERFETCH if group_by_case else top_k
+        depth = fetch_k * HYBRID_CANDIDATES if mode == "hybrid" else fetch_k
+        vectors = None
+        if mode != "keyword":
+            if query_vectors is not None:
+                vectors = np.asarray(query_vectors, dtype=np.float32)[todo]
+            else:
+                vectors = self.embed_queries(todo_queries, batch_size=batch_size)
+            vectors = vectors.tolist()
+        # Send the parsed filter: dates as YYYY-MM-DD whatever the caller passed (str or date)
+        days_from, days_to, court_codes, filter_ids = filters or (None, None, (), ())
+        body = {"queries": todo_queries, "top_k": depth, "nprobe": nprobe, "ef_search": ef_search,
+                "date_from": None if days_from is None else days_to_date(days_from),
+                "date_to": None if days_to is None else days_to_date(days_to),
+                "courts": list(court_codes) or None, "case_ids": list(filter_ids) or None}
+        bm25_stats = None
+        if mode != "vector":
+            with span("shards.terms"):
+                docs, tokens, df = self.term_stats(t for q in todo_queries for t in tokenize(q))
+            if docs:
+                bm25_stats = {"docs": docs, "tokens": tokens, "df": df}
+        modes = ("vector", "keyword") if mode == "hybrid" else (mode,)
+        with span("shards.scatter"):
+            answers, complete = self._scatter(body, vectors, modes, bm25_stats)
+
+        with span("shards.merge"):
+            for n, i in enumerate(todo):
+                # Per mode: every shard's hits for this query, best score first
+                merged = {m: sorted((hit for shard_hits in answers[m] for hit in shard_hits[n]),
+                                    key=lambda hit: hit["score"], reverse=True)[:depth] for m in modes}
+                if mode == "hybrid":
+                    hits = self._fuse(merged["vector"], merged["keyword"], fetch_k)
+                else:
+                    hits = merged[mode]
+                if group_by_case:
+                    results[i] = group_hits(hits, top_k, case_score)
+                else:
+                    results[i] = hits[:top_k]
+                if complete:
+                    self.result_cache.put(keys[i], results[i])
+        return [list(r) for r in results]
+
+    def _fuse(self, vector_hits, keyword_hits, top_k):
+        by_id = {}
+        rankings = []
+        for hits in (vector_hits, keyword_hits):
+            ids = [(hit["shard"] << SHARD_ID_BITS) | hit["row"] for hit in hits]
+            by_id.update(zip(ids, hits))
+            rankings.append(np.array(ids, dtype=np.int64))
+        ids, scores = reciprocal_rank_fusion(rankings, top_k)
+        return [dict(by_id[key], score=float(score)) for key, score in zip(ids.tolist(), scores.tolist())]
+
+
+# -----------------------------
+# Processes
+# -----------------------------
+
+def run_worker(shard, host=SHARD_HOST, port=None, window_ms=SERVE_BATCH_WINDOW_MS,
+               max_batch=SERVE_MAX_BATCH, layout=None):
+    """
+    Serve one shard over HTTP (the search service over the shard's files).
+    The model is only loaded if a request comes without vectors.
+    """
+    import faiss
+    from .server import make_server
+
+    layout = (layout or ShardLayout()).check()
+    if not 0 <= shard < layout.shards:
+        raise SystemExit(f"❌ Shard {shard} is out of range (0..{layout.shards - 1})")
+    port = SHARD_BASE_PORT + shard if port is None else port
+    # Shards share the machine's cores
+    faiss.omp_set_num_threads(max(1, (os.cpu_count() or 1) // layout.shards))
+    paths = layout.paths(shard)
+    engine = SearchEngine(paths["segments_dir"], paths["meta_dir"], bm25_dir=paths["bm25_dir"],
+                          vectors_path=paths["vectors_path"])
+    server = make_server(host, port, engine=engine, window_ms=window_ms, max_batch=max_batch)
+    rows = engine.index.ntotal if engine.refresh() else 0
+    print(f"✅ Shard {shard} ({rows} rows) serving on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class WorkerSupervisor:
+    """
+    Runs one worker process per shard and restarts any that exit.
+    """
+
+    def __init__(self, layout, host=SHARD_HOST, base_port=SHARD_BASE_PORT, window_ms=SERVE_BATCH_WINDOW_MS,
+                 max_batch=SERVE_MAX_BATCH):
+        self.layout = layout
+        self.host = host
+        self.base_port = base_port
+        self.options = ["--window-ms", str(window_ms), "--max-batch", str(max_batch)]
+        self.processes = [None] * layout.shards
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="shard-supervisor", daemon=True)
+
+    def _spawn(self, shard):
+        return subprocess.Popen([sys.executable, "-m", "querycase.shards", "worker", "--shard", str(shard),
+                                 "--host", self.host, "--port", str(self.base_port + shard)] + self.options)
+
+    def start(self):
+        for shard in range(self.layout.shards):
+            self.processes[shard] = self._spawn(shard)
+        self._thread.start()
+        return self
+
+    def urls(self):
+        return [f"http://{self.host}:{self.base_port + shard}" for shard in range(self.layout.shards)]
+
+    def wait_ready(self, timeout=120.0):
+        deadline = time.monotonic() + timeout
+        for url in self.urls():
+            while True:
+                try:
+                    requests.get(f"{url}/health", timeout=1.0)
+                    break
+                except requests.RequestException:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Shard worker at {url} didn't start")
+                    time.sleep(0.2)
+
+    def _watch(self):
+        while not self._stopped.wait(1.0):
+            for shard, process in enumerate(self.processes):
+                if process.poll() is not None and not self._stopped.is_set():
+                    print(f"⚠️ Shard {shard} worker exited ({process.returncode}) — restarting")
+                    self.processes[shard] = self._spawn(shard)
+
+    def stop(self):
+        self._stopped.set()
+        for process in self.processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                process.wait()
+
+
+def serve(args):
+    from .models import get_embedder
+    from .server import make_server
+
+    layout = ShardLayout().check()
+    supervisor = WorkerSupervisor(layout, args.shard_host, args.base_port, args.window_ms, args.max_batch).start()
+    try:
+        supervisor.wait_ready()
+        if args.workers_only:
+            print(f"✅ {layout.shards} shard workers running (Ctrl+C to stop)")
+            while True:
+                time.sleep(3600)
+        start_export(args.metrics_file or METRICS_FILE, args.metrics_port or METRICS_PORT)
+        # Queries are encoded here, once, not on the workers
+        get_embedder()
+        engine = ShardedSearchEngine(supervisor.urls())
+        server = make_server(args.host, args.port, engine=engine, window_ms=args.window_ms, max_batch=args.max_batch)
+        if not engine.refresh():
+            print("⚠️ All shards are empty; serving anyway and picking up new segments as they appear.")
+        print(f"✅ Serving sharded search ({layout.shards} shards) on http://{args.host}:{args.port}")
+        try:
+            with profiled(args.profile):
+                server.serve_forever()
+        finally:
+            server.server_close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+
+def status(layout=None):
+    layout = layout or ShardLayout()
+    urls = shard_urls(layout)
+    print(f"🧩 {layout.shards} shards by {layout.by} in {layout.directory}")
+    for shard in range(layout.shards):
+        paths = layout.paths(shard)
+        segments = SegmentedIndex(paths["segments_dir"], legacy_index_path=None)
+        segments.refresh(load=False)
+        try:
+            health = requests.get(f"{urls[shard]}/health", timeout=2.0).json()
+            worker = f"worker up ({health['status']})"
+        except (requests.RequestException, ValueError):
+            worker = "worker down"
+        print(f"  shard {shard}: {segments.ntotal} rows in {len(segments.segments)} segment(s), "
+              f"{segments.kind() if segments.ntotal else '-'}; {urls[shard]} {worker}")
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Split, serve and rebuild the sharded index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("split", help="Partition the single index into SHARDS shards")
+
+    serve_parser = commands.add_parser("serve", help="Start a worker per shard plus the coordinator")
+    serve_parser.add_argument("--host", default=SERVE_HOST, help="Coordinator host")
+    serve_parser.add_argument("--port", type=int, default=SERVE_PORT, help="Coordinator port")
+    serve_parser.add_argument("--shard-host", default=SHARD_HOST)
+    serve_parser.add_argument("--base-port", type=int, default=SHARD_BASE_PORT, help="Port of shard 0's worker")
+    serve_parser.add_argument("--workers-only", action="store_true",
+                              help="Only run the workers (search_cases() in other processes coordinates)")
+    serve_parser.add_argument("--window-ms", type=float, default=SERVE_BATCH_WINDOW_MS)
+    serve_parser.add_argument("--max-batch", type=int, default=SERVE_MAX_BATCH)
+    add_arguments(serve_parser)
+
+    worker_parser = commands.add_parser("worker", help="Serve one shard (started by `serve`)")
+    worker_parser.add_argument("--shard", type=int, required=True)
+    worker_parser.add_argument("--host", default=SHARD_HOST)
+    worker_parser.add_argument("--port", type=int, default=None, help="Default: SHARD_BASE_PORT + shard")
+    worker_parser.add_argument("--window-ms", type=float, default=SERVE_BATCH_WINDOW_MS)
+    worker_parser.add_argument("--max-batch", type=int, default=SERVE_MAX_BATCH)
+
+    rebuild_parser = commands.add_parser("rebuild", help="Compact and rebuild one shard's index")
+    rebuild_parser.add_argument("--shard", type=int, required=True)
+    rebuild_parser.add_argument("--type", default=INDEX_TYPE)
+    rebuild_parser.add_argument("--nlist", type=int, default=IVF_NLIST)
+    rebuild_parser.add_argument("--pq-m", type=int, default=PQ_M)
+    rebuild_parser.add_argument("--hnsw-m", type=int, default=HNSW_M)
+
+    commands.add_parser("status", help="Rows, segments and worker health per shard")
+    args = parser.parse_args()
+
+    if args.command == "split":
+        split_index()
+    elif args.command == "serve":
+        serve(args)
+    elif args.command == "worker":
+        run_worker(args.shard, args.host, args.port, args.window_ms, args.max_batch)
+    elif args.command == "rebuild":
+        from .reindex import rebuild_index
+        layout = ShardLayout().check()
+        if not 0 <= args.shard < layout.shards:
+            raise SystemExit(f"❌ Shard {args.shard} is out of range (0..{layout.shards - 1})")
+        paths = layout.paths(args.shard)
+        # Only this shard's writer lock is taken; the other shards keep ingesting and serving
+        rebuild_index(args.type, segments_dir=paths["segments_dir"], vectors_path=paths["vectors_path"],
+                      nlist=args.nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m)
+    elif args.command == "status":
+        status()
+
+
+if __name__ == "__main__":
+    run()
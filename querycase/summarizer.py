@@ -1,25 +1,269 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .cache import LRUCache, DiskCache, TieredCache, content_key
+from .config import (
+    SUMMARY_CACHE_DIR, SUMMARY_CACHE_MAX_BYTES, SUMMARY_CACHE_ENTRIES,
+    SUMMARY_BATCH_SIZE, SUMMARY_INPUT_CHARS,
+    SUMMARY_MODE, SUMMARY_SEGMENT_TOKENS, SUMMARY_MAX_SEGMENTS, SUMMARY_MAP_WORKERS,
+    SUMMARY_MAP_LENGTH, SUMMARY_REDUCE_LENGTH, SUMMARY_NUM_BEAMS, SUMMARY_TIME_BUDGET,
+)
+from .casestore import CaseSummaryStore
+from .chunking import token_windows
+from .models import get_summarizer, summary_model_id
+from .metrics import span, counter
 
-# Load BART model and tokenizer
-model_name = "facebook/bart-large-cnn"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+SUMMARY_CACHE_LOOKUPS = counter("querycase_summary_cache_total", "Summary cache lookups", ("outcome",))
+SUMMARY_SEGMENTS = counter("querycase_summary_segments_total", "Map-reduce summary segments", ("outcome",))
+
+SUMMARY_MODES = ("truncate", "map_reduce")
+
+# Summaries keyed by a hash of the exact model input and generation settings
+summary_cache = TieredCache(
+    LRUCache(SUMMARY_CACHE_ENTRIES),
+    DiskCache(SUMMARY_CACHE_DIR, SUMMARY_CACHE_MAX_BYTES) if SUMMARY_CACHE_MAX_BYTES else None,
+)
+
+def summarize_texts(query, texts, max_tokens=3000, use_cache=True, mode=SUMMARY_MODE):
+    if mode == "map_reduce":
+        return summarize_hierarchical(query, texts, use_cache=use_cache)
+    if mode != "truncate":
+        raise ValueError(f"Unknown summary mode {mode!r} (expected one of {SUMMARY_MODES})")
 
-def summarize_texts(query, texts, max_tokens=3000):
     combined = " ".join(texts).replace("\n", " ")
     input_text = combined[:max_tokens]
 
-    # Tokenize input
-    inputs = tokenizer(input_text, return_tensors="pt", max_length=1024, truncation=True)
-    
+    generation = {
+        "max_length": 300,
+        "min_length": 80,
+        "no_repeat_ngram_size": 2,
+        "forced_bos_token_id": 0,
+    }
+    key = content_key(summary_model_id(), input_text, generation)
+    if use_cache:
+        summary = summary_cache.get(key)
+        SUMMARY_CACHE_LOOKUPS.inc(outcome="hit" if summary is not None else "miss")
+        if summary is not None:
+            return summary
+
+    # Tokenize input (the BART model loads on the first cache miss)
+    with span("summary.load"):
+        tokenizer, model = get_summarizer()
+    with span("summary.tokenize"):
+        inputs = tokenizer(input_text, return_tensors="pt", max_length=1024, truncation=True)
+
     # Generate summary
-    summary_ids = model.generate(
-        inputs["input_ids"],
-        max_length=300,
-        min_length=80,
-        no_repeat_ngram_size=2,
-        forced_bos_token_id=0
-    )
+    with span("summary.generate"):
+        summary_ids = model.generate(inputs["input_ids"], **generation)
     summary = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-    
+
+    if use_cache:
+        summary_cache.put(key, summary)
     return summary
+
+def summarize_batch(texts, batch_size=SUMMARY_BATCH_SIZE, max_length=200, min_length=60):
+    """
+    Summarize several independent texts, `batch_size` at a time, with one
+    padded generate() call per batch. Returns one summary per text.
+    """
+    with span("summary.load"):
+        tokenizer, model = get_summarizer()
+    summaries = []
+    for i in range(0, len(texts), batch_size):
+        batch = [t.replace("\n", " ") for t in texts[i:i + batch_size]]
+        summaries.extend(_generate(tokenizer, model, batch, max_length, min_length))
+    return summaries
+
+def _generate(tokenizer, model, texts, max_length, min_length, **generation):
+    # One padded generate() call for a batch of inputs
+    with span("summary.tokenize"):
+        inputs = tokenizer(texts, return_tensors="pt", max_length=1024, truncation=True, padding=True)
+    with span("summary.generate"):
+        summary_ids = model.generate(
+            inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            max_length=max_length,
+            min_length=min_length,
+            no_repeat_ngram_size=2,
+            forced_bos_token_id=0,
+            **generation,
+        )
+    return tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+
+def _query_terms(query):
+    return {w for w in re.findall(r"\w+", query.lower()) if len(w) > 2}
+
+def _relevance(text, terms):
+    # Query-term occurrences per segment; cheap and good enough to rank a few dozen segments
+    return sum(1 for w in re.findall(r"\w+", text.lower()) if w in terms)
+
+def _prioritize(segments, terms):
+    """
+    Order (case, position, text) segments for summarizing: the opening
+    segment of every case first (background and holding), then the rest
+    by query relevance, ties in document order.
+    """
+    scores = [_relevance(text, terms) for _, _, text in segments]
+    return sorted(range(len(segments)), key=lambda i: (segments[i][1] > 0, -scores[i], i))
+
+def _map_segments(tokenizer, model, texts, batch_size, workers, deadline, reserve, generation, use_cache=True):
+    """
+    Summarize `texts` (highest priority first) in padded batches on
+    `workers` threads. A batch is only started if the running average
+    batch time says it ends, with `reserve` times that left for the
+    reduce step, before `deadline`; the rest are dropped (None).
+    """
+    out = [None] * len(texts)
+    keys = [content_key(summary_model_id(), "segment", text, generation) for text in texts]
+    todo = []
+    for i, key in enumerate(keys):
+        out[i] = summary_cache.get(key) if use_cache else None
+        if out[i] is None:
+            todo.append(i)
+    SUMMARY_SEGMENTS.inc(len(texts) - len(todo), outcome="cached")
+    batches = deque(todo[i:i + batch_size] for i in range(0, len(todo), batch_size))
+
+    durations = []
+
+    def run(batch):
+        start = time.perf_counter()
+        summaries = _generate(tokenizer, model, [texts[i] for i in batch], **generation)
+        durations.append(time.perf_counter() - start)
+        return batch, summaries
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="summarize") as pool:
+        running = deque()
+        while batches or running:
+            while batches and len(running) < max(1, workers):
+                expected = sum(durations) / len(durations) if durations else 0.0
+                if deadline is not None and (durations or running) and \
+                        time.perf_counter() + expected * (1 + reserve) > deadline:
+                    break
+                running.append(pool.submit(run, batches.popleft()))
+            if not running:
+                break
+            batch, summaries = running.popleft().result()
+            for i, summary in zip(batch, summaries):
+                out[i] = summary
+                if use_cache:
+                    summary_cache.put(keys[i], summary)
+            SUMMARY_SEGMENTS.inc(len(batch), outcome="summarized")
+    SUMMARY_SEGMENTS.inc(sum(len(b) for b in batches), outcome="dropped")
+    return out, (sum(durations) / len(durations) if durations else 0.0)
+
+def _reduce(tokenizer, model, parts, max_tokens, batch_size, deadline, expected, map_generation):
+    """
+    Merge partial summaries until they fit one model input: pack them into
+    groups of at most `max_tokens` tokens and summarize each group, level
+    by level, while there is time left. Order is kept, so the most
+    relevant parts stay in front.
+    """
+    while len(parts) > 1:
+        lengths = [len(ids) for ids in tokenizer(parts, add_special_tokens=False)["input_ids"]]
+        if sum(lengths) <= max_tokens:
+            break
+        if deadline is not None and time.perf_counter() + 2 * expected > deadline:
+            break   # out of time: the final call truncates instead
+        groups, current, size = [], [], 0
+        for part, n in zip(parts, lengths):
+            if current and size + n > max_tokens:
+                groups.append(" ".join(current))
+                current, size = [], 0
+            current.append(part)
+            size += n
+        groups.append(" ".join(current))
+        if len(groups) == len(parts):
+            break
+        parts = []
+        for i in range(0, len(groups), batch_size):
+            parts.extend(_generate(tokenizer, model, groups[i:i + batch_size], **map_generation))
+    return " ".join(parts)
+
+def summarize_hierarchical(query, texts, time_budget=SUMMARY_TIME_BUDGET, max_segments=SUMMARY_MAX_SEGMENTS,
+                           segment_tokens=SUMMARY_SEGMENT_TOKENS, batch_size=SUMMARY_BATCH_SIZE,
+                           workers=SUMMARY_MAP_WORKERS, map_length=SUMMARY_MAP_LENGTH,
+                           reduce_length=SUMMARY_REDUCE_LENGTH, num_beams=SUMMARY_NUM_BEAMS, use_cache=True):
+    """
+    Map-reduce summary of whole opinions for `query`:
+
+    - map: each text is split into segments of at most `segment_tokens`
+      BART tokens on paragraph / sentence boundaries; up to `max_segments`
+      of them (each case's opening, then the most query-relevant) are
+      summarized `batch_size` at a time, one padded generate() per batch.
+      Segment summaries don't depend on the query and are cached.
+    - reduce: the segment summaries, most relevant first, are merged into
+      one final summary (summarizing groups of them first if they don't
+      fit one input). BART puts most weight on the start of its input, so
+      the ordering is what makes the summary query-focused.
+
+    `time_budget` (seconds) bounds the whole call: segments that won't
+    finish in time are dropped, and a single segment summary is returned
+    as is. `map_length` / `reduce_length` are (min, max) generated tokens.
+    """
+    deadline = time.perf_counter() + time_budget if time_budget else None
+    settings = {
+        "segment_tokens": segment_tokens, "max_segments": max_segments, "map_length": list(map_length),
+        "reduce_length": list(reduce_length), "num_beams": num_beams,
+    }
+    key = content_key(summary_model_id(), "map_reduce", query, texts, settings)
+    if use_cache:
+        summary = summary_cache.get(key)
+        SUMMARY_CACHE_LOOKUPS.inc(outcome="hit" if summary is not None else "miss")
+        if summary is not None:
+            return summary
+
+    with span("summary.load"):
+        tokenizer, model = get_summarizer()
+    with span("summary.segment"):
+        segments = [(case, position, segment)
+                    for case, windows in enumerate(token_windows(texts, tokenizer, segment_tokens))
+                    for position, segment in enumerate(windows)]
+    if not segments:
+        return ""
+
+    map_generation = {"min_length": map_length[0], "max_length": map_length[1],
+                      "num_beams": num_beams, "early_stopping": True}
+    reduce_generation = {"min_length": reduce_length[0], "max_length": reduce_length[1]}
+    if len(segments) == 1:
+        # Everything fits one input: a single call, as in "truncate" mode but without cutting the text
+        with span("summary.reduce"):
+            summary = _generate(tokenizer, model, [segments[0][2]], **reduce_generation)[0]
+    else:
+        order = _prioritize(segments, _query_terms(query))[:max_segments]
+        reserve = reduce_length[1] / map_length[1]
+        with span("summary.map"):
+            partial, expected = _map_segments(tokenizer, model, [segments[i][2] for i in order], batch_size,
+                                              workers, deadline, reserve, map_generation, use_cache)
+        parts = [p for p in partial if p]
+        if len(parts) <= 1:
+            summary = parts[0] if parts else ""
+        else:
+            with span("summary.reduce"):
+                combined = _reduce(tokenizer, model, parts, segment_tokens, batch_size, deadline, expected,
+                                   map_generation)
+                summary = _generate(tokenizer, model, [combined], **reduce_generation)[0]
+
+    if use_cache:
+        summary_cache.put(key, summary)
+    return summary
+
+def summarize_cases(cases, store=None, batch_size=SUMMARY_BATCH_SIZE):
+    """
+    Summarize each case that doesn't have a stored summary yet and save the
+    results in the case summary store. Returns the number summarized.
+    """
+    store = store or CaseSummaryStore()
+    todo = [c for c in cases if c["id"] not in store and len(c.get("opinion_text", "")) >= 300]
+    if not todo:
+        return 0
+    texts = [c["opinion_text"][:SUMMARY_INPUT_CHARS] for c in todo]
+    summaries = summarize_batch(texts, batch_size=batch_size)
+    store.put_many({c["id"]: summary for c, summary in zip(todo, summaries)})
+    return len(todo)
+
+def cache_stats():
+    """
+    Hit/miss counts and hit rate of the summary cache (overall, memory, disk).
+    """
+    return summary_cache.stats()
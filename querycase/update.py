@@ -1,6 +1,12 @@
 #from querycase.fetch import fetch_new_cases
+import argparse
 from querycase.fetch import fetch_new_case_batches
-from querycase.embed import embed_and_update_index
+from querycase.embed import embed_and_update_index, chunk_cases, encode_chunks, cleanup_case_files, open_writer
+from querycase.pipeline import Pipeline, Stage
+from querycase.casestore import CaseTextStore
+from querycase.ledger import get_ledger
+from querycase.config import INGEST_SUMMARIES, SUMMARY_WORKERS, METRICS_FILE, METRICS_PORT
+from querycase.metrics import add_arguments, start_export, profiled, span
 
 
 '''
@@ -26,21 +32,123 @@ def run(max_cases=None):  # Allow unlimited
         print(f"❌ Failed to embed/index: {e}")
 '''
 def run():
-    run_batches(batch_size=50, max_batches=None)
+    parser = argparse.ArgumentParser(description="Fetch new cases from CourtListener and add them to the index.")
+    parser.add_argument("--batch-size", type=int, default=50, help="Cases per ingestion batch")
+    parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches")
+    parser.add_argument("--sequential", action="store_true", help="Fetch and embed one batch at a time")
+    parser.add_argument("--summaries", dest="summaries", action="store_true", default=INGEST_SUMMARIES,
+                        help="Precompute a BART summary for every ingested case")
+    parser.add_argument("--no-summaries", dest="summaries", action="store_false")
+    add_arguments(parser)
+    args = parser.parse_args()
 
-def run_batches(batch_size=50, max_batches=None):
+    start_export(args.metrics_file or METRICS_FILE, args.metrics_port or METRICS_PORT)
+    with profiled(args.profile):
+        if args.sequential:
+            run_batches(batch_size=args.batch_size, max_batches=args.max_batches, summaries=args.summaries)
+        else:
+            run_streaming(batch_size=args.batch_size, max_batches=args.max_batches, summaries=args.summaries)
+
+def take_batches(batches, max_batches=None):
+    """
+    Yield at most `max_batches` batches, then close the fetch generator so its
+    download/extraction pools shut down.
+    """
+    try:
+        for count, batch in enumerate(batches, start=1):
+            yield batch
+            if max_batches and count >= max_batches:
+                print("⏹️ Max batches reached — stopping.")
+                return
+    finally:
+        batches.close()
+
+def run_streaming(batch_size=50, max_batches=None, queue_size=2, report_every=30.0, summaries=INGEST_SUMMARIES):
+    """
+    Staged ingest: fetch (download + extraction pool) → chunk → embed → index
+    (→ summarize), connected by bounded queues so network, extraction, model
+    inference and index writes all run at the same time. Summaries are made
+    after indexing by SUMMARY_WORKERS threads, so cases are searchable first.
+    """
+    print("🔁 Starting streaming ingestion...")
+    writer = open_writer()
+    texts = CaseTextStore()
+    ledger = get_ledger()
+
+    def chunk(batch):
+        chunks, metadata = chunk_cases(batch, show_progress=False)
+        # Chunks already indexed, repeated in the batch or being encoded for an
+        # earlier batch still in flight aren't encoded again
+        return batch, writer.dedup(chunks, metadata)
+
+    def embed(item):
+        batch, dedup = item
+        return batch, dedup, encode_chunks(dedup.chunks)
+
+    def append(item):
+        batch, dedup, encoded = item
+        # Vectors reused from earlier batches are only all on disk once those are appended
+        embeddings = dedup.embeddings(encoded)
+        writer.append(embeddings, dedup.metadata, dedup.hashes)
+        # Keep the opinion texts for summaries, then record the batch as indexed
+        # (one ledger transaction) before the JSON files go
+        texts.put_cases(batch)
+        ledger.mark_indexed(batch)
+        cleanup_case_files(batch)
+        print(f"✅ Indexed {len(batch)} cases ({dedup.summary()}), index now {writer.ntotal} rows")
+        return batch
+
+    stages = [
+        Stage("chunk", chunk, unit="cases", count=len),
+        Stage("embed", embed, unit="chunks", count=lambda item: len(item[1].chunks)),
+        Stage("index", append, unit="chunks", count=lambda item: len(item[1].metadata)),
+    ]
+    if summaries:
+        from querycase.summarizer import summarize_cases
+        from querycase.casestore import CaseSummaryStore
+        store = CaseSummaryStore()
+
+        def summarize(batch):
+            summarize_cases(batch, store)
+
+        stages.append(Stage("summary", summarize, workers=SUMMARY_WORKERS, unit="cases", count=len))
+
+    pipeline = Pipeline(
+        take_batches(fetch_new_case_batches(batch_size=batch_size), max_batches),
+        stages,
+        queue_size=queue_size,
+        report_every=report_every,
+        source_name="fetch",
+        source_unit="cases",
+        source_count=len,
+    )
+    try:
+        pipeline.run()
+    finally:
+        writer.close()
+    print(f"✅ Completed {pipeline.stages[2].stats.items} batch(es).")
+
+def run_batches(batch_size=50, max_batches=None, summaries=INGEST_SUMMARIES):
     print("🔁 Starting batch ingestion...")
     batch_count = 0
+    writer = open_writer()
+    if summaries:
+        from querycase.summarizer import summarize_cases
 
-    for batch in fetch_new_case_batches(batch_size=batch_size):
-        print(f"\n📦 Processing batch {batch_count + 1} with {len(batch)} cases")
-        embed_and_update_index(batch)
-        batch_count += 1
-
-        if max_batches and batch_count >= max_batches:
-            print("⏹️ Max batches reached — stopping.")
-            break
+    try:
+        for batch in fetch_new_case_batches(batch_size=batch_size):
+            print(f"\n📦 Processing batch {batch_count + 1} with {len(batch)} cases")
+            with span("ingest.batch"):
+                embed_and_update_index(batch, writer=writer)
+            if summaries:
+                print(f"🧠 Summarized {summarize_cases(batch)} cases")
+            batch_count += 1
 
+            if max_batches and batch_count >= max_batches:
+                print("⏹️ Max batches reached — stopping.")
+                break
+    finally:
+        writer.close()
     print(f"✅ Completed {batch_count} batch(es).")
 
 if __name__ == "__main__":
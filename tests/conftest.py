@@ -0,0 +1,75 @@
+import os
+import tempfile
+
+# querycase.config resolves its data paths at import: point them at a scratch
+# directory before any test imports the package
+os.environ.setdefault("QUERYCASE_DATA_DIR", tempfile.mkdtemp(prefix="querycase-tests-"))
+
+import numpy as np
+import pytest
+
+from querycase.config import EMBEDDING_DIM
+from querycase.embed import IndexWriter
+from querycase.index import SearchEngine
+
+WORDS = ("appeal", "contract", "damages", "immunity", "officer", "remand", "statute", "warrant",
+         "jury", "negligence", "habeas", "asylum", "patent", "tax", "speech", "search")
+
+
+def make_batch(n, start_case=1, chunks_per_case=5, seed=0):
+    """
+    `n` random unit vectors and chunk metadata entries (cases of
+    `chunks_per_case` chunks), deterministic for a seed.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    metadata = []
+    for i in range(n):
+        case_id = start_case + i // chunks_per_case
+        words = rng.choice(WORDS, size=12)
+        metadata.append({
+            "case_id": case_id,
+            "case_name": f"Case {case_id}",
+            "date_filed": f"2020-01-{1 + case_id % 28:02d}",
+            "download_url": f"https://example.com/{case_id}.pdf",
+            "court": ("ca1", "ca2", "ca9")[case_id % 3],
+            "chunk_text": f"chunk {i} of case {case_id}: " + " ".join(words),
+        })
+    return vectors, metadata
+
+
+@pytest.fixture
+def index_paths(tmp_path):
+    """
+    IndexWriter / SearchEngine paths of a fresh index under tmp_path.
+    """
+    return {
+        "segments_dir": str(tmp_path / "segments"),
+        "bm25_dir": str(tmp_path / "bm25"),
+        "meta_dir": str(tmp_path / "metadata"),
+        "vectors_path": str(tmp_path / "vectors.f32"),
+        "hashes_path": str(tmp_path / "chunk_hashes.i8"),
+    }
+
+
+def open_engine(paths):
+    """
+    SearchEngine over the index at `paths` (see index_paths).
+    """
+    return SearchEngine(paths["segments_dir"], paths["meta_dir"], bm25_dir=paths["bm25_dir"],
+                        vectors_path=paths["vectors_path"])
+
+
+def write_batches(paths, batches, rows=40):
+    """
+    Append `batches` batches of `rows` chunks through one IndexWriter.
+    """
+    writer = IndexWriter(**paths)
+    try:
+        for b in range(batches):
+            vectors, metadata = make_batch(rows, start_case=1 + b * rows, seed=b)
+            writer.append(vectors, metadata)
+    finally:
+        writer.close()
+    return writer
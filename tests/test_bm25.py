@@ -0,0 +1,14 @@
+from querycase.bm25 import BM25Index
+
+
+def test_bm25_truncate_drops_rows(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25")).open_for_writing()
+    index.add(["warrant search car", "contract damages", "warrant affidavit"])
+    index.add(["warrant exception", "tax refund"])
+    index.truncate(3)
+
+    reader = BM25Index(str(tmp_path / "bm25"))
+    reader.refresh()
+    assert reader.rows == 3
+    scores, rows = reader.search("warrant", 10)
+    assert sorted(rows.tolist()) == [0, 2]
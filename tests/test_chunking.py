@@ -0,0 +1,78 @@
+import re
+
+import numpy as np
+import pytest
+
+from querycase.chunking import token_windows, chunk_words
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class StubTokenizer:
+    """
+    Fast-tokenizer stand-in: every word and punctuation mark is a token.
+    """
+
+    def __call__(self, texts, **kwargs):
+        return {"offset_mapping": [[m.span() for m in TOKEN_RE.finditer(text)] for text in texts]}
+
+
+def count_tokens(text):
+    return len(TOKEN_RE.findall(text))
+
+
+def sentences(n, words=5):
+    # Each sentence is `words` words plus a period: words + 1 tokens
+    return " ".join(f"Sentence{i} " + " ".join(f"w{i}x{j}" for j in range(words - 1)) + "." for i in range(n))
+
+
+def windows(text, max_tokens, overlap):
+    return token_windows([text], StubTokenizer(), max_tokens, overlap)[0]
+
+
+@pytest.mark.parametrize("max_tokens, overlap", [(12, 0), (12, 3), (20, 5), (50, 24)])
+def test_chunks_stay_within_budget_and_cover_the_text(max_tokens, overlap):
+    text = sentences(40, words=7) + "\n\n" + sentences(25, words=3)
+    chunks = windows(text, max_tokens, overlap)
+    assert all(count_tokens(chunk) <= max_tokens for chunk in chunks)
+    # Nothing lost: every sentence's words appear somewhere, first and last token included
+    joined = " ".join(chunks)
+    assert all(word in joined for word in text.split())
+    assert chunks[0].startswith("Sentence0") and chunks[-1].endswith(text.split()[-1])
+
+
+def test_consecutive_chunks_overlap():
+    max_tokens, overlap = 20, 5
+    chunks = windows(sentences(30, words=4), max_tokens, overlap)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        first = chunk.split()[0]
+        assert first in previous.split()
+        shared = previous[previous.rindex(first):]
+        assert chunk.startswith(shared)
+        assert 0 < count_tokens(shared) < max_tokens // 2 + 1
+
+
+def test_overlap_starts_at_previous_sentence_when_window_ends_on_one():
+    # 6-token sentences: a 12-token window ends exactly on a sentence break, and no
+    # sentence starts inside the 3-token overlap, so it goes back to the sentence before
+    chunks = windows(sentences(10), 12, 3)
+    assert chunks[0] == sentences(2)
+    assert all(chunk.startswith("Sentence") for chunk in chunks)
+    assert chunks[1].startswith("Sentence1 ")
+
+
+def test_text_without_breaks_terminates():
+    text = ".".join(["a"] * 500)  # 999 tokens, no whitespace or sentence ends
+    for overlap in (0, 1, 9):
+        chunks = windows(text, 20, overlap)
+        assert all(count_tokens(chunk) <= 20 for chunk in chunks)
+        step = 20 - overlap
+        assert len(chunks) == int(np.ceil((999 - overlap) / step))
+    assert windows("", 20, 5) == []
+    assert windows("Short.", 20, 5) == ["Short."]
+
+
+def test_chunk_words():
+    text = " ".join(f"w{i}" for i in range(450))
+    chunks = chunk_words(text)
+    assert [len(chunk.split()) for chunk in chunks] == [200, 200, 50]
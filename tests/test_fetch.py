@@ -0,0 +1,58 @@
+import os
+
+import fitz  # PyMuPDF
+import pytest
+
+from querycase import convert, fetch
+
+TEXT = "Qualified immunity shields officers from suit."
+
+
+def make_pdf(text=TEXT, pages=2):
+    with fitz.open() as doc:
+        for n in range(pages):
+            doc.new_page().insert_text((72, 72), f"{text} Page {n + 1}.")
+        return doc.tobytes()
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, content):
+        self.content = content
+
+    def get(self, url, timeout=None):
+        return FakeResponse(self.content)
+
+
+def test_extracts_text_from_pdf_bytes():
+    text = fetch.extract_text_from_pdf_bytes(make_pdf())
+    assert TEXT in text
+    assert "Page 1." in text and "Page 2." in text
+    assert convert.extract_text_from_pdf(make_pdf()) == text
+
+
+def test_unreadable_pdf_bytes_give_no_text():
+    assert fetch.extract_text_from_pdf_bytes(make_pdf()[:40], "case 1") == ""
+
+
+@pytest.mark.parametrize("archive", [False, True])
+def test_pdfs_only_hit_the_disk_with_pdf_archive(tmp_path, monkeypatch, archive):
+    monkeypatch.setattr(fetch, "PDF_DIR", str(tmp_path))
+    monkeypatch.setattr(fetch, "PDF_ARCHIVE", archive)
+    data = make_pdf()
+    text = fetch.download_and_extract(FakeSession(data), fetch.HostRateLimiter(rate=0), None, 42,
+                                      "https://www.ca9.uscourts.gov/42.pdf")
+    assert TEXT in text
+    if archive:
+        assert os.listdir(tmp_path) == ["42.pdf"]
+        with open(tmp_path / "42.pdf", "rb") as f:
+            assert f.read() == data
+    else:
+        assert os.listdir(tmp_path) == []
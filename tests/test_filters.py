@@ -0,0 +1,88 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from querycase import index
+from querycase.embed import IndexWriter
+from querycase.index import make_filter
+
+from conftest import make_batch, open_engine
+
+FILTERS = [
+    {"date_from": "2020-01-10"},
+    {"date_to": date(2020, 1, 8)},
+    {"date_from": "2020-01-05", "date_to": "2020-01-20", "courts": ["CA9"]},
+    {"courts": ["ca1", "ca2"]},
+    {"case_ids": [3, 7, 11, 40]},
+    {"date_from": "2020-01-01", "courts": ["ca1"], "case_ids": list(range(1, 30))},
+]
+
+
+@pytest.fixture
+def corpus(index_paths):
+    vectors, metadata = make_batch(400, seed=21)
+    # Rows with unknown dates and courts must never match a date or court filter
+    for entry in metadata[::7]:
+        entry["date_filed"] = None
+    for entry in metadata[::11]:
+        entry["court"] = None
+    writer = IndexWriter(**index_paths)
+    try:
+        writer.append(vectors, metadata)
+    finally:
+        writer.close()
+    return vectors, metadata
+
+
+def brute_force(vectors, metadata, query, top_k, date_from=None, date_to=None, courts=None, case_ids=None):
+    def keep(entry):
+        filed = entry["date_filed"]
+        if (date_from or date_to) and filed is None:
+            return False
+        if date_from and filed < str(date_from):
+            return False
+        if date_to and filed > str(date_to):
+            return False
+        if courts and (entry["court"] or "") not in {c.lower() for c in courts}:
+            return False
+        return not case_ids or entry["case_id"] in case_ids
+
+    rows = np.array([row for row, entry in enumerate(metadata) if keep(entry)], dtype=np.int64)
+    distances = ((vectors[rows] - query) ** 2).sum(1)
+    return rows[np.argsort(distances, kind="stable")[:top_k]].tolist()
+
+
+@pytest.mark.parametrize("exact", [True, False], ids=["exact", "bitmap"])
+@pytest.mark.parametrize("filters", FILTERS)
+def test_filtered_search_matches_brute_force(corpus, index_paths, monkeypatch, filters, exact):
+    vectors, metadata = corpus
+    engine = open_engine(index_paths)
+    calls = []
+    exact_search = engine._exact_search
+    monkeypatch.setattr(engine, "_exact_search", lambda *args: calls.append(args) or exact_search(*args))
+    # Below FILTER_EXACT_ROWS matching rows are scored from vectors.f32, above it by the
+    # index through an IDSelectorBitmap
+    monkeypatch.setattr(index, "FILTER_EXACT_ROWS", 50000 if exact else 0)
+
+    queries = vectors[[0, 100, 250]] + 0.1
+    results = engine.search_many(["a", "b", "c"], 10, mode="vector", query_vectors=queries, **filters)
+    for query, hits in zip(queries, results):
+        assert [hit["row"] for hit in hits] == brute_force(vectors, metadata, query, 10, **filters)
+    assert bool(calls) == exact
+
+
+def test_filter_matching_nothing(corpus, index_paths):
+    vectors, _ = corpus
+    engine = open_engine(index_paths)
+    assert engine.search_many(["a"], 5, mode="vector", query_vectors=vectors[:1], date_from="2030-01-01") == [[]]
+    assert engine.search_many(["a"], 5, mode="vector", query_vectors=vectors[:1], courts=["cadc"]) == [[]]
+
+
+def test_make_filter():
+    assert make_filter() is None
+    assert make_filter(date_from="", courts=[], case_ids=None) is None
+    assert make_filter(date_from=date(1970, 1, 2), courts=[" CA9 ", "ca1"], case_ids=["5", 2]) == \
+        (1, None, ("ca1", "ca9"), (2, 5))
+    with pytest.raises(ValueError):
+        make_filter(date_to="not a date")
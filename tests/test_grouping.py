@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from querycase import index
+from querycase.config import EMBEDDING_DIM, SNIPPETS_PER_CASE
+from querycase.embed import IndexWriter
+
+from conftest import open_engine
+
+
+def unit(vector):
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+@pytest.fixture
+def engine(index_paths):
+    """
+    A flat index of 6 cases with 1-20 chunks each, at varying distances
+    from QUERY: case 1 has one very close chunk, case 2 four fairly close
+    ones, case 3 twenty close ones.
+    """
+    rng = np.random.default_rng(11)
+    query = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    query[0] = 1.0
+    layout = {1: [0.05], 2: [0.5] * 4, 3: [0.2] * 20, 4: [1.0] * 3, 5: [1.2] * 6, 6: [1.5] * 2}
+    vectors, metadata = [], []
+    for case_id, noises in layout.items():
+        for n, noise in enumerate(noises):
+            vectors.append(unit(query + noise * unit(rng.standard_normal(EMBEDDING_DIM))))
+            metadata.append({"case_id": case_id, "case_name": f"Case {case_id}", "date_filed": "2019-05-06",
+                             "court": "ca1", "chunk_text": f"case {case_id} chunk {n}"})
+    writer = IndexWriter(**index_paths)
+    try:
+        writer.append(np.array(vectors), metadata)
+    finally:
+        writer.close()
+    engine = open_engine(index_paths)
+    assert engine.refresh()
+    engine.query = query[None, :]
+    return engine
+
+
+def brute_force_cases(engine, case_score):
+    # Every chunk's score, grouped in plain Python
+    hits = engine.search_many(["q"], engine.ntotal, mode="vector", query_vectors=engine.query)[0]
+    cases = {}
+    for hit in hits:
+        cases.setdefault(hit["case_id"], []).append(hit)
+    score = max if case_score == "max" else sum
+    return sorted(((score(h["score"] for h in chunks), case_id, chunks) for case_id, chunks in cases.items()),
+                  key=lambda case: case[0], reverse=True)
+
+
+@pytest.mark.parametrize("case_score", ["max", "sum"])
+def test_grouping_matches_brute_force(engine, monkeypatch, case_score):
+    monkeypatch.setattr(index, "CASE_OVERFETCH", 100)
+    expected = brute_force_cases(engine, case_score)
+    results = engine.search_many(["q"], 4, mode="vector", query_vectors=engine.query,
+                                 group_by_case=True, case_score=case_score)[0]
+    assert [r["case_id"] for r in results] == [case_id for _, case_id, _ in expected[:4]]
+    for result, (score, case_id, chunks) in zip(results, expected):
+        assert result["score"] == pytest.approx(score, rel=1e-5)
+        assert result["matched_chunks"] == len(chunks)
+        # Best chunks first, at most SNIPPETS_PER_CASE of them
+        assert result["snippets"] == [h["snippet"] for h in chunks[:SNIPPETS_PER_CASE]]
+        assert result["snippet"] == chunks[0]["snippet"]
+
+
+def test_max_and_sum_rank_cases_differently(engine, monkeypatch):
+    monkeypatch.setattr(index, "CASE_OVERFETCH", 100)
+    by_max = engine.search_many(["q"], 3, mode="vector", query_vectors=engine.query,
+                                group_by_case=True, case_score="max")[0]
+    by_sum = engine.search_many(["q"], 3, mode="vector", query_vectors=engine.query,
+                                group_by_case=True, case_score="sum")[0]
+    assert by_max[0]["case_id"] == 1
+    assert by_sum[0]["case_id"] == 3
+    assert by_sum[0]["matched_chunks"] == 20
+
+
+def test_too_few_cases_in_overfetch_are_backfilled(engine, monkeypatch):
+    # Case 3's twenty chunks fill the first top_k * CASE_OVERFETCH = 6 hits
+    monkeypatch.setattr(index, "CASE_OVERFETCH", 2)
+    chunks = engine.search_many(["q"], 6, mode="vector", query_vectors=engine.query)[0]
+    assert len({hit["case_id"] for hit in chunks}) < 3
+
+    results = engine.search_many(["q"], 3, mode="vector", query_vectors=engine.query, group_by_case=True)[0]
+    assert len(results) == 3
+    assert [r["case_id"] for r in results] == [case_id for _, case_id, _ in brute_force_cases(engine, "max")[:3]]
+
+    # Fewer cases than top_k in the whole index: all of them, no endless widening
+    assert len(engine.search_many(["q"], 10, mode="vector", query_vectors=engine.query, group_by_case=True)[0]) == 6
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from querycase.ann import count_vectors
+from querycase.dedup import ChunkHashIndex
+from querycase.embed import IndexWriter
+from querycase.metastore import MetadataStore
+from querycase.reindex import rebuild_index
+from querycase.segments import SegmentedIndex, MANIFEST
+
+from conftest import make_batch, open_engine, write_batches
+
+
+def test_reopen_after_failed_segment_truncates_to_index_rows(index_paths, monkeypatch):
+    write_batches(index_paths, 2)
+
+    writer = IndexWriter(**index_paths)
+    vectors, metadata = make_batch(25, start_case=1000, seed=7)
+
+    def crash(vectors):
+        raise OSError("disk full")
+
+    # Vectors, metadata, postings and hashes are written, then publishing the segment fails
+    monkeypatch.setattr(writer.segments, "add_segment", crash)
+    with pytest.raises(OSError):
+        writer.append(vectors, metadata)
+    writer.close()
+    assert len(MetadataStore(index_paths["meta_dir"])) == 105
+    assert count_vectors(index_paths["vectors_path"]) == 105
+    monkeypatch.undo()
+
+    writer = IndexWriter(**index_paths)
+    try:
+        assert writer.ntotal == 80
+        assert len(writer.metadata) == 80
+        assert count_vectors(index_paths["vectors_path"]) == 80
+        assert writer.keywords.rows == 80
+        assert len(ChunkHashIndex(index_paths["hashes_path"])) == 80
+        writer.append(vectors, metadata)
+        assert writer.ntotal == 105
+    finally:
+        writer.close()
+
+    engine = open_engine(index_paths)
+    hits = engine.search_many(["q"], 1, mode="vector", query_vectors=vectors[:1])[0]
+    assert hits[0]["row"] == 80
+    assert hits[0]["case_id"] == 1000
+
+
+def test_writer_lock_is_released_on_close(index_paths):
+    writer = IndexWriter(**index_paths)
+    with pytest.raises(RuntimeError):
+        IndexWriter(**index_paths)
+    writer.close()
+    IndexWriter(**index_paths).close()
+
+
+def test_orphan_segments_and_temp_manifest_are_ignored(index_paths):
+    write_batches(index_paths, 2)
+    directory = index_paths["segments_dir"]
+    # A crash after writing a segment file, or mid manifest replace
+    for name in ("seg-000099.index", "seg-000100.index.tmp", MANIFEST + ".tmp"):
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(b"garbage")
+
+    segments = SegmentedIndex(directory, legacy_index_path=None)
+    segments.refresh()
+    assert segments.ntotal == 80
+    segments.remove_orphans()
+    assert not os.path.exists(os.path.join(directory, "seg-000099.index"))
+    assert not os.path.exists(os.path.join(directory, "seg-000100.index.tmp"))
+
+
+def test_background_compaction_keeps_rebuilt_kind(index_paths, monkeypatch):
+    write_batches(index_paths, 1, rows=400)
+    rebuild_index("ivf_flat", segments_dir=index_paths["segments_dir"], vectors_path=index_paths["vectors_path"],
+                  nlist=4)
+
+    writer = IndexWriter(**index_paths)
+    writer.compactor.max_segments = 3
+    try:
+        for b in range(4):
+            vectors, metadata = make_batch(20, start_case=5000 + 20 * b, seed=10 + b)
+            writer.append(vectors, metadata)
+        writer.compactor.wait()
+    finally:
+        writer.close()
+
+    segments = SegmentedIndex(index_paths["segments_dir"], legacy_index_path=None)
+    segments.refresh(load=False)
+    assert segments.kind() == "ivf_flat"
+    assert segments.ntotal == 480
+    assert len(segments.segments) <= 2
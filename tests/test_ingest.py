@@ -0,0 +1,90 @@
+import functools
+import threading
+
+import numpy as np
+import pytest
+
+from querycase import dedup, embed, update
+from querycase.ann import load_vectors
+from querycase.config import EMBEDDING_DIM
+from querycase.dedup import ChunkHashIndex, chunk_hash
+from querycase.embed import IndexWriter
+
+SHARED = ["boilerplate: the judgment of the district court is affirmed",
+          "costs are taxed against the appellant"]
+
+
+def make_case(case_id):
+    return {"id": case_id, "case_name": f"Case {case_id}", "date_filed": "2021-03-04",
+            "chunks": [f"case {case_id} holding {n}" for n in range(3)] + SHARED}
+
+
+def fake_chunk_cases(cases, show_progress=True):
+    chunks, metadata = [], []
+    for case in cases:
+        for text in case["chunks"]:
+            chunks.append(text)
+            metadata.append({"case_id": case["id"], "case_name": case["case_name"],
+                             "date_filed": case["date_filed"], "chunk_text": text})
+    return chunks, metadata
+
+
+def fake_vector(text):
+    vector = np.random.default_rng(abs(chunk_hash(text))).standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class Recorder:
+    def put_cases(self, cases):
+        pass
+
+    mark_indexed = put_cases
+
+
+@pytest.mark.parametrize("mode", ["reuse", "skip"])
+def test_streaming_dedups_chunks_of_batches_in_flight(index_paths, monkeypatch, mode):
+    batches = [[make_case(1), make_case(2)], [make_case(3), make_case(4)]]
+    writer = IndexWriter(**index_paths)
+    planned = threading.Event()
+    encoded = []
+
+    plan = writer.dedup
+
+    def dedup_batch(chunks, metadata):
+        batch = plan(chunks, metadata)
+        if metadata[0]["case_id"] == 3:
+            planned.set()
+        return batch
+
+    def encode(chunks):
+        # Hold the first batch in the embed stage until the second one is planned
+        assert planned.wait(10)
+        encoded.extend(chunks)
+        return np.array([fake_vector(c) for c in chunks], dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+
+    monkeypatch.setattr(writer, "dedup", dedup_batch)
+    monkeypatch.setattr(embed, "BatchDedup", functools.partial(dedup.BatchDedup, mode=mode))
+    monkeypatch.setattr(update, "open_writer", lambda: writer)
+    monkeypatch.setattr(update, "fetch_new_case_batches", lambda batch_size: (batch for batch in batches))
+    monkeypatch.setattr(update, "chunk_cases", fake_chunk_cases)
+    monkeypatch.setattr(update, "encode_chunks", encode)
+    monkeypatch.setattr(update, "CaseTextStore", Recorder)
+    monkeypatch.setattr(update, "get_ledger", Recorder)
+    monkeypatch.setattr(update, "cleanup_case_files", lambda cases: None)
+
+    update.run_streaming(batch_size=2, summaries=False)
+
+    # Each distinct chunk is encoded once
+    assert sorted(encoded) == sorted({c for batch in batches for case in batch for c in case["chunks"]})
+    hashes = np.fromfile(index_paths["hashes_path"], dtype=np.int64)
+    assert len(hashes) == len(ChunkHashIndex(index_paths["hashes_path"]))
+    if mode == "skip":
+        # 4 cases x 3 own chunks + the shared chunks once
+        assert len(hashes) == 14
+        assert len(set(hashes.tolist())) == len(hashes)
+    else:
+        assert len(hashes) == 20
+        vectors = load_vectors(index_paths["vectors_path"])
+        shared = [row for row, h in enumerate(hashes.tolist()) if h == chunk_hash(SHARED[0])]
+        assert len(shared) == 4
+        assert all(np.array_equal(vectors[row], fake_vector(SHARED[0])) for row in shared)
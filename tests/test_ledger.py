@@ -0,0 +1,56 @@
+import pytest
+
+from querycase.ledger import IngestLedger, FETCHED, INDEXED, RETRY, SKIPPED
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    # migrate() runs against the empty QUERYCASE_DATA_DIR set up in conftest
+    ledger = IngestLedger(str(tmp_path / "ledger.sqlite3"))
+    yield ledger
+    ledger.close()
+
+
+def test_states_survive_reopen(ledger):
+    ledger.mark_fetched([{"id": 1, "date_filed": "2020-01-01"}, {"id": 2, "date_filed": "2020-01-02"}])
+    ledger.mark_indexed([{"id": 1}])
+    ledger.mark_skipped([{"id": 3, "date_filed": "2020-01-03"}])
+    ledger.close()
+
+    reopened = IngestLedger(ledger.path)
+    try:
+        assert reopened.state(1) == INDEXED
+        assert reopened.state(2) == FETCHED
+        assert reopened.state(3) == SKIPPED
+        assert reopened.unindexed() == [2]
+        assert reopened.seen([1, 2, 3, 4]) == {1, 2, 3}
+        # mark_indexed without a date keeps the recorded one
+        assert reopened.resume_date() == "2020-01-03"
+    finally:
+        reopened.close()
+
+
+def test_failed_downloads_are_fetched_again(ledger):
+    ledger.mark_indexed([{"id": 1, "date_filed": "2021-05-01"}])
+    ledger.mark_retry([{"id": 2, "date_filed": "2021-03-01"}])
+    assert ledger.state(2) == RETRY
+    assert ledger.seen([1, 2]) == {1}
+    assert ledger.resume_date() == "2021-03-01"
+
+    ledger.mark_fetched([{"id": 2}])
+    assert ledger.resume_date() == "2021-05-01"
+
+
+def test_retries_give_up_after_max_attempts(ledger):
+    for _ in range(3):
+        ledger.mark_retry([{"id": 5, "date_filed": "2021-01-01"}], max_attempts=3)
+    assert ledger.state(5) == SKIPPED
+    assert ledger.seen([5]) == {5}
+
+
+def test_forget_queues_a_case_for_refetch(ledger):
+    ledger.mark_fetched([{"id": 7, "date_filed": "2019-02-02"}, {"id": 8, "date_filed": "2022-02-02"}])
+    ledger.forget([7])
+    assert ledger.state(7) == RETRY
+    assert ledger.retries() == [7]
+    assert ledger.resume_date() == "2019-02-02"
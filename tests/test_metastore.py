@@ -0,0 +1,88 @@
+import os
+
+from querycase.metastore import MetadataStore, ROW_DTYPE, UNKNOWN_DATE, date_to_days
+
+from conftest import make_batch
+
+
+def test_rows_round_trip_across_reopen(tmp_path):
+    _, metadata = make_batch(12)
+    store = MetadataStore(str(tmp_path))
+    store.append(metadata[:7])
+    store.append(metadata[7:])
+
+    reopened = MetadataStore(str(tmp_path))
+    assert len(reopened) == 12
+    for row in (0, 6, 11):
+        entry = reopened[row]
+        for key in ("case_id", "case_name", "date_filed", "download_url", "court", "chunk_text"):
+            assert entry[key] == metadata[row][key]
+    assert reopened.case_ids.tolist() == [m["case_id"] for m in metadata]
+    assert reopened.date_days[0] == date_to_days(metadata[0]["date_filed"])
+    assert sorted(c for c in reopened.court_codes if c) == ["ca1", "ca2", "ca9"]
+
+
+def test_unknown_date_and_court(tmp_path):
+    store = MetadataStore(str(tmp_path))
+    store.append([{"case_id": 1, "case_name": None, "date_filed": "Unknown Date", "chunk_text": "text"}])
+    assert store.date_days[0] == UNKNOWN_DATE
+    assert store[0]["date_filed"] == "Unknown Date"
+    assert store[0]["court"] is None
+    assert store[0]["case_name"] == "Unknown Case"
+
+
+def test_truncate_to_index_rows(tmp_path):
+    _, metadata = make_batch(10)
+    store = MetadataStore(str(tmp_path))
+    store.append(metadata)
+    store.truncate(4)
+    assert len(store) == 4
+
+    reopened = MetadataStore(str(tmp_path))
+    assert len(reopened) == 4
+    reopened.append(metadata[4:6])
+    assert len(reopened) == 6
+    assert reopened[5]["chunk_text"] == metadata[5]["chunk_text"]
+
+
+def test_partial_trailing_record_is_ignored_and_overwritten(tmp_path):
+    _, metadata = make_batch(5)
+    store = MetadataStore(str(tmp_path))
+    store.append(metadata[:3])
+    # A crash half way through writing a record
+    with open(os.path.join(str(tmp_path), "rows.bin"), "ab") as f:
+        f.write(b"\x01" * (ROW_DTYPE.itemsize // 2))
+
+    reopened = MetadataStore(str(tmp_path))
+    assert len(reopened) == 3
+    reopened.append(metadata[3:])
+    assert len(MetadataStore(str(tmp_path))) == 5
+    assert reopened[4]["chunk_text"] == metadata[4]["chunk_text"]
+
+
+def test_truncate_leaves_mapped_files_intact(tmp_path):
+    _, metadata = make_batch(3000, seed=4)
+    reader = MetadataStore(str(tmp_path))
+    writer = MetadataStore(str(tmp_path))
+    writer.append(metadata)
+    assert reader.refresh()
+    sizes = {name: os.path.getsize(tmp_path / name) for name in ("rows.bin", "courts.u2", "blob.bin")}
+
+    writer.truncate(10)
+    # A search process may still have every row mapped: the files must not shrink under it
+    assert {name: os.path.getsize(tmp_path / name) for name in sizes} == sizes
+    assert reader.case_ids[-1] == metadata[-1]["case_id"]
+    assert reader[2999]["court"] == metadata[2999]["court"]
+    assert reader.refresh()
+    assert len(reader) == 10
+    assert len(MetadataStore(str(tmp_path))) == 10
+
+    # Appends overwrite the dropped rows; rows.len goes once they are all overwritten
+    _, more = make_batch(20, start_case=9000, seed=5)
+    writer.append(more)
+    assert len(MetadataStore(str(tmp_path))) == 30
+    row = MetadataStore(str(tmp_path))[29]
+    assert (row["case_id"], row["court"]) == (more[-1]["case_id"], more[-1]["court"])
+    writer.append(metadata[:2970])
+    assert not os.path.exists(tmp_path / "rows.len")
+    assert len(MetadataStore(str(tmp_path))) == 3000
@@ -0,0 +1,26 @@
+import pytest
+
+from querycase.reindex import rebuild_index
+
+from conftest import make_batch, open_engine, write_batches
+
+
+@pytest.mark.parametrize("kind", ["flat", "hnsw"])
+def test_reindex_preserves_search_results(index_paths, kind):
+    write_batches(index_paths, 4)
+    queries, _ = make_batch(5, seed=99)
+    names = [f"query {i}" for i in range(5)]
+    engine = open_engine(index_paths)
+    before = engine.search_many(names, 10, mode="vector", query_vectors=queries)
+    keyword_before = engine.search("appeal damages warrant", 10, mode="keyword")
+
+    rebuild_index(kind, segments_dir=index_paths["segments_dir"], vectors_path=index_paths["vectors_path"])
+
+    engine = open_engine(index_paths)
+    assert engine.refresh()
+    assert engine.index_kind() == kind
+    assert len(engine.index.manifest["segments"]) == 1
+    after = engine.search_many(names, 10, mode="vector", query_vectors=queries)
+    assert [[r["row"] for r in hits] for hits in after] == [[r["row"] for r in hits] for hits in before]
+    assert [r["row"] for r in engine.search("appeal damages warrant", 10, mode="keyword")] == \
+        [r["row"] for r in keyword_before]
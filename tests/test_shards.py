@@ -0,0 +1,192 @@
+import json
+import threading
+from datetime import date
+
+import numpy as np
+import pytest
+
+from querycase.embed import IndexWriter
+from querycase.index import SearchEngine
+from querycase.ledger import IngestLedger, FETCHED, INDEXED, RETRY, load_unindexed
+from querycase.segments import SegmentedIndex
+from querycase.server import make_server
+from querycase.shards import ShardLayout, ShardedIndexWriter, ShardedSearchEngine
+
+from conftest import make_batch
+
+
+def open_engine(paths):
+    return SearchEngine(paths["segments_dir"], paths["meta_dir"], bm25_dir=paths["bm25_dir"],
+                        vectors_path=paths["vectors_path"])
+
+
+@pytest.fixture
+def corpus():
+    vectors, metadata = make_batch(300, seed=3)
+    # A larger vocabulary and varied chunk lengths, so BM25 rankings have few ties
+    rng = np.random.default_rng(3)
+    for entry in metadata:
+        terms = rng.zipf(1.3, size=rng.integers(5, 60)) % 500
+        entry["chunk_text"] = " ".join(f"term{t}" for t in terms)
+    return vectors, metadata
+
+
+@pytest.fixture
+def single(index_paths, corpus):
+    """
+    The unsharded index of the corpus, to compare the sharded results against.
+    """
+    writer = IndexWriter(**index_paths)
+    try:
+        writer.append(*corpus)
+    finally:
+        writer.close()
+    engine = open_engine(index_paths)
+    assert engine.refresh()
+    return engine
+
+
+@pytest.fixture
+def layout(tmp_path):
+    return ShardLayout(shards=3, by="case_hash", directory=str(tmp_path / "shards"))
+
+
+@pytest.fixture
+def sharded(layout, corpus):
+    """
+    The corpus split into 3 shards, each served by an in-process worker,
+    and a coordinator over them.
+    """
+    writer = ShardedIndexWriter(layout)
+    try:
+        writer.append(*corpus)
+    finally:
+        writer.close()
+    servers = []
+    for shard in range(layout.shards):
+        server = make_server("127.0.0.1", 0, engine=open_engine(layout.paths(shard)), window_ms=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    engine = ShardedSearchEngine([f"http://127.0.0.1:{s.server_address[1]}" for s in servers], partial=False)
+    yield engine
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def ranking(results):
+    return [[(hit["case_id"], hit["snippet"]) for hit in hits] for hits in results]
+
+
+def test_date_filtered_sharded_search(single, sharded, corpus):
+    vectors, metadata = corpus
+    queries = ["q0", "q1", "q2"]
+    filters = {"date_from": date(2020, 1, 5), "date_to": date(2020, 1, 15), "courts": ["ca1", "ca9"]}
+    expected = single.search_many(queries, top_k=10, mode="vector", query_vectors=vectors[:3], **filters)
+    results = sharded.search_many(queries, top_k=10, mode="vector", query_vectors=vectors[:3], **filters)
+    assert ranking(results) == ranking(expected)
+    for hit in (h for hits in results for h in hits):
+        assert "2020-01-05" <= hit["date_filed"] <= "2020-01-15"
+        assert hit["court"] in ("ca1", "ca9")
+    assert np.allclose([h["score"] for h in results[0]], [h["score"] for h in expected[0]], atol=1e-5)
+
+
+def test_ingest_waits_for_a_rebuilding_shard(layout):
+    vectors, metadata = make_batch(90, seed=5)
+    shards = layout.assign(metadata)
+
+    # A rebuild of shard 0 holds its writer lock
+    rebuild = SegmentedIndex(layout.paths(0)["segments_dir"], legacy_index_path=None)
+    rebuild.lock_for_writing()
+    writer = ShardedIndexWriter(layout)
+    try:
+        others = np.flatnonzero(shards != 0)
+        writer.append(vectors[others], [metadata[i] for i in others])
+        assert writer.writers[0] is None
+        assert writer.ntotal == len(others)
+
+        mine = np.flatnonzero(shards == 0)
+        ingest = threading.Thread(target=writer.append, args=(vectors[mine], [metadata[i] for i in mine]))
+        ingest.start()
+        ingest.join(0.5)
+        assert ingest.is_alive()
+        rebuild.unlock()
+        ingest.join(10)
+        assert not ingest.is_alive()
+        assert writer.ntotal == 90
+        assert writer.rows(0) == len(mine)
+    finally:
+        rebuild.unlock()
+        writer.close()
+
+
+def test_crash_recovery_sees_cases_in_every_shard(layout, tmp_path):
+    # Cases 1-12 reached the shards, 13 and 14 were only fetched before the crash
+    vectors, metadata = make_batch(60, seed=4)
+    writer = ShardedIndexWriter(layout)
+    try:
+        writer.append(vectors, metadata)
+    finally:
+        writer.close()
+    assert len(set(layout.assign(metadata).tolist())) == 3
+
+    json_dir = tmp_path / "json"
+    json_dir.mkdir()
+    for case_id in (1, 7, 12, 13):
+        (json_dir / f"{case_id}.json").write_text(json.dumps({"id": case_id, "date_filed": "2020-01-01"}))
+
+    ledger = IngestLedger(str(tmp_path / "ledger.sqlite3"))
+    try:
+        ledger.mark_fetched([{"id": c, "date_filed": "2020-01-01"} for c in range(1, 15)])
+        recovered = load_unindexed(ledger, json_dir=str(json_dir), layout=layout)
+        assert [case["id"] for case in recovered] == [13]
+        assert all(ledger.state(c) == INDEXED for c in range(1, 13))
+        assert ledger.state(14) == RETRY
+    finally:
+        ledger.close()
+
+    # A new ledger is seeded from the shards the same way
+    ledger = IngestLedger(str(tmp_path / "seeded.sqlite3"))
+    try:
+        ledger.migrate(checkpoint_path=str(tmp_path / "missing.json"), json_dir=str(json_dir), layout=layout)
+        assert all(ledger.state(c) == INDEXED for c in range(1, 13))
+        assert ledger.state(13) == FETCHED
+    finally:
+        ledger.close()
+
+
+@pytest.mark.parametrize("mode", ["keyword", "hybrid"])
+def test_sharded_bm25_matches_single_index(single, sharded, corpus, mode):
+    vectors, metadata = corpus
+    queries = ["term3 term17", "term8 term40 term2", "term1 term5 term11 term60"]
+    expected = single.search_many(queries, top_k=10, mode=mode, query_vectors=vectors[:3])
+    results = sharded.search_many(queries, top_k=10, mode=mode, query_vectors=vectors[:3])
+    for got, want in zip(results, expected):
+        assert np.allclose([h["score"] for h in got], [h["score"] for h in want], rtol=1e-5)
+        assert {(h["case_id"], h["snippet"]) for h in got} == {(h["case_id"], h["snippet"]) for h in want}
+
+
+def test_health_is_checked_per_interval_and_on_shard_changes(layout, sharded, corpus, monkeypatch):
+    vectors, _ = corpus
+    checks = []
+    health = sharded._health
+    monkeypatch.setattr(sharded, "_health", lambda shard: checks.append(shard) or health(shard))
+    sharded.health_interval = 3600
+
+    for n in range(5):
+        sharded.search_many([f"q{n}"], top_k=3, mode="vector", query_vectors=vectors[n:n + 1])
+    assert len(checks) == 3
+    assert sharded.ntotal == 300
+
+    new_vectors, new_metadata = make_batch(30, start_case=1000, seed=9)
+    writer = ShardedIndexWriter(layout)
+    try:
+        writer.append(new_vectors, new_metadata)
+    finally:
+        writer.close()
+    # This answer carries the shards' new generations; the next query re-checks health
+    sharded.search_many(["q5"], top_k=3, mode="vector", query_vectors=vectors[5:6])
+    assert len(checks) == 3
+    sharded.search_many(["q6"], top_k=3, mode="vector", query_vectors=vectors[6:7])
+    assert len(checks) == 6
+    assert sharded.ntotal == 330